@@ -0,0 +1,231 @@
+import os
+import io
+import csv
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import numpy as np
+from PIL import Image
+import mass_nft_generator_local as generator
+import metadata_production_engine as metadata_engine
+import creative_metadata_engine as creative_engine
+from csv_extender_local import expand_csv
+import build_manifest
+
+# Synthetic drop: same file and CSV layout as a real one, registered with the
+# generator under its own CONFIG name so nothing under BASE_PROJECT_DIR is touched
+ENV_NAME = "BenchDrop"
+PREFIX = "BN"
+DEFAULT_CANVAS = 2048
+DEFAULT_SCALES = [20, 100]
+DEFAULT_BASELINE = "benchmark_baseline.json"
+# Per-run results go under build/, which is ignored by git
+DEFAULT_OUTPUT = os.path.join("build", "benchmark_results.json")
+# A timing this much slower than the baseline (as a fraction) is a regression
+DEFAULT_THRESHOLD = 0.15
+# ...unless it is also less than this many seconds slower (millisecond stages are mostly noise)
+MIN_DELTA = 0.05
+BASES = 6
+TRAITS = 10
+ACCESSORY_SLOTS = 3
+SEED_ROWS = 20
+
+def _smooth_noise(rng, canvas, channels):
+    # Low-frequency noise scaled up to the canvas, so it compresses like artwork rather than static
+    small = rng.integers(0, 256, (32, 32, channels), dtype=np.uint8)
+    mode = "RGBA" if channels == 4 else "RGB"
+    return Image.fromarray(small, mode).resize((canvas, canvas), Image.BILINEAR)
+
+def make_fixture(root, canvas=DEFAULT_CANVAS, seed=0):
+    # Random RGBA base and accessory PNGs at the given canvas size, a seed CSV and a
+    # CONFIG entry for the generator
+    rng = np.random.default_rng(seed)
+    drop_dir = os.path.join(root, "drop")
+    os.makedirs(drop_dir, exist_ok=True)
+
+    base_map = {}
+    for i in range(1, BASES + 1):
+        name = f"Bench_Base{i}"
+        _smooth_noise(rng, canvas, 3).convert("RGBA").save(os.path.join(drop_dir, f"{name}.png"))
+        base_map[f"Bench_{i}"] = name
+
+    # Accessories are opaque-ish patches on a transparent canvas, like the real trait layers
+    trait_map = {}
+    for k in range(TRAITS):
+        name = f"Bench_Trait{k}"
+        layer = Image.new("RGBA", (canvas, canvas), (0, 0, 0, 0))
+        w, h = (int(canvas * f) for f in rng.uniform(0.15, 0.4, 2))
+        x, y = (int(v) for v in rng.integers(0, canvas - max(w, h), 2))
+        layer.paste(_smooth_noise(rng, max(w, h), 4).crop((0, 0, w, h)), (x, y))
+        layer.save(os.path.join(drop_dir, f"{name}.png"))
+        trait_map[f"Trait{k}"] = name
+
+    seed_csv = os.path.join(drop_dir, "Bench_NFT_Combinations.csv")
+    r = random.Random(seed)
+    traits = list(trait_map)
+    with open(seed_csv, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["NFT_Number", "Base_Variation"] + [f"Accessory_{i}" for i in range(1, ACCESSORY_SLOTS + 1)] + ["Final_Rarity"])
+        for i in range(1, SEED_ROWS + 1):
+            accessories = [r.choice(traits + ["None"]) for _ in range(ACCESSORY_SLOTS)]
+            writer.writerow([f"{PREFIX}_{str(i).zfill(3)}", r.choice(list(base_map))] + accessories + [r.choice(["Common", "Rare"])])
+
+    cfg = {
+        "base_dir": drop_dir,
+        "csv_path": seed_csv,
+        "base_map": base_map,
+        "trait_map": trait_map,
+        "prefix": "",
+        "base_prefix": "",
+        "theme": "Bench Drop",
+    }
+    return cfg
+
+def _cold_start():
+    # Forget everything this process has decoded, blended, listed or hashed, so every
+    # timed run (each repeat, each scale) measures the pipeline rather than warm caches
+    generator.LAYER_CACHE.clear()
+    generator.COMPOSITE_CACHE.clear()
+    generator._LAYER_FILES.clear()
+    generator._BBOX_INDEXES.clear()
+    build_manifest._FILE_DIGESTS.clear()
+
+def _timed(fn, *args, **kwargs):
+    # Wall time of one call with its console output swallowed
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        return time.perf_counter() - start
+
+def run_scale(root, cfg, count, repeat=1, workers=1, encoders=0, seed=0):
+    # Each stage of a build at one collection size -> {stage@count: timing}
+    out = os.path.join(root, f"scale_{count}")
+    csv_path = os.path.join(out, f"Bench_NFT_Combinations_{count}.csv")
+    png_dir = os.path.join(out, "png")
+    json_dir = os.path.join(out, "json")
+    meta_dir = os.path.join(out, "metadata")
+    os.makedirs(out, exist_ok=True)
+
+    def fresh(*dirs):
+        for d in dirs:
+            shutil.rmtree(d, ignore_errors=True)
+
+    def render():
+        fresh(png_dir, json_dir)
+        _cold_start()
+        generator.PNG_DIR, generator.JSON_DIR = png_dir, json_dir
+        generator.run_drop(ENV_NAME, workers=workers, encoders=encoders)
+
+    def metadata():
+        fresh(meta_dir)
+        random.seed(seed)
+        metadata_engine.write_metadata(png_dir, meta_dir, csv_index=metadata_engine.CsvIndex({PREFIX: csv_path}))
+
+    def enhance():
+        # Enhancing is a one-shot pass, so each repeat works on a fresh copy
+        work_dir = meta_dir + "_enhanced"
+        fresh(work_dir)
+        shutil.copytree(meta_dir, work_dir)
+        random.seed(seed)
+        return _timed(creative_engine.enhance_metadata, work_dir, workers=workers)
+
+    timings = {}
+    stages = [
+        ("expand_csv", lambda: _timed(expand_csv, cfg['csv_path'], csv_path, count, PREFIX, seed=seed)),
+        ("run_drop", lambda: _timed(render)),
+        ("metadata", lambda: _timed(metadata)),
+        ("enhance", enhance),
+    ]
+    generator.CONFIG[ENV_NAME] = dict(cfg, csv_path=csv_path)
+    for stage, run in stages:
+        best = min(run() for _ in range(repeat))
+        timings[f"{stage}@{count}"] = {"seconds": round(best, 4), "items": count, "ms_per_item": round(best * 1000 / count, 3)}
+        print(f"  {stage:<12}{count:>7} items  {best:>9.3f}s  {best * 1000 / count:>8.2f} ms/item")
+    return timings
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta=MIN_DELTA):
+    # [(key, baseline seconds, seconds, ratio, regressed)] for keys present in both runs
+    rows = []
+    for key, timing in results["timings"].items():
+        base = baseline.get("timings", {}).get(key)
+        if not base or not base["seconds"]:
+            continue
+        ratio = timing["seconds"] / base["seconds"]
+        regressed = ratio > 1 + threshold and timing["seconds"] - base["seconds"] > min_delta
+        rows.append((key, base["seconds"], timing["seconds"], ratio, regressed))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the generation pipeline on a synthetic drop")
+    parser.add_argument("--scales", default=",".join(str(s) for s in DEFAULT_SCALES),
+                        help="Comma-separated collection sizes to time (default: %(default)s)")
+    parser.add_argument("--canvas", type=int, default=DEFAULT_CANVAS, help="Layer size in pixels (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument("--workers", type=int, default=1, help="Passed to run_drop and enhance_metadata")
+    parser.add_argument("--encoders", type=int, default=0, help="Passed to run_drop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Fixture and output folder (default: a temporary folder, removed afterwards)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Results file (default: %(default)s)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Stored results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown against the baseline as a fraction (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    root = args.workdir or tempfile.mkdtemp(prefix="wil_bench_")
+    try:
+        print(f"Building {args.canvas}px fixture in {root}...")
+        cfg = make_fixture(root, canvas=args.canvas, seed=args.seed)
+        results = {
+            "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "settings": {"canvas": args.canvas, "repeat": args.repeat, "workers": args.workers,
+                         "encoders": args.encoders, "seed": args.seed},
+            "timings": {},
+        }
+        for count in scales:
+            print(f"Scale {count}:")
+            results["timings"].update(run_scale(root, cfg, count, repeat=args.repeat, workers=args.workers,
+                                                encoders=args.encoders, seed=args.seed))
+    finally:
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; rerun with --save-baseline to store one.")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get("settings") != results["settings"]:
+        print("Warning: baseline was recorded with different settings; ratios may not be comparable.")
+
+    regressions = 0
+    print(f"{'Stage':<20}{'Baseline':>10}{'Now':>10}{'Ratio':>8}")
+    for key, before, now, ratio, regressed in compare(results, baseline, args.threshold):
+        regressions += regressed
+        print(f"{key:<20}{before:>9.3f}s{now:>9.3f}s{ratio:>8.2f}{'  REGRESSION' if regressed else ''}")
+    if regressions:
+        print(f"{regressions} stages slower than baseline by more than {args.threshold:.0%}.")
+        return 1
+    print("No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import os
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import mass_nft_generator_local as generator
+import metadata_production_engine as metadata_engine
+from build_manifest import BuildManifest
+from render_cache import format_cache_stats
+
+# Every drop of the collection rendered by one shared process pool, then the
+# edition-numbered metadata written once over the finished PNG folder.
+#
+# --drops points at a JSON file that registers drops on top of the generator's CONFIG:
+#   {
+#     "png_dir": "...",            (optional, default: the generator's PNG_DIR)
+#     "metadata_dir": "...",       (optional, default: the metadata engine's OUTPUT_DIR)
+#     "drops": {
+#       "DesertSprings": {"base_dir": "...", "csv_path": "...", "base_map": {...}, "trait_map": {...},
+#                         "prefix": "", "base_prefix": "", "theme": "Desert Springs"},
+#       "FactorySprings": {"csv_path": "..."}      (overrides just that key of the built-in entry)
+#     }
+#   }
+#
+# No drops file is shipped: the generator's CONFIG only knows FactorySprings, and the
+# layer folders and base/trait maps of the other drops in the metadata engine's CSV_MAP
+# live with their artwork. Until they are registered, only FactorySprings is rendered and
+# the run lists the CSV_MAP prefixes it left out.
+DEFAULT_DROPS = "drops.json"
+REQUIRED_KEYS = ("base_dir", "csv_path", "base_map", "trait_map")
+
+# Scheduling: chunks shrink as the remaining work does, between these sizes
+MIN_CHUNK = 4
+MAX_CHUNK = 64
+
+# Seconds between combined progress lines
+PROGRESS_EVERY = 10
+
+def load_drops(path):
+    # (settings, {env: cfg}) with the file's drops merged over the generator's CONFIG
+    settings, drops = {}, dict(generator.CONFIG)
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+        for name, entry in settings.get("drops", {}).items():
+            drops[name] = dict(drops.get(name, {"prefix": "", "base_prefix": "", "theme": name}), **entry)
+    elif path != DEFAULT_DROPS:
+        raise FileNotFoundError(f"Drops config not found: {path}")
+    for name, cfg in drops.items():
+        missing = [key for key in REQUIRED_KEYS if key not in cfg]
+        if missing:
+            raise ValueError(f"Drop {name} is missing {', '.join(missing)}")
+    return settings, drops
+
+def read_drop_rows(cfg):
+    with open(cfg['csv_path'], 'r', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    rows.sort(key=generator.render_order_key)
+    return rows
+
+def row_cost(row):
+    # Layers to composite, a rough stand-in for render time that is known before rendering
+    return 1 + sum(1 for key, value in row.items() if key.startswith('Accessory_') and value and value != 'None')
+
+def schedule(drops, workers, min_chunk=MIN_CHUNK, max_chunk=MAX_CHUNK):
+    # [(env, rows)] -> [(env, rows chunk)] in submit order. The most work goes first and
+    # each chunk is a contiguous run of one drop (shared layers stay warm in one worker).
+    # Chunk size follows the rows still unscheduled (guided self-scheduling), so the run
+    # ends on small chunks from the small drops and every core finishes at about the same time.
+    remaining = sum(len(rows) for _, rows in drops)
+    chunks = []
+    for env_name, rows in sorted(drops, key=lambda d: -sum(row_cost(row) for row in d[1])):
+        start = 0
+        while start < len(rows):
+            size = max(min_chunk, min(max_chunk, remaining // (2 * workers)))
+            chunks.append((env_name, rows[start:start + size]))
+            remaining -= len(chunks[-1][1])
+            start += size
+    return chunks
+
+def _render_chunk(task):
+    env_name, rows = task
+    # Images only; the metadata engine writes the edition-numbered metadata afterwards
+    return [generator._render_row((env_name, row), metadata=False) for row in rows]
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class Progress:
+    # One line for the whole collection: done/total, rate and time left at that rate
+    def __init__(self, total, every=PROGRESS_EVERY):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.started = self._last = time.perf_counter()
+
+    def advance(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= self.every or self.done == self.total:
+            self._last = now
+            print(self.line(now))
+
+    def line(self, now=None):
+        elapsed = (now or time.perf_counter()) - self.started
+        rate = self.done / elapsed if elapsed else 0
+        eta = format_eta((self.total - self.done) / rate) if rate else "?"
+        percent = 100 * self.done / self.total if self.total else 100
+        return f"Rendered {self.done}/{self.total} NFTs ({percent:.1f}%)  {rate:.2f}/s  ETA {eta}"
+
+def build_collection(drops_path=DEFAULT_DROPS, only=None, workers=None, cache_mb=None, composite_mb=None,
+                     preprocess=False, force=False, png_level=None, derivatives=None, allow_missing=False,
+                     packed=False, skip_metadata=False, seed=None):
+    settings, drops = load_drops(drops_path)
+    if only:
+        unknown = sorted(set(only) - set(drops))
+        if unknown:
+            print(f"Error: unknown drops {', '.join(unknown)}; registered: {', '.join(sorted(drops))}")
+            return
+        drops = {name: drops[name] for name in only}
+    generator.CONFIG.update(drops)
+    generator.PNG_DIR = settings.get("png_dir", generator.PNG_DIR)
+    metadata_dir = generator.JSON_DIR = settings.get("metadata_dir", metadata_engine.OUTPUT_DIR)
+    generator.set_render_options(png_level, derivatives)
+    workers = workers or os.cpu_count() or 1
+
+    # Read and check every drop before rendering anything
+    plans, csv_map, missing_any = [], dict(metadata_engine.CSV_MAP), False
+    prefixes = set()
+    for env_name, cfg in sorted(drops.items()):
+        if not os.path.exists(cfg['csv_path']):
+            print(f"Error: CSV not found at {cfg['csv_path']} ({env_name})")
+            missing_any = True
+            continue
+        rows = read_drop_rows(cfg)
+        missing = generator.plan_drop(cfg, rows)
+        if missing:
+            print(generator.missing_report(env_name, missing))
+            missing_any = True
+        if rows:
+            # The metadata pass finds each drop's CSV by the NFT_Number prefix
+            prefix = rows[0]['NFT_Number'].split('_')[0]
+            csv_map[prefix] = cfg['csv_path']
+            prefixes.add(prefix)
+        plans.append((env_name, rows))
+    if not only:
+        unregistered = sorted(set(metadata_engine.CSV_MAP) - prefixes)
+        if unregistered:
+            print(f"No drop registered for {', '.join(unregistered)}: their PNGs are not rendered "
+                  f"(add them to {drops_path} with base_dir, base_map and trait_map)")
+    if missing_any and not allow_missing:
+        print("Nothing rendered. Fix the files or the drops config, or rerun with --allow-missing.")
+        return
+
+    generator.make_output_dirs()
+    if preprocess:
+        for env_name, _ in plans:
+            generator.preprocess_drop(env_name)
+
+    # One manifest for the shared PNG folder; NFT numbers are unique across drops
+    manifest = BuildManifest(generator.PNG_DIR)
+    digests = {}
+    for env_name, rows in plans:
+        for row in rows:
+            digests[row['NFT_Number']] = generator.row_digest(drops[env_name], row)
+    if not force:
+        todo = [(env_name, [row for row in rows
+                            if not manifest.is_current(row['NFT_Number'], digests[row['NFT_Number']], generator.image_paths(row))])
+                for env_name, rows in plans]
+        up_to_date = sum(len(rows) for _, rows in plans) - sum(len(rows) for _, rows in todo)
+        plans = todo
+        print(f"{up_to_date} NFTs up to date")
+
+    total = sum(len(rows) for _, rows in plans)
+    chunks = schedule([(env_name, rows) for env_name, rows in plans if rows], workers)
+    print(f"--- Rendering {total} NFTs from {len(plans)} drops on {workers} workers ({len(chunks)} chunks) ---")
+
+    if cache_mb is not None:
+        generator.LAYER_CACHE.set_budget(cache_mb)
+    if composite_mb is not None:
+        generator.COMPOSITE_CACHE.set_budget(composite_mb)
+    budgets = (generator.LAYER_CACHE.budget / (1024 * 1024), generator.COMPOSITE_CACHE.budget / (1024 * 1024))
+    totals = [[0, 0], [0, 0]]
+    left = {env_name: len(rows) for env_name, rows in plans}
+    failed = 0
+    progress = Progress(total)
+    with ProcessPoolExecutor(max_workers=workers, initializer=generator._init_worker,
+                             initargs=(drops, (generator.PNG_DIR, generator.JSON_DIR), *budgets,
+                                       dict(generator.RENDER_OPTIONS), (False, None, 0))) as pool:
+        futures = {pool.submit(_render_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            env_name, rows = futures[future]
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [([f"Error rendering {row['NFT_Number']}: {e}"], False, ((0, 0), (0, 0)), None, None) for row in rows]
+            for row, (log, ok, drained, _, _) in zip(rows, results):
+                for line in log:
+                    print(line)
+                if ok:
+                    manifest.record(row['NFT_Number'], digests[row['NFT_Number']])
+                else:
+                    failed += 1
+                    if row['NFT_Number'] in manifest.entries:
+                        manifest.discard(row['NFT_Number'])
+                for total_, (hits, misses) in zip(totals, drained):
+                    total_[0] += hits
+                    total_[1] += misses
+            left[env_name] -= len(rows)
+            if not left[env_name]:
+                print(f"{env_name} complete.")
+            progress.advance(len(rows))
+    manifest.save()
+    print(f"Finished {total - failed} NFTs ({failed} failed) in {format_eta(time.perf_counter() - progress.started)}.")
+    print(format_cache_stats("Layer cache", *totals[0]))
+    print(format_cache_stats("Composite cache", *totals[1]))
+
+    if skip_metadata:
+        return
+    print(f"--- Metadata for {generator.PNG_DIR} ---")
+    metadata_engine.write_metadata(generator.PNG_DIR, metadata_dir, csv_index=metadata_engine.CsvIndex(csv_map),
+                                   force=force, packed=packed, seed=seed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render every drop of the collection on one process pool, then write its metadata")
+    parser.add_argument("--drops", default=DEFAULT_DROPS, help="JSON file registering the drops (default: %(default)s if present)")
+    parser.add_argument("--only", action="append", metavar="ENV", help="Build just this drop (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: one per CPU)")
+    parser.add_argument("--cache-mb", type=float, default=None, help="Decoded layer cache budget per process in MB")
+    parser.add_argument("--composite-mb", type=float, default=None, help="Partial composite cache budget per process in MB")
+    parser.add_argument("--preprocess", action="store_true", help="Crop trait layers to their alpha bounding boxes before rendering")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild every NFT and edition; by default ones up to date with their build manifests are skipped")
+    parser.add_argument("--png-level", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="PNG zlib compression level (lower is faster and larger; default: Pillow's)")
+    parser.add_argument("--derivatives", type=generator.parse_derivatives, metavar="NAME:SIZE:FORMAT,...",
+                        help="Also write smaller copies from the same composite, e.g. web:1024:png,thumb:256:webp")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="Render anyway when layer files or CSVs are missing (rows without a base are skipped)")
+    parser.add_argument("--packed", action="store_true", help="Write the metadata as one pack instead of a JSON file per edition")
+    parser.add_argument("--skip-metadata", action="store_true", help="Render images only")
+    parser.add_argument("--seed", type=int, default=None, help="Collection seed for the metadata pass")
+    args = parser.parse_args(argv)
+
+    build_collection(args.drops, only=args.only, workers=args.workers, cache_mb=args.cache_mb,
+                     composite_mb=args.composite_mb, preprocess=args.preprocess, force=args.force,
+                     png_level=args.png_level, derivatives=args.derivatives, allow_missing=args.allow_missing,
+                     packed=args.packed, skip_metadata=args.skip_metadata, seed=args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import json
+import hashlib
+
+# Bookkeeping files kept inside the output folders (manifest, hash cache, upload ledger,
+# catalog, shard records) are dot-files that never end in .json or .png, so the engines'
+# directory scans for metadata and images pass over them
+SCANNED_SUFFIXES = ('.json', '.png')
+
+def sidecar_name(name):
+    if name.lower().endswith(SCANNED_SUFFIXES):
+        raise ValueError(f"sidecar {name!r} would be picked up by directory scans")
+    return "." + name
+
+# Stored inside each output directory
+MANIFEST_NAME = sidecar_name("build_manifest")
+
+_FILE_DIGESTS = {}
+
+def file_digest(path):
+    # Content hash of an input file, memoised on (path, mtime, size) for the run
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    digest = _FILE_DIGESTS.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = _FILE_DIGESTS[key] = h.hexdigest()
+    return digest
+
+def input_digest(row, layer_paths=(), config=None):
+    # Everything that decides an output's bytes: its CSV row, the layer files it
+    # blends (by content, not mtime) and the settings it was built with
+    payload = {
+        "row": row,
+        "layers": [[os.path.basename(p), file_digest(p)] for p in layer_paths],
+        "config": config,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+class BuildManifest:
+    # output id -> input digest. Each finished output is appended to a journal
+    # straight away, so a crashed run still knows what it completed.
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.journal_path = self.path + ".journal"
+        self.entries = {}
+        self._journal = None
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        key, digest = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash
+                    if digest is None:
+                        self.entries.pop(key, None)
+                    else:
+                        self.entries[key] = digest
+
+    def is_current(self, key, digest, outputs=()):
+        return self.entries.get(key) == digest and all(os.path.exists(p) for p in outputs)
+
+    def discard(self, key):
+        # Output failed to build; journal a tombstone so a resume retries it
+        self.record(key, None)
+        del self.entries[key]
+
+    def record(self, key, digest):
+        self.entries[key] = digest
+        if self._journal is None:
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal.write(json.dumps([key, digest]) + "\n")
+        self._journal.flush()
+
+    def save(self):
+        # Fold the journal into the manifest with an atomic replace
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
@@ -0,0 +1,277 @@
+import os
+import json
+import argparse
+import numpy as np
+from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
+from metadata_production_engine import PNG_DIR, CsvIndex
+from build_manifest import sidecar_name
+
+# Hash is the low-frequency HASH_SIZE x HASH_SIZE DCT block of a SAMPLE_SIZE greyscale
+# thumbnail, one bit per coefficient. The usual 64-bit pHash (8x8 of 32px) cannot see
+# a small accessory on a 2048px canvas, so this uses 1024 bits from a 128px thumbnail.
+HASH_SIZE = 32
+SAMPLE_SIZE = 128
+HASH_BYTES = HASH_SIZE * HASH_SIZE // 8
+
+# Hamming distance (of 1024) at or below which two renders count as near-duplicates
+DEFAULT_THRESHOLD = 12
+
+# Hashes are cached per file on (mtime, size, hash size) so reruns only hash new or
+# re-rendered PNGs
+HASH_CACHE = sidecar_name("phash_cache")
+
+# Set bits per byte value, for popcounts over uint8 arrays
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+def _dct_matrix(n):
+    # Orthonormal DCT-II basis: coefficients = M @ x @ M.T
+    k = np.arange(n)[:, None]
+    m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+_DCT = _dct_matrix(SAMPLE_SIZE)
+
+def phash(path):
+    # Perceptual hash as bytes: one bit per low-frequency coefficient above the block's
+    # median (DC term left out of the median)
+    with Image.open(path) as img:
+        # Transparent pixels are composited on white first, as a viewer would show them
+        img = img.convert("RGBA")
+        flat = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        flat.alpha_composite(img)
+        small = flat.convert("L").resize((SAMPLE_SIZE, SAMPLE_SIZE), Image.LANCZOS, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.float64)
+    block = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    return np.packbits(block > np.median(block[1:])).tobytes()
+
+def _hash_file(path):
+    try:
+        return phash(path), None
+    except Exception as e:
+        return None, str(e)
+
+def hamming(a, b):
+    return int(_POPCOUNT[np.bitwise_xor(np.frombuffer(a, np.uint8), np.frombuffer(b, np.uint8))].sum())
+
+# Buckets of at most this many hashes are compared pair by pair; larger ones are split
+LEAF_BUCKET = 64
+
+# Hash bytes gathered per numpy batch when a whole bucket is compared
+COMPARE_BYTES = 1 << 24
+
+def _bucket_labels(chunk):
+    # Row-wise equal byte chunks -> equal integer labels
+    rows = np.ascontiguousarray(chunk).view(np.dtype((np.void, chunk.shape[1]))).ravel()
+    return np.unique(rows, return_inverse=True)[1].ravel()
+
+def _verified(keys, rows, a, b, threshold, seen):
+    # Local candidate pairs (a, b) -> pairs of rows within threshold bits. Pairs that agree
+    # on a chunk in seen are left out: they are compared under that chunk.
+    for labels in seen:
+        differ = labels[a] != labels[b]
+        a, b = a[differ], b[differ]
+    close = _POPCOUNT[keys[a] ^ keys[b]].sum(axis=1) <= threshold
+    a, b = rows[a[close]], rows[b[close]]
+    return np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)
+
+def _compare_all(keys, rows, threshold, seen):
+    # Every pair of the bucket: a block of rows at a time against the rows after it, so
+    # memory stays bounded
+    n = len(rows)
+    step = max(1, COMPARE_BYTES // (n * keys.shape[1]))
+    for start in range(0, n - 1, step):
+        stop = min(start + step, n - 1)
+        close = _POPCOUNT[keys[start:stop, None] ^ keys[None, start:]].sum(axis=2) <= threshold
+        close &= np.arange(start, n)[None, :] > np.arange(start, stop)[:, None]
+        for labels in seen:
+            close &= labels[start:stop, None] != labels[None, start:]
+        a, b = np.nonzero(close)
+        a, b = rows[a + start], rows[b + start]
+        yield np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)
+
+def _bucket_pairs(rows, keys, threshold, seen):
+    # Multi-index hashing, applied again inside every oversized bucket. keys holds the
+    # rows' hash bits that may still differ (packed), which is all a distance inside the
+    # bucket needs. The bits every row agrees on are dropped, and the rest split into
+    # threshold + 1 chunks: by pigeonhole two rows within threshold bits agree exactly on
+    # at least one chunk, so only rows sharing a chunk value are compared. Renders of one
+    # base share most of their hash and land in one bucket; the split inside it only
+    # looks at where they differ, and a bucket the chunks hardly separate is compared whole.
+    # Each pair is only compared under the first chunk it agrees on: seen holds the labels
+    # (per row) of the chunks already handled at this level and above.
+    n = len(rows)
+    bits = np.unpackbits(keys, axis=1)
+    bits = bits[:, (bits != bits[0]).any(axis=0)]
+    keys = np.packbits(bits, axis=1)
+    if n <= LEAF_BUCKET or bits.shape[1] <= threshold:
+        yield from _compare_all(keys, rows, threshold, seen)
+        return
+    chunks = [_bucket_labels(np.packbits(bits[:, cols], axis=1))
+              for cols in np.array_split(np.arange(bits.shape[1]), threshold + 1)]
+
+    # Plan the split: per chunk, the small groups compared at once and the large groups
+    # split further, leaving out any group an earlier chunk already held whole
+    plan, work, earlier = [], 0, list(seen)
+    for labels in chunks:
+        counts = np.bincount(labels)
+        work += int((counts * (counts - 1) // 2)[counts <= LEAF_BUCKET].sum())
+        large = []
+        for label in np.flatnonzero(counts > LEAF_BUCKET):
+            group = np.flatnonzero(labels == label)
+            if not any((prev[group] == prev[group[0]]).all() for prev in earlier):
+                large.append(group)
+                work += len(group) * (len(group) - 1) // 2
+        plan.append((labels, counts, large))
+        earlier.append(labels)
+    if 2 * work >= n * (n - 1) // 2:
+        # The chunks hardly separate these rows; comparing them all is cheaper
+        yield from _compare_all(keys, rows, threshold, seen)
+        return
+
+    seen = list(seen)
+    for labels, counts, large in plan:
+        order = np.argsort(labels, kind='stable')
+        sorted_labels = labels[order]
+        small = counts[sorted_labels] <= LEAF_BUCKET
+        # Small groups: all their pairs at once, comparing the sorted labels at each offset
+        for k in range(1, min(LEAF_BUCKET, n)):
+            same = (sorted_labels[k:] == sorted_labels[:-k]) & small[k:]
+            if not same.any():
+                break
+            yield _verified(keys, rows, order[:-k][same], order[k:][same], threshold, seen)
+        for group in large:
+            yield from _bucket_pairs(rows[group], keys[group], threshold, [prev[group] for prev in seen])
+        seen.append(labels)
+
+def iter_near_pairs(matrix, threshold):
+    # Every (i, j), i < j, within threshold bits, without comparing all n^2 pairs. Yields
+    # arrays of pairs bucket by bucket as it goes; each pair comes up once.
+    if len(matrix) > 1:
+        yield from _bucket_pairs(np.arange(len(matrix)), matrix, threshold, [])
+
+def near_pairs(matrix, threshold):
+    found = list(iter_near_pairs(matrix, threshold))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(found), axis=0)
+
+def load_hash_cache(png_dir):
+    path = os.path.join(png_dir, HASH_CACHE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_hash_cache(png_dir, cache):
+    path = os.path.join(png_dir, HASH_CACHE)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+def hash_directory(png_dir=PNG_DIR, workers=None, use_cache=True):
+    # {NFT id: hash} for every PNG, hashing only files the cache does not already cover
+    cache = load_hash_cache(png_dir) if use_cache else {}
+    hashes, todo, stamps = {}, [], {}
+    with os.scandir(png_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.png') or not entry.is_file():
+                continue
+            st = entry.stat()
+            stamp = [st.st_mtime_ns, st.st_size, HASH_SIZE]
+            cached = cache.get(entry.name)
+            if cached and cached[:3] == stamp:
+                hashes[entry.name[:-len('.png')]] = bytes.fromhex(cached[3])
+            else:
+                todo.append(entry.name)
+                stamps[entry.name] = stamp
+
+    print(f"Hashing {len(todo)} PNGs ({len(hashes)} cached)...")
+    fresh = {name: entry for name, entry in cache.items() if name[:-len('.png')] in hashes}
+    if todo:
+        paths = [os.path.join(png_dir, name) for name in todo]
+        chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for name, (value, error) in zip(todo, pool.map(_hash_file, paths, chunksize=chunksize)):
+                if error:
+                    print(f"Error hashing {name}: {error}")
+                    continue
+                hashes[name[:-len('.png')]] = value
+                fresh[name] = stamps[name] + [value.hex()]
+    if use_cache:
+        save_hash_cache(png_dir, fresh)
+    return hashes
+
+def find_duplicate_groups(hashes, threshold=DEFAULT_THRESHOLD):
+    # Union-find over near pairs -> [[ids]] (size >= 2). Identical hashes are folded
+    # together first so a large exact-duplicate set costs one row, not n^2 candidates.
+    ids = sorted(hashes)
+    if not ids:
+        return []
+    matrix = np.frombuffer(b"".join(hashes[i] for i in ids), dtype=np.uint8).reshape(len(ids), -1)
+    unique_rows, owner = np.unique(matrix, axis=0, return_inverse=True)
+    owner = owner.ravel()
+    parent = list(range(len(unique_rows)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for pairs in iter_near_pairs(unique_rows, threshold):
+        for i, j in pairs.tolist():
+            parent[find(i)] = find(j)
+
+    groups = {}
+    for i, nft_id in enumerate(ids):
+        groups.setdefault(find(int(owner[i])), []).append(nft_id)
+    return sorted((g for g in groups.values() if len(g) > 1), key=lambda g: (-len(g), g[0]))
+
+def group_report(groups, hashes, csv_index=None):
+    # Each group with the pairwise spread of its hashes and every member's CSV row
+    csv_index = csv_index or CsvIndex()
+    report = []
+    for group in groups:
+        rows = np.frombuffer(b"".join(hashes[i] for i in group), dtype=np.uint8).reshape(len(group), -1)
+        spread = max(int(_POPCOUNT[rows ^ row].sum(axis=1).max()) for row in rows)
+        members = []
+        for nft_id in group:
+            prefix = nft_id.split('_')[0]
+            members.append({"id": nft_id, "phash": hashes[nft_id].hex(), "csv_row": csv_index.row(prefix, nft_id)})
+        report.append({"size": len(group), "max_distance": spread, "members": members})
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find rendered PNGs that look nearly identical (perceptual hash)")
+    parser.add_argument("--dir", default=PNG_DIR, help="Folder of rendered PNGs")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help=f"Max Hamming distance (0-{HASH_BYTES * 8}) between near-duplicates (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="Hashing processes (default: one per CPU)")
+    parser.add_argument("--no-cache", action="store_true", help="Rehash every PNG and leave the hash cache alone")
+    parser.add_argument("--report", help="Also write the groups as JSON")
+    args = parser.parse_args(argv)
+
+    hashes = hash_directory(args.dir, workers=args.workers, use_cache=not args.no_cache)
+    groups = find_duplicate_groups(hashes, args.threshold)
+    report = group_report(groups, hashes)
+
+    for n, group in enumerate(report, 1):
+        print(f"Group {n}: {group['size']} images, up to {group['max_distance']} bits apart")
+        for member in group["members"]:
+            row = member["csv_row"]
+            traits = ", ".join(f"{k}={v}" for k, v in row.items()) if row else "(no CSV row)"
+            print(f"  {member['id']:<12}{member['phash'][:16]}  {traits}")
+    duplicated = sum(g["size"] for g in report)
+    print(f"{len(report)} near-duplicate groups ({duplicated} images) among {len(hashes)} PNGs at threshold {args.threshold}.")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"threshold": args.threshold, "images": len(hashes), "groups": report}, f, indent=2)
+        print(f"Report: {args.report}")
+    return report
+
+if __name__ == "__main__":
+    main()
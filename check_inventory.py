@@ -1,10 +1,10 @@
 import pandas as pd
+from workbook_cache import load_sheet
 
 excel_path = r"c:\Users\HHeltzinger\Desktop\WaterIsLife\WaterIsLife.xlsx"
 
 try:
-    xl = pd.ExcelFile(excel_path)
-    df = xl.parse('Package_Inventory')
+    df = load_sheet('Package_Inventory', excel_path)
     pd.set_option('display.max_columns', None)
     pd.set_option('display.width', 1000)
     print(df.head(50))
@@ -1,6 +1,14 @@
 import os
 import json
 import random
+import argparse
+import stat
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metadata_pack import PackReader, PackWriter, replace_pack
+from run_stats import RunStats, NO_STATS, add_stats_argument
+from seeding import item_rng, in_shard, parse_shard, shard_total, write_shard_record
 
 # Configuration
 MASTER_DIR = r"C:\Users\HHeltzinger\Desktop\Master_Upload_Full"
@@ -20,7 +28,7 @@ GLOBAL_NOTES = [
 THEME_DATA = {
     "WaterIsLife - Rainforest": {
         "stats": {
-            "Canopy Humidity (%)": lambda: random.randint(85, 100),
+            "Canopy Humidity (%)": lambda rng: rng.randint(85, 100),
             "Bird Sighting": ["Golden Toucan", "Emerald Hummingbird", "Shadow Jaguar", "None"],
             "Jungle Density": ["Sparse", "Thick", "Ancient Overgrowth"]
         },
@@ -34,7 +42,7 @@ THEME_DATA = {
         "stats": {
             "Frog Mood": ["Vibe Master", "Grumpy Bullfrog", "Zen Tadpole", "Hungry"],
             "Lilypad Health": ["Vibrant", "Slightly Nibbled", "Glowing (Rare)", "Standard"],
-            "Algae Density (%)": lambda: random.randint(5, 40)
+            "Algae Density (%)": lambda rng: rng.randint(5, 40)
         },
         "notes": [
             "One of the frogs stared at me. It was unsettling.",
@@ -44,7 +52,7 @@ THEME_DATA = {
     },
     "WaterIsLife - Well House": {
         "stats": {
-            "Echo Depth (m)": lambda: random.randint(50, 200),
+            "Echo Depth (m)": lambda rng: rng.randint(50, 200),
             "Spiritual Resonance": ["Harmonious", "Low Hum", "Eerie Frequency", "Ancient"],
             "Ghost Sightings": ["None... probably", "A faint glimmer", "Confirmed Specter!", "Just the wind"]
         },
@@ -56,9 +64,9 @@ THEME_DATA = {
     },
     "WaterIsLife - Beach Life": {
         "stats": {
-            "Salt Density (g/L)": lambda: random.randint(30, 45),
+            "Salt Density (g/L)": lambda rng: rng.randint(30, 45),
             "Tide State": ["High", "Low", "Incoming", "Outgoing", "Tidal Wave!"],
-            "Shell Count": lambda: random.randint(0, 50)
+            "Shell Count": lambda rng: rng.randint(0, 50)
         },
         "notes": [
             "I found sand in my virtual processors after this analysis.",
@@ -82,47 +90,184 @@ THEME_DATA = {
     }
 }
 
-def enhance_metadata():
-    print(f"Enhancing 438 files in {MASTER_DIR}...")
+OBSERVATION_MARKER = "[RandyAI Observation]"
+
+def is_enhanced(data):
+    # A second pass would stack another set of stats and another observation on top
+    if OBSERVATION_MARKER in data.get("description", ""):
+        return True
+    return any(a.get("trait_type") == "Water Purity (%)" for a in data.get("attributes", []))
+
+# Trait types enhance_record draws at random per item: the global readings and every theme stat
+RANDOM_TRAIT_TYPES = ["Water Purity (%)", "Temperature (°C)"] + sorted(
+    {trait_type for theme in THEME_DATA.values() for trait_type in theme["stats"]})
+
+def record_id(data, key):
+    # Seeded draws follow the NFT id the metadata engine stored as "Water ID", falling back to the file key
+    for a in data.get("attributes", []):
+        if a.get("trait_type") == "Water ID":
+            return a.get("value")
+    return key
+
+def enhance_record(data, rng=random):
+    collection_name = data.get("collection", "")
+    # Handle Beach Life name variation
+    if "Beach Life" in collection_name:
+        collection_name = "WaterIsLife - Beach Life"
+        
+    theme = THEME_DATA.get(collection_name, {})
     
-    files = [f for f in os.listdir(MASTER_DIR) if f.endswith(".json")]
+    # 1. Global Attributes
+    data["attributes"].append({"trait_type": "Water Purity (%)", "value": rng.randint(10, 100) if "Outfall" not in collection_name else rng.randint(0, 30)})
+    data["attributes"].append({"trait_type": "Temperature (°C)", "value": rng.randint(-5, 45)})
     
-    for filename in files:
-        filepath = os.path.join(MASTER_DIR, filename)
-        
+    # 2. Theme Attributes
+    if theme:
+        for trait_type, source in theme["stats"].items():
+            if callable(source):
+                val = source(rng)
+            else:
+                val = rng.choice(source)
+            data["attributes"].append({"trait_type": trait_type, "value": val})
+    
+    # 3. Description Overhaul (RandyAI Notes)
+    original_desc = data.get("description", "")
+    personal_note = rng.choice(theme.get("notes", GLOBAL_NOTES)) if theme else rng.choice(GLOBAL_NOTES)
+    data["description"] = f"{original_desc}\n\n{OBSERVATION_MARKER}: {personal_note}"
+    return data
+
+# Queried on the first new file rather than at import: os.umask can only be read by
+# setting it, so the lock keeps writer threads from seeing (or restoring) the 0 in between
+_UMASK = None
+_UMASK_LOCK = threading.Lock()
+
+def _umask():
+    global _UMASK
+    with _UMASK_LOCK:
+        if _UMASK is None:
+            _UMASK = os.umask(0)
+            os.umask(_UMASK)
+        return _UMASK
+
+def _file_mode(filepath):
+    # Mode a plain open() would leave: the target's own when it exists, else 0666 less the umask
+    try:
+        return stat.S_IMODE(os.stat(filepath).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_umask()
+
+def write_json_atomic(filepath, data):
+    # Write beside the target then rename over it, so a crash never leaves a half-written file.
+    # mkstemp creates the temp file 0600, so it gets the target's mode before the rename.
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath), prefix=".tmp-", suffix=".part")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.chmod(tmp_path, _file_mode(filepath))
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def file_key(filename):
+    return filename[:-len(".json")]
+
+def enhance_file(filepath, stats=NO_STATS, seed=None):
+    with stats.stage("read"):
         with open(filepath, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            
-        collection_name = data.get("collection", "")
-        # Handle Beach Life name variation
-        if "Beach Life" in collection_name:
-            collection_name = "WaterIsLife - Beach Life"
-            
-        theme = THEME_DATA.get(collection_name, {})
-        
-        # 1. Global Attributes
-        data["attributes"].append({"trait_type": "Water Purity (%)", "value": random.randint(10, 100) if "Outfall" not in collection_name else random.randint(0, 30)})
-        data["attributes"].append({"trait_type": "Temperature (°C)", "value": random.randint(-5, 45)})
-        
-        # 2. Theme Attributes
-        if theme:
-            for trait_type, source in theme["stats"].items():
-                if callable(source):
-                    val = source()
-                else:
-                    val = random.choice(source)
-                data["attributes"].append({"trait_type": trait_type, "value": val})
-        
-        # 3. Description Overhaul (RandyAI Notes)
-        original_desc = data.get("description", "")
-        personal_note = random.choice(theme.get("notes", GLOBAL_NOTES)) if theme else random.choice(GLOBAL_NOTES)
-        data["description"] = f"{original_desc}\n\n[RandyAI Observation]: {personal_note}"
-        
-        # Save back
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    if is_enhanced(data):
+        return "skipped"
+    with stats.stage("enhance"):
+        data = enhance_record(data, item_rng(seed, record_id(data, file_key(os.path.basename(filepath))), "enhance"))
+    with stats.stage("write"):
+        write_json_atomic(filepath, data)
+    stats.count("json_files")
+    return "enhanced"
+
+def enhance_metadata(master_dir=MASTER_DIR, workers=1, stats=NO_STATS, seed=None, shard=None):
+    all_files = [f for f in os.listdir(master_dir) if f.endswith(".json")]
+    files = [f for f in all_files if in_shard(file_key(f), shard)]
+    print(f"Enhancing {len(files)} files in {master_dir}...")
+
+    counts = {"enhanced": 0, "skipped": 0, "failed": 0}
+    failed = []
+    paths = [os.path.join(master_dir, filename) for filename in files]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(enhance_file, path, stats, seed): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                counts[future.result()] += 1
+                stats.count("items")
+            except Exception as e:
+                counts["failed"] += 1
+                failed.append(file_key(os.path.basename(futures[future])))
+                print(f"Error enhancing {os.path.basename(futures[future])}: {e}")
+
+    if shard is not None:
+        keys = [file_key(f) for f in files]
+        write_shard_record(master_dir, "creative_metadata_engine", shard, seed, shard_total(master_dir, shard, len(all_files)),
+                           keys, [f"{key}.json" for key in keys if key not in failed], missing=failed)
+
+    print(f"Enhanced {counts['enhanced']}, skipped {counts['skipped']} already enhanced, failed {counts['failed']}.")
+    if counts["enhanced"] and not counts["failed"]:
+        print("Success! Every NFT now has unique Lore and Stats.")
+    return counts
+
+def enhance_pack(pack_path, stats=NO_STATS, seed=None, shard=None):
+    # Packed metadata: stream the pack into a fresh one beside it, then swap it in.
+    # Records outside --shard are copied through untouched.
+    tmp_path = pack_path + ".tmp"
+    counts = {"enhanced": 0, "skipped": 0, "failed": 0}
+    keys, failed = [], []
+    with PackReader(pack_path) as reader, PackWriter(tmp_path) as writer:
+        total = len(reader)
+        print(f"Enhancing {total} records in {pack_path}...")
+        for key, data in reader:
+            if in_shard(key, shard):
+                keys.append(key)
+                try:
+                    if is_enhanced(data):
+                        counts["skipped"] += 1
+                    else:
+                        with stats.stage("enhance"):
+                            data = enhance_record(data, item_rng(seed, record_id(data, key), "enhance"))
+                        counts["enhanced"] += 1
+                except Exception as e:
+                    counts["failed"] += 1
+                    failed.append(key)
+                    print(f"Error enhancing {key}: {e}")
+            with stats.stage("write"):
+                writer.write(key, data)
+            stats.count("items")
+    replace_pack(tmp_path, pack_path)
+    if shard is not None:
+        folder = os.path.dirname(os.path.abspath(pack_path))
+        write_shard_record(folder, "creative_metadata_engine", shard, seed, shard_total(folder, shard, total), keys,
+                           [key for key in keys if key not in failed], pack=os.path.basename(pack_path), missing=failed)
 
-    print("Success! Every NFT now has unique Lore and Stats.")
+    print(f"Enhanced {counts['enhanced']}, skipped {counts['skipped']} already enhanced, failed {counts['failed']}.")
+    if counts["enhanced"] and not counts["failed"]:
+        print("Success! Every NFT now has unique Lore and Stats.")
+    return counts
 
 if __name__ == "__main__":
-    enhance_metadata()
+    parser = argparse.ArgumentParser(description="Add RandyAI lore and stats to every metadata JSON in MASTER_DIR")
+    parser.add_argument("--dir", default=MASTER_DIR)
+    parser.add_argument("--workers", type=int, default=1, help="Thread pool size (default: 1)")
+    parser.add_argument("--packed", metavar="PACK", help="Enhance a metadata .jsonl pack instead of the JSON files in --dir")
+    add_stats_argument(parser)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Collection seed: each NFT's stats and note then depend only on the seed and its id")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="Only enhance the files of shard I of N (merge the shards with merge_shards.py)")
+    args = parser.parse_args()
+    stats = RunStats("creative_metadata_engine", enabled=bool(args.stats))
+    if args.packed:
+        enhance_pack(args.packed, stats=stats, seed=args.seed, shard=args.shard)
+    else:
+        enhance_metadata(args.dir, workers=args.workers, stats=stats, seed=args.seed, shard=args.shard)
+    if args.stats:
+        stats.print_summary()
+        stats.write(args.stats, {"settings": {"dir": args.dir, "packed": args.packed, "workers": args.workers,
+                                              "seed": args.seed, "shard": args.shard}})
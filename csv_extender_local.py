@@ -1,10 +1,47 @@
 import csv
 import random
 import os
+import time
+import argparse
+import numpy as np
+from run_stats import RunStats, NO_STATS, add_stats_argument
+from seeding import item_rng, item_seed
+from trait_matrix import TraitMatrix, matrix_base
 
-def expand_csv(input_path, output_path, target_count, prefix):
+def combo_index(row, trait_cols, trait_pools):
+    # Mixed-radix index of a row's traits, or None if it uses a value outside the pools
+    index = 0
+    for h in trait_cols:
+        pool = trait_pools[h]
+        if row[h] not in pool:
+            return None
+        index = index * len(pool) + pool.index(row[h])
+    return index
+
+def decode_combo(index, trait_cols, trait_pools, radices):
+    values = []
+    for h, radix in zip(reversed(trait_cols), reversed(radices)):
+        index, digit = divmod(index, radix)
+        values.append(trait_pools[h][digit])
+    return values[::-1]
+
+def existing_combos(matrix, trait_cols, trait_pools, space):
+    # Set of combo_index values of the matrix rows, computed a column at a time on the
+    # integer codes; rows using a value outside the pools are left out, as in combo_index
+    if space >= 2 ** 63:
+        return {i for i in (combo_index(row, trait_cols, trait_pools) for row in matrix.rows()) if i is not None}
+    keys = np.zeros(len(matrix), dtype=np.int64)
+    valid = np.ones(len(matrix), dtype=bool)
+    for h in trait_cols:
+        digits = matrix.pool_codes(h, trait_pools[h])
+        valid &= digits >= 0
+        keys = keys * len(trait_pools[h]) + np.maximum(digits, 0)
+    return set(keys[valid].tolist())
+
+def expand_csv(input_path, output_path, target_count, prefix, seed=None, stats=NO_STATS, save_matrix=False):
     print(f"Expanding {input_path} to {target_count} rows...")
     
+    start = time.perf_counter()
     with open(input_path, 'r', encoding='utf-8') as f:
         reader = list(csv.DictReader(f))
         headers = reader[0].keys()
@@ -17,7 +54,8 @@ def expand_csv(input_path, output_path, target_count, prefix):
                 trait_pools[h].add(row[h])
     
     for h in trait_pools:
-        trait_pools[h] = list(trait_pools[h])
+        # Sorted so a given seed always maps to the same rows
+        trait_pools[h] = sorted(trait_pools[h])
         # ONLY add 'None' to Accessories, NEVER to Base
         if h.startswith('Accessory_'):
             if 'none' not in [t.lower() for t in trait_pools[h]]:
@@ -26,45 +64,85 @@ def expand_csv(input_path, output_path, target_count, prefix):
     # Rarity distribution
     rarities = ["Common", "Uncommon", "Rare", "Legendary"]
     rarity_weights = [0.60, 0.25, 0.12, 0.03]
-    
-    existing_combinations = set()
-    for row in reader:
-        combo = tuple(row[h] for h in headers if h.startswith('Accessory_') or h == 'Base_Variation' or h == 'Base_Color')
-        existing_combinations.add(combo)
-    
+    # A seed picks the new combinations for this prefix as a whole, and each new row's
+    # rarity from its own NFT id, so neither depends on other CSVs expanded in the same run
+    rng = random.Random(None if seed is None else item_seed(seed, prefix, "combinations"))
+
+    # Every combination is one index in a mixed-radix space (one digit per trait column),
+    # so unique combinations can be drawn directly instead of rejection-sampled
+    trait_cols = [h for h in headers if h.startswith('Accessory_') or h == 'Base_Variation' or h == 'Base_Color']
+    radices = [len(trait_pools[h]) for h in trait_cols]
+    space = 1
+    for r in radices:
+        space *= r
+
+    stats.record("load", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    existing_indices = existing_combos(TraitMatrix.from_rows(reader, list(headers)), trait_cols, trait_pools, space)
+
+    needed = max(0, target_count - len(reader))
+    available = space - len(existing_indices)
+    if needed > available:
+        print(f"Error: cannot reach {target_count} rows. Only {available} unused combinations remain "
+              f"({space} possible, {len(existing_indices)} already used, {len(reader)} existing rows).")
+        return False
+
+    # sample() draws without replacement in O(k) even for a huge range; drawing
+    # len(existing) extra guarantees enough picks survive the exclusion
+    draws = rng.sample(range(space), needed + len(existing_indices))
+    picks = [i for i in draws if i not in existing_indices][:needed]
+
+    stats.record("sample", time.perf_counter() - start)
+
+    start = time.perf_counter()
     expanded_rows = reader.copy()
     current_id = len(reader) + 1
     
-    while len(expanded_rows) < target_count:
+    for index in picks:
+        combo = dict(zip(trait_cols, decode_combo(index, trait_cols, trait_pools, radices)))
         new_row = {}
         new_row['NFT_Number'] = f"{prefix}_{str(current_id).zfill(3)}"
         
         for h in headers:
             if h == 'NFT_Number': continue
             if h == 'Final_Rarity':
-                new_row[h] = random.choices(rarities, weights=rarity_weights)[0]
+                rarity_rng = rng if seed is None else item_rng(seed, new_row['NFT_Number'], "rarity")
+                new_row[h] = rarity_rng.choices(rarities, weights=rarity_weights)[0]
                 continue
             
-            if h in trait_pools:
-                new_row[h] = random.choice(trait_pools[h])
+            if h in combo:
+                new_row[h] = combo[h]
             else:
                 new_row[h] = ""
+        expanded_rows.append(new_row)
+        current_id += 1
+
+    stats.record("build_rows", time.perf_counter() - start)
 
-        # Ensure uniqueness
-        combo = tuple(new_row[h] for h in headers if h.startswith('Accessory_') or h == 'Base_Variation' or h == 'Base_Color')
-        if combo not in existing_combinations:
-            existing_combinations.add(combo)
-            expanded_rows.append(new_row)
-            current_id += 1
-
-    with open(output_path, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=headers)
-        writer.writeheader()
-        writer.writerows(expanded_rows)
+    with stats.stage("write"):
+        with open(output_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=headers)
+            writer.writeheader()
+            writer.writerows(expanded_rows)
+    if save_matrix:
+        with stats.stage("write_matrix"):
+            TraitMatrix.from_rows(expanded_rows, list(headers)).save(matrix_base(output_path))
+    stats.count("items", len(picks))
+    stats.count("csv_rows_written", len(expanded_rows))
     
     print(f"Success! {output_path} now has {len(expanded_rows)} rows.")
+    return True
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expand combination CSVs with unique random rows")
+    parser.add_argument("--seed", type=int, default=None, help="Collection seed for reproducible output")
+    add_stats_argument(parser)
+    parser.add_argument("--matrix", action="store_true",
+                        help="Also save each expanded CSV as an integer-coded trait matrix beside it (see trait_matrix.py)")
+    args = parser.parse_args()
+    stats = RunStats("csv_extender", enabled=bool(args.stats))
+
     base_dir = r"C:\Users\HHeltzinger\Desktop\WaterIsLife"
     configs = [
         (r"Drop014_FactorySprings\FactorySprings_NFT_Combinations.csv", "FS")
@@ -75,4 +153,8 @@ if __name__ == "__main__":
         base_filename = os.path.basename(filename)
         output_name = base_filename.replace(".csv", "_Full_1188.csv")
         output_path = os.path.join(base_dir, output_name)
-        expand_csv(input_path, output_path, 1188, prefix)
+        expand_csv(input_path, output_path, 1188, prefix, seed=args.seed, stats=stats, save_matrix=args.matrix)
+
+    if args.stats:
+        stats.print_summary()
+        stats.write(args.stats, {"settings": {"seed": args.seed, "matrix": args.matrix}})
@@ -1,4 +1,4 @@
-import pandas as pd
+from workbook_cache import load_sheet
 excel_path = r"c:\Users\HHeltzinger\Desktop\WaterIsLife\WaterIsLife.xlsx"
-df = pd.read_excel(excel_path, sheet_name='Trait_Rarity_Master')
+df = load_sheet('Trait_Rarity_Master', excel_path)
 print(df.dropna(how='all'))
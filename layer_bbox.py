@@ -0,0 +1,64 @@
+import os
+import json
+from PIL import Image
+
+# Cropped trait layers and their offsets live next to the drop's artwork
+BBOX_DIR = "_bbox"
+BBOX_INDEX = "bbox_index.json"
+
+def preprocess_layers(base_dir, exclude=()):
+    # Crop every trait PNG in base_dir to its alpha bounding box and record the offset
+    # so the compositor only blends the non-transparent region
+    out_dir = os.path.join(base_dir, BBOX_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    index = load_bbox_index(base_dir)
+
+    cropped = reused = 0
+    saved_px = total_px = 0
+    for filename in sorted(os.listdir(base_dir)):
+        if not filename.lower().endswith('.png') or filename in exclude:
+            continue
+        src = os.path.join(base_dir, filename)
+        mtime_ns = os.stat(src).st_mtime_ns
+        entry = index.get(filename)
+        if entry and entry['mtime_ns'] == mtime_ns and (entry['empty'] or os.path.exists(os.path.join(out_dir, filename))):
+            reused += 1
+        else:
+            img = Image.open(src).convert("RGBA")
+            bbox = img.getchannel("A").getbbox()
+            entry = {"mtime_ns": mtime_ns, "canvas": list(img.size), "empty": bbox is None}
+            if bbox:
+                img.crop(bbox).save(os.path.join(out_dir, filename))
+                entry["offset"] = [bbox[0], bbox[1]]
+                entry["size"] = [bbox[2] - bbox[0], bbox[3] - bbox[1]]
+            index[filename] = entry
+            cropped += 1
+        canvas_px = entry["canvas"][0] * entry["canvas"][1]
+        total_px += canvas_px
+        saved_px += canvas_px if entry["empty"] else canvas_px - entry["size"][0] * entry["size"][1]
+
+    with open(os.path.join(out_dir, BBOX_INDEX), 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+
+    pct = saved_px / total_px if total_px else 0.0
+    print(f"Bounding boxes: {cropped} layers cropped, {reused} up to date, {pct:.1%} of layer pixels skipped per blend")
+    return index
+
+def load_bbox_index(base_dir):
+    path = os.path.join(base_dir, BBOX_DIR, BBOX_INDEX)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def resolve_cropped(index, layer_path):
+    # (path, offset) to blend for a trait layer: the cropped copy when the index is
+    # current for it, the full-canvas file otherwise. Fully transparent layers
+    # resolve to None since blending them changes nothing.
+    entry = index.get(os.path.basename(layer_path))
+    if not entry or entry['mtime_ns'] != os.stat(layer_path).st_mtime_ns:
+        return layer_path, (0, 0)
+    if entry['empty']:
+        return None
+    base_dir = os.path.dirname(layer_path)
+    return os.path.join(base_dir, BBOX_DIR, os.path.basename(layer_path)), tuple(entry['offset'])
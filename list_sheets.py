@@ -1,4 +1,3 @@
-import pandas as pd
+from workbook_cache import sheet_names
 excel_path = r"c:\Users\HHeltzinger\Desktop\WaterIsLife\WaterIsLife.xlsx"
-xl = pd.ExcelFile(excel_path)
-print(xl.sheet_names)
+print(sheet_names(excel_path))
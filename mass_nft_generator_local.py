@@ -2,7 +2,21 @@ import os
 import csv
 import json
 import random
+import io
+import queue
+import argparse
+import functools
+import time
+import cProfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+from render_cache import LayerCache, CompositeCache, format_cache_stats
+from layer_bbox import preprocess_layers, load_bbox_index, resolve_cropped
+from build_manifest import BuildManifest, input_digest
+from metadata_pack import PackWriter, PACK_SUFFIX, load_index
+from run_stats import RunStats, SlowestProfiles, add_stats_argument
+from seeding import in_shard, parse_shard, write_shard_record
 
 # Configuration
 BASE_PROJECT_DIR = r"C:\Users\HHeltzinger\Desktop\WaterIsLife"
@@ -41,26 +55,81 @@ CONFIG = {
 PNG_DIR = os.path.join(BASE_PROJECT_DIR, "PNG_Production")
 JSON_DIR = os.path.join(BASE_PROJECT_DIR, "MetaData_Production")
 
-os.makedirs(PNG_DIR, exist_ok=True)
-os.makedirs(JSON_DIR, exist_ok=True)
+# Decoded layers and partial composites shared by every row in this process
+# (one pair of caches per pool worker)
+LAYER_CACHE = LayerCache()
+COMPOSITE_CACHE = CompositeCache(LAYER_CACHE)
 
-def generate_nft(env_name, row):
-    cfg = CONFIG[env_name]
-    nft_num = row['NFT_Number']
+# --stats / --profile instrumentation; off unless run_drop (or _init_worker) turns it on
+RUN_STATS = RunStats("mass_nft_generator", enabled=False)
+PROFILER = None
+
+def _emit(log, message):
+    # Serial runs print straight away, pool workers collect lines for the parent
+    if log is None:
+        print(message)
+    else:
+        log.append(message)
+
+# Settings that change the rendered bytes; pool workers get a copy in _init_worker.
+# "derivatives" ([name, size, format] largest first) is only present when requested,
+# so builds without --derivatives keep their manifest digests.
+RENDER_OPTIONS = {"png_level": None}
+
+# --derivatives formats -> Pillow format names
+DERIVATIVE_FORMATS = {"png": "PNG", "webp": "WEBP"}
+
+_STOP = object()
+
+class _StageDown(Exception):
+    # Raised in a pipeline thread (or run_pipeline) when another stage has died
+    pass
+
+# Per-drop crop indexes written by --preprocess, loaded once per process
+_BBOX_INDEXES = {}
+
+# File names in each drop folder, listed once per process instead of a stat per layer per row
+_LAYER_FILES = {}
+
+def load_layer(path):
+    return LAYER_CACHE.get(path)
+
+def bbox_index(base_dir):
+    if base_dir not in _BBOX_INDEXES:
+        _BBOX_INDEXES[base_dir] = load_bbox_index(base_dir)
+    return _BBOX_INDEXES[base_dir]
+
+def layer_files(base_dir):
+    if base_dir not in _LAYER_FILES:
+        names = set()
+        if os.path.isdir(base_dir):
+            with os.scandir(base_dir) as entries:
+                names = {os.path.normcase(e.name) for e in entries if e.is_file()}
+        _LAYER_FILES[base_dir] = names
+    return _LAYER_FILES[base_dir]
+
+def render_order_key(row):
+    # Rows sorted by this key render shared base+accessory prefixes back to back
     base_val = row['Base_Variation'] if 'Base_Variation' in row else row['Base_Color']
-    rarity = row['Final_Rarity']
-    
+    accessories = [row.get(f'Accessory_{i}') for i in range(1, 6)]
+    return [base_val or ""] + [acc for acc in accessories if acc and acc.lower() != 'none']
+
+def plan_row(cfg, row):
+    # Layer files for a row against the drop's directory index:
+    # (base path or None, [accessory paths found], [(kind, missing path)])
+    files = layer_files(cfg['base_dir'])
+    base_val = row['Base_Variation'] if 'Base_Variation' in row else row['Base_Color']
+    missing = []
+
     # 1. Resolve Base Image
     mapped_base = cfg['base_map'].get(base_val, base_val)
     base_filename = f"{mapped_base}.png"
     base_path = os.path.join(cfg['base_dir'], base_filename)
-    
-    if not os.path.exists(base_path):
-        print(f"Error: Base file not found: {base_path}")
-        return
+    if os.path.normcase(base_filename) not in files:
+        missing.append(("base", base_path))
+        base_path = None
 
-    img = Image.open(base_path).convert("RGBA")
-    
+    acc_paths = []
     accessories = [row.get(f'Accessory_{i}') for i in range(1, 6)] # Check up to 5 accessories
     for acc in accessories:
         if not acc or acc.lower() == 'none' or acc == '':
@@ -70,18 +139,120 @@ def generate_nft(env_name, row):
         acc_filename = f"{mapped_acc}.png"
         acc_path = os.path.join(cfg['base_dir'], acc_filename)
 
-        if os.path.exists(acc_path):
-            acc_img = Image.open(acc_path).convert("RGBA")
-            img.alpha_composite(acc_img)
+        if os.path.normcase(acc_filename) in files:
+            acc_paths.append(acc_path)
         else:
-            print(f"Warning: Accessory file not found: {acc_path}")
+            missing.append(("accessory", acc_path))
+    return base_path, acc_paths, missing
 
-    # Save PNG
-    output_png = os.path.join(PNG_DIR, f"{nft_num}.png")
-    try:
-        img.save(output_png)
-    except Exception as e:
-        print(f"Error saving {output_png}: {e}")
+def resolve_layers(cfg, row, log=None):
+    # Source files a row blends: (base path or None when missing, [accessory paths])
+    base_path, acc_paths, missing = plan_row(cfg, row)
+    if base_path is None:
+        _emit(log, f"Error: Base file not found: {missing[0][1]}")
+        return None, []
+    for _, acc_path in missing:
+        _emit(log, f"Warning: Accessory file not found: {acc_path}")
+    return base_path, acc_paths
+
+def plan_drop(cfg, rows):
+    # Resolve every row up front -> {(kind, missing path): [NFT numbers that use it]}
+    # A row that uses one missing layer in several slots is listed once for it
+    missing = {}
+    for row in rows:
+        for item in dict.fromkeys(plan_row(cfg, row)[2]):
+            missing.setdefault(item, []).append(row['NFT_Number'])
+    return missing
+
+def missing_report(env_name, missing):
+    rows = {nft for nfts in missing.values() for nft in nfts}
+    lines = [f"Missing layer files for {env_name}: {len(missing)} files used by {len(rows)} rows"]
+    for (kind, path), nfts in sorted(missing.items(), key=lambda m: (m[0][0], m[0][1])):
+        examples = ", ".join(nfts[:3]) + (", ..." if len(nfts) > 3 else "")
+        lines.append(f"  {kind:<10}{path}  ({len(nfts)} rows: {examples})")
+    return "\n".join(lines)
+
+def composite_nft(cfg, row, log=None):
+    with RUN_STATS.stage("resolve"):
+        base_path, acc_paths = resolve_layers(cfg, row, log)
+    if base_path is None:
+        return None
+
+    # Blend only each accessory's non-transparent box when it has been preprocessed
+    crops = bbox_index(cfg['base_dir'])
+    layers = [(base_path, (0, 0))]
+    for acc_path in acc_paths:
+        layer = resolve_cropped(crops, acc_path)
+        if layer:
+            layers.append(layer)
+
+    # 2. Composite, reusing any base+accessory prefix already blended for an earlier row
+    decoded = LAYER_CACHE.decode_seconds
+    start = time.perf_counter()
+    img = COMPOSITE_CACHE.compose(layers)
+    if RUN_STATS.enabled:
+        # Layer decodes on cache misses happen inside compose; report them separately
+        decode = LAYER_CACHE.decode_seconds - decoded
+        RUN_STATS.record("decode", decode)
+        RUN_STATS.record("composite", time.perf_counter() - start - decode)
+    return img
+
+def png_save_options():
+    # Leave Pillow's zlib default alone unless a level was asked for, so default builds stay byte-identical
+    level = RENDER_OPTIONS['png_level']
+    return {} if level is None else {"compress_level": level}
+
+def encode_png(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", **png_save_options())
+    return buf.getvalue()
+
+def set_render_options(png_level=None, derivatives=None):
+    RENDER_OPTIONS['png_level'] = png_level
+    if derivatives:
+        RENDER_OPTIONS['derivatives'] = derivatives
+    else:
+        RENDER_OPTIONS.pop('derivatives', None)
+
+def parse_derivatives(text):
+    # "web:1024:png,thumb:256:webp" -> [[name, longest edge, format]] largest first
+    specs = []
+    for part in text.split(','):
+        fields = part.strip().split(':')
+        if len(fields) != 3 or not fields[1].isdigit() or fields[2].lower() not in DERIVATIVE_FORMATS:
+            raise argparse.ArgumentTypeError(f"bad derivative '{part}', expected name:size:format with format one of {sorted(DERIVATIVE_FORMATS)}")
+        specs.append([fields[0], int(fields[1]), fields[2].lower()])
+    return sorted(specs, key=lambda spec: -spec[1])
+
+def derivative_path(spec, nft_num):
+    # Parallel folders beside PNG_DIR, e.g. PNG_Production_thumb/FS_001.webp
+    name, _, fmt = spec
+    return os.path.join(f"{PNG_DIR}_{name}", f"{nft_num}.{fmt}")
+
+def encode_derivatives(img):
+    # Smaller copies straight from the in-memory composite, each resized from the previous
+    # (larger) one rather than from full size -> [encoded bytes] in RENDER_OPTIONS order
+    encoded = []
+    current = img
+    for _, size, fmt in RENDER_OPTIONS.get('derivatives', ()):
+        if max(current.size) > size:
+            scale = size / max(current.size)
+            current = current.resize((max(1, round(current.width * scale)), max(1, round(current.height * scale))), Image.LANCZOS)
+        buf = io.BytesIO()
+        current.save(buf, format=DERIVATIVE_FORMATS[fmt], **(png_save_options() if fmt == "png" else {}))
+        encoded.append(buf.getvalue())
+    return encoded
+
+def write_derivatives(nft_num, encoded):
+    for spec, data in zip(RENDER_OPTIONS.get('derivatives', ()), encoded):
+        with open(derivative_path(spec, nft_num), 'wb') as f:
+            f.write(data)
+        RUN_STATS.count("derivative_files")
+        RUN_STATS.count("derivative_bytes", len(data))
+
+def build_metadata(cfg, row):
+    nft_num = row['NFT_Number']
+    rarity = row['Final_Rarity']
 
     # 3. Create Metadata (Basic version for now)
     attributes = []
@@ -95,7 +266,7 @@ def generate_nft(env_name, row):
         mapped_acc = cfg['trait_map'].get(acc, acc)
         attributes.append({"trait_type": f"Accessory {i}", "value": acc}) # Keep original name for trait type
 
-    metadata = {
+    return {
         "name": f"WaterIsLife #{nft_num}",
         "symbol": "WIL",
         "description": f"A unique representation of the {cfg['theme']} environment.",
@@ -104,27 +275,503 @@ def generate_nft(env_name, row):
         "image": f"{nft_num}.png"
     }
 
-    output_json = os.path.join(JSON_DIR, f"{nft_num}.json")
+def write_metadata(cfg, row):
+    output_json = os.path.join(JSON_DIR, f"{row['NFT_Number']}.json")
     with open(output_json, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, indent=2)
+        json.dump(build_metadata(cfg, row), f, indent=2)
+    RUN_STATS.count("json_files")
+
+def _no_metadata(cfg, row):
+    pass
+
+def pack_path(env_name):
+    # --packed: one JSONL pack per drop instead of a JSON file per NFT
+    return os.path.join(JSON_DIR, f"{env_name}{PACK_SUFFIX}")
+
+def generate_nft(env_name, row, log=None, save_metadata=write_metadata):
+    cfg = CONFIG[env_name]
+    nft_num = row['NFT_Number']
+
+    img = composite_nft(cfg, row, log)
+    if img is None:
+        return False
+
+    # Save PNG (encoded in memory first so encode and disk time can be told apart)
+    output_png = os.path.join(PNG_DIR, f"{nft_num}.png")
+    saved = True
+    try:
+        with RUN_STATS.stage("encode"):
+            data = encode_png(img)
+        with RUN_STATS.stage("write_png"):
+            with open(output_png, 'wb') as f:
+                f.write(data)
+        RUN_STATS.count("png_files")
+        RUN_STATS.count("png_bytes", len(data))
+        if RENDER_OPTIONS.get('derivatives'):
+            with RUN_STATS.stage("derivatives"):
+                encoded = encode_derivatives(img)
+            with RUN_STATS.stage("write_derivatives"):
+                write_derivatives(nft_num, encoded)
+    except Exception as e:
+        _emit(log, f"Error saving {output_png}: {e}")
+        saved = False
+
+    # In every mode, metadata is only written for an NFT whose images were saved, and an
+    # NFT whose metadata could not be written counts as failed
+    if saved:
+        saved = _save_metadata(cfg, row, log, save_metadata)
+    return saved
+
+def _save_metadata(cfg, row, log, save_metadata):
+    try:
+        with RUN_STATS.stage("write_metadata"):
+            save_metadata(cfg, row)
+    except Exception as e:
+        _emit(log, f"Error writing metadata for {row['NFT_Number']}: {e}")
+        return False
+    return True
 
-def run_drop(env_name):
+def _profiled(key, fn, *args, **kwargs):
+    # fn(*args) under cProfile when --profile is on -> (result, (key, seconds, dump path) or None)
+    if PROFILER is None:
+        return fn(*args, **kwargs), None
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+    elapsed = time.perf_counter() - start
+    path = PROFILER.offer(key, elapsed, profiler)
+    return result, (key, elapsed, path) if path else None
+
+def render_item(env_name, row, log=None, save_metadata=write_metadata):
+    with RUN_STATS.stage("item"):
+        return _profiled(row['NFT_Number'], generate_nft, env_name, row, log, save_metadata=save_metadata)
+
+def _put(q, item, failed):
+    # Pipeline queue put/get that give up once another stage has died, as the other end
+    # of the queue would never come
+    while True:
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            if failed.is_set():
+                raise _StageDown()
+
+def _get(q, failed):
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if failed.is_set():
+                raise _StageDown()
+
+def _run_stage(failed, target, *args):
+    # Thread body: an unexpected error marks the pipeline as failed (its traceback is
+    # still printed) so the other stages and run_pipeline stop instead of blocking
+    try:
+        target(*args)
+    except _StageDown:
+        pass
+    except BaseException:
+        failed.set()
+        raise
+
+def _encode_stage(encode_q, write_q, failed):
+    while True:
+        item = _get(encode_q, failed)
+        if item is _STOP:
+            _put(write_q, _STOP, failed)
+            return
+        row, img, log = item
+        data = None
+        derived = []
+        if img is not None:
+            try:
+                with RUN_STATS.stage("encode"):
+                    data = encode_png(img)
+                if RENDER_OPTIONS.get('derivatives'):
+                    with RUN_STATS.stage("derivatives"):
+                        derived = encode_derivatives(img)
+            except Exception as e:
+                log.append(f"Error encoding {row['NFT_Number']}: {e}")
+                data = None
+        _put(write_q, (row, data, derived, log), failed)
+
+def _write_stage(cfg, write_q, encoders, finished, progress, save_metadata, failed):
+    stopped = 0
+    while stopped < encoders:
+        item = _get(write_q, failed)
+        if item is _STOP:
+            stopped += 1
+            continue
+        row, data, derived, log = item
+        ok = data is not None
+        if ok:
+            output_png = os.path.join(PNG_DIR, f"{row['NFT_Number']}.png")
+            try:
+                with RUN_STATS.stage("write_png"):
+                    with open(output_png, 'wb') as f:
+                        f.write(data)
+                RUN_STATS.count("png_files")
+                RUN_STATS.count("png_bytes", len(data))
+                with RUN_STATS.stage("write_derivatives"):
+                    write_derivatives(row['NFT_Number'], derived)
+            except Exception as e:
+                log.append(f"Error saving {output_png}: {e}")
+                ok = False
+        if ok:
+            ok = _save_metadata(cfg, row, log, save_metadata)
+        for line in log:
+            print(line)
+        finished(row, ok)
+        progress()
+
+def run_pipeline(env_name, rows, encoders, finished, progress, queue_size=None, save_metadata=write_metadata):
+    # Composite (this thread) -> PNG encode (encoder pool) -> disk writes (one writer thread),
+    # joined by bounded queues so encoding and I/O overlap the next composites
     cfg = CONFIG[env_name]
+    queue_size = queue_size or encoders * 2
+    encode_q = queue.Queue(maxsize=queue_size)
+    write_q = queue.Queue(maxsize=queue_size)
+
+    # Set when a stage thread dies, so the rest stop rather than wait on a queue forever
+    failed = threading.Event()
+    stages = [threading.Thread(target=_run_stage, args=(failed, _encode_stage, encode_q, write_q, failed), daemon=True)
+              for _ in range(encoders)]
+    stages.append(threading.Thread(target=_run_stage, args=(failed, _write_stage, cfg, write_q, encoders, finished, progress, save_metadata, failed),
+                                   daemon=True))
+    for t in stages:
+        t.start()
+
+    try:
+        for row in rows:
+            log = []
+            # Only this thread can be profiled per item, so --profile covers the composite step here
+            img, _ = _profiled(row['NFT_Number'], composite_nft, cfg, row, log)
+            _put(encode_q, (row, img, log), failed)
+        for _ in range(encoders):
+            _put(encode_q, _STOP, failed)
+        # The stages all return once one has failed, so these joins cannot hang
+        for t in stages:
+            t.join()
+    except _StageDown:
+        pass
+    except BaseException:
+        # Stop the stage threads too
+        failed.set()
+        raise
+    if failed.is_set():
+        raise RuntimeError(f"{env_name}: a pipeline stage failed (see the traceback above); the run was stopped")
+
+def image_paths(row):
+    nft_num = row['NFT_Number']
+    return [os.path.join(PNG_DIR, f"{nft_num}.png")] + [derivative_path(spec, nft_num) for spec in RENDER_OPTIONS.get('derivatives', ())]
+
+def output_paths(row):
+    return image_paths(row) + [os.path.join(JSON_DIR, f"{row['NFT_Number']}.json")]
+
+def is_built(manifest, row, digest, packed_ids=None):
+    # Up to date in the manifest with every output there. With --packed, packed_ids (the
+    # pack's index) stands in for the JSON file: the pack existing is not enough.
+    if packed_ids is None:
+        return manifest.is_current(row['NFT_Number'], digest, output_paths(row))
+    return row['NFT_Number'] in packed_ids and manifest.is_current(row['NFT_Number'], digest, image_paths(row))
+
+def packed_index(env_name):
+    path = pack_path(env_name)
+    return load_index(path) if os.path.exists(path) else {}
+
+def make_output_dirs():
+    os.makedirs(PNG_DIR, exist_ok=True)
+    os.makedirs(JSON_DIR, exist_ok=True)
+    for spec in RENDER_OPTIONS.get('derivatives', ()):
+        os.makedirs(os.path.dirname(derivative_path(spec, "")), exist_ok=True)
+
+def row_digest(cfg, row):
+    # Hash of everything that decides this row's PNG and JSON (see build_manifest)
+    base_path, acc_paths = resolve_layers(cfg, row, log=[])
+    layers = [base_path] + acc_paths if base_path else []
+    settings = {k: v for k, v in cfg.items() if k not in ('base_dir', 'csv_path')}
+    settings['render'] = RENDER_OPTIONS
+    return input_digest(row, layers, settings)
+
+def _drain_caches():
+    return LAYER_CACHE.drain(), COMPOSITE_CACHE.drain()
+
+def warm_drop(cfg):
+    # Decode every mapped layer of a drop once, up front
+    crops = bbox_index(cfg['base_dir'])
+    for name in cfg['base_map'].values():
+        path = os.path.join(cfg['base_dir'], f"{name}.png")
+        if os.path.exists(path):
+            LAYER_CACHE.get(path)
+    for name in cfg['trait_map'].values():
+        path = os.path.join(cfg['base_dir'], f"{name}.png")
+        layer = resolve_cropped(crops, path) if os.path.exists(path) else None
+        if layer:
+            LAYER_CACHE.get(layer[0])
+
+def _init_worker(configs, output_dirs, cache_mb, composite_mb, options, instrument):
+    # The parent's drop configs ({env: cfg}) and output folders are passed in so spawned
+    # workers (Windows, macOS) see the same settings as forked ones. A worker serving a
+    # single drop warms its layer cache; one shared by several drops fills it as it goes.
+    global PNG_DIR, JSON_DIR, RUN_STATS, PROFILER
+    CONFIG.update(configs)
+    PNG_DIR, JSON_DIR = output_dirs
+    RENDER_OPTIONS.update(options)
+    stats_enabled, profile_dir, profile_keep = instrument
+    RUN_STATS = RunStats("mass_nft_generator", enabled=stats_enabled)
+    PROFILER = SlowestProfiles(profile_dir, profile_keep) if profile_dir else None
+    LAYER_CACHE.set_budget(cache_mb)
+    COMPOSITE_CACHE.set_budget(composite_mb)
+    if len(configs) == 1:
+        start = time.perf_counter()
+        warm_drop(*configs.values())
+        RUN_STATS.record("worker_warmup", time.perf_counter() - start)
+
+def _render_row(task, metadata=True):
+    # task: (env, row). metadata=False renders the images only: packed metadata is written
+    # by the parent, which owns the pack file, and build_collection runs the metadata engine
+    env_name, row = task
+    log = []
+    profiled = None
+    try:
+        ok, profiled = render_item(env_name, row, log, save_metadata=write_metadata if metadata else _no_metadata)
+    except Exception as e:
+        log.append(f"Error rendering {row.get('NFT_Number')}: {e}")
+        ok = False
+    return log, ok, _drain_caches(), RUN_STATS.drain(), profiled
+
+def write_drop_metadata(env_name, rows, packed=False):
+    # Metadata without compositing: nothing is decoded, and the image build manifest is left alone.
+    # Every row is written, so a pack is rewritten whole.
+    cfg = CONFIG[env_name]
+    pack = PackWriter(pack_path(env_name)) if packed else None
+    written = 0
+    for row in rows:
+        if resolve_layers(cfg, row)[0] is None:
+            continue
+        with RUN_STATS.stage("write_metadata"):
+            if pack is None:
+                write_metadata(cfg, row)
+            else:
+                pack.write(row['NFT_Number'], build_metadata(cfg, row))
+        RUN_STATS.count("items")
+        written += 1
+    if pack is not None:
+        pack.close()
+    print(f"Wrote metadata for {written} NFTs of {env_name} (no images rendered).")
+
+def write_drop_shard_records(env_name, shard, total, rows, packed=False, images=True):
+    # One record per output folder of a --shard run, listing the files its rows produced
+    tag = f"mass_nft_generator-{env_name}"
+    ids = [row['NFT_Number'] for row in rows]
+    folders = []
+    if images:
+        folders.append((PNG_DIR, [f"{nft_num}.png" for nft_num in ids]))
+        for spec in RENDER_OPTIONS.get('derivatives', ()):
+            folders.append((os.path.dirname(derivative_path(spec, "")), [os.path.basename(derivative_path(spec, nft_num)) for nft_num in ids]))
+    if not packed:
+        folders.append((JSON_DIR, [f"{nft_num}.json" for nft_num in ids]))
+    for folder, names in folders:
+        built = [os.path.exists(os.path.join(folder, name)) for name in names]
+        write_shard_record(folder, tag, shard, None, total, ids, [name for name, ok in zip(names, built) if ok],
+                           missing=[nft_num for nft_num, ok in zip(ids, built) if not ok])
+    if packed:
+        packed_ids = packed_index(env_name)
+        write_shard_record(JSON_DIR, tag, shard, None, total, ids, [nft_num for nft_num in ids if nft_num in packed_ids],
+                           pack=os.path.basename(pack_path(env_name)), missing=[nft_num for nft_num in ids if nft_num not in packed_ids])
+
+def preprocess_drop(env_name):
+    cfg = CONFIG[env_name]
+    bases = {f"{name}.png" for name in cfg['base_map'].values()}
+    _BBOX_INDEXES[cfg['base_dir']] = preprocess_layers(cfg['base_dir'], exclude=bases)
+
+def run_drop(env_name, workers=1, cache_mb=None, composite_mb=None, preprocess=False, force=False,
+             encoders=0, png_level=None, packed=False, allow_missing=False, metadata_only=False,
+             stats_path=None, profile_dir=None, profile_keep=5, derivatives=None, shard=None):
+    global RUN_STATS, PROFILER
+    cfg = CONFIG[env_name]
+    set_render_options(png_level, derivatives)
+    RUN_STATS = RunStats(f"mass_nft_generator {env_name}", enabled=bool(stats_path))
+    PROFILER = SlowestProfiles(profile_dir, profile_keep) if profile_dir else None
     print(f"--- Generating {env_name} ---")
     if not os.path.exists(cfg['csv_path']):
         print(f"Error: CSV not found at {cfg['csv_path']}")
         return
-        
+
     with open(cfg['csv_path'], 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        count = 0
-        for row in reader:
-            generate_nft(env_name, row)
-            count += 1
-            if count % 100 == 0:
-                print(f"Generated {count} NFTs...")
+        rows = list(csv.DictReader(f))
+    rows.sort(key=render_order_key)
+    total = len(rows)
+    if shard is not None:
+        # Rows are split by a hash of the NFT id, so every node agrees on the split
+        rows = [row for row in rows if in_shard(row['NFT_Number'], shard)]
+        print(f"Shard {shard[0]}/{shard[1]}: {len(rows)} of {total} NFTs")
+    shard_rows = rows
+
+    # Check every row's layers before rendering anything
+    missing = plan_drop(cfg, rows)
+    if missing:
+        print(missing_report(env_name, missing))
+        if not allow_missing:
+            print("Nothing rendered. Fix the files or the base_map/trait_map, or rerun with --allow-missing.")
+            return
+
+    make_output_dirs()
+
+    if metadata_only:
+        write_drop_metadata(env_name, rows, packed=packed)
+        if shard is not None:
+            write_drop_shard_records(env_name, shard, total, shard_rows, packed=packed, images=False)
+        report_run(stats_path, settings={"env": env_name, "mode": "metadata-only", "packed": packed})
+        return
+
+    if preprocess:
+        preprocess_drop(env_name)
+
+    # Every built NFT is journaled with the hash of its inputs, and every run skips rows
+    # whose outputs exist and whose row, layers and config are unchanged (so a rerun after
+    # a crash or a layer fix only builds what is missing or stale); --force rebuilds all
+    manifest = BuildManifest(PNG_DIR)
+    digests = {row['NFT_Number']: row_digest(cfg, row) for row in rows}
+    metadata_path = pack_path(env_name) if packed else None
+    if not force:
+        packed_ids = packed_index(env_name) if packed else None
+        todo = [row for row in rows if not is_built(manifest, row, digests[row['NFT_Number']], packed_ids)]
+        print(f"{len(rows) - len(todo)} NFTs up to date, {len(todo)} to build")
+        rows = todo
+
+    # An incremental packed build appends; the newer line for an id supersedes the old one
+    pack = PackWriter(metadata_path, append=not force) if packed else None
+
+    def save_metadata(cfg, row):
+        if pack is None:
+            write_metadata(cfg, row)
+        else:
+            pack.write(row['NFT_Number'], build_metadata(cfg, row))
+            RUN_STATS.count("metadata_records")
+
+    def finished(row, ok):
+        if ok:
+            manifest.record(row['NFT_Number'], digests[row['NFT_Number']])
+        elif row['NFT_Number'] in manifest.entries:
+            manifest.discard(row['NFT_Number'])
+
+    if cache_mb is not None:
+        LAYER_CACHE.set_budget(cache_mb)
+    if composite_mb is not None:
+        COMPOSITE_CACHE.set_budget(composite_mb)
+    _drain_caches()
+    totals = [[0, 0], [0, 0]]
+
+    def tally(drained):
+        for total, (hits, misses) in zip(totals, drained):
+            total[0] += hits
+            total[1] += misses
+
+    count = 0
+
+    def progress():
+        nonlocal count
+        count += 1
+        RUN_STATS.count("items")
+        if count % 100 == 0:
+            print(f"Generated {count} NFTs...")
+
+    if workers > 1:
+        # Contiguous chunks keep shared prefixes on one worker, and pool.map
+        # yields results in order, so the printed report reads like a serial run
+        tasks = [(env_name, row) for row in rows]
+        chunksize = max(1, len(tasks) // (workers * 8))
+        budgets = (LAYER_CACHE.budget / (1024 * 1024), COMPOSITE_CACHE.budget / (1024 * 1024))
+        instrument = (RUN_STATS.enabled, profile_dir, profile_keep)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=({env_name: cfg}, (PNG_DIR, JSON_DIR), *budgets, dict(RENDER_OPTIONS), instrument)) as pool:
+            render = functools.partial(_render_row, metadata=not packed)
+            for (_, row), (log, ok, drained, stats, profiled) in zip(tasks, pool.map(render, tasks, chunksize=chunksize)):
+                for line in log:
+                    print(line)
+                if packed and ok:
+                    save_metadata(cfg, row)
+                finished(row, ok)
+                tally(drained)
+                RUN_STATS.merge(stats)
+                if profiled:
+                    PROFILER.adopt(*profiled)
+                progress()
+    elif encoders > 0:
+        run_pipeline(env_name, rows, encoders, finished, progress, save_metadata=save_metadata)
+        tally(_drain_caches())
+    else:
+        for row in rows:
+            ok, _ = render_item(env_name, row, save_metadata=save_metadata)
+            finished(row, ok)
+            progress()
+        tally(_drain_caches())
+    if pack is not None:
+        pack.close()
+        print(f"Metadata packed into {metadata_path}")
+    manifest.save()
+    if shard is not None:
+        write_drop_shard_records(env_name, shard, total, shard_rows, packed=packed)
     print(f"Finished {count} NFTs for {env_name}.")
+    print(format_cache_stats("Layer cache", *totals[0]))
+    print(format_cache_stats("Composite cache", *totals[1]))
+    mode = "workers" if workers > 1 else "pipeline" if encoders > 0 else "serial"
+    report_run(stats_path, settings={"env": env_name, "mode": mode, "workers": workers, "encoders": encoders,
+                                     "png_level": png_level, "packed": packed, "force": force,
+                                     "derivatives": derivatives, "shard": shard},
+               caches={"layer": totals[0], "composite": totals[1]})
+
+def report_run(stats_path, **extra):
+    if PROFILER is not None:
+        slowest = PROFILER.slowest()
+        extra["slowest_profiles"] = slowest
+        print(f"cProfile dumps for the {len(slowest)} slowest items (view with: python -m pstats <file>):")
+        for item in slowest:
+            print(f"  {item['id']}  {item['seconds']:.3f}s  {item['profile']}")
+    if stats_path:
+        RUN_STATS.print_summary()
+        RUN_STATS.write(stats_path, extra)
+        print(f"Run report: {stats_path}")
 
 if __name__ == "__main__":
-    run_drop("FactorySprings")
-    print("\n[FACTORY SPRINGS COMPLETE]")
+    parser = argparse.ArgumentParser(description="Render NFT images and metadata for a drop")
+    parser.add_argument("env", nargs="?", default="FactorySprings", choices=sorted(CONFIG))
+    parser.add_argument("--workers", type=int, default=1, help="Render rows across N processes (default: 1, serial)")
+    parser.add_argument("--cache-mb", type=float, default=None, help="Decoded layer cache budget per process in MB")
+    parser.add_argument("--composite-mb", type=float, default=None, help="Partial composite cache budget per process in MB")
+    parser.add_argument("--preprocess", action="store_true", help="Crop trait layers to their alpha bounding boxes before rendering")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild every NFT; by default NFTs up to date with the build manifest are skipped")
+    parser.add_argument("--encoders", type=int, default=0,
+                        help="Single-process pipelined mode: composite, N PNG encoder threads and a writer thread")
+    parser.add_argument("--png-level", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="PNG zlib compression level (lower is faster and larger; default: Pillow's)")
+    parser.add_argument("--packed", action="store_true",
+                        help="Write metadata to one <env>.jsonl pack in JSON_DIR instead of a file per NFT")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="Render rows anyway when layer files are missing (rows without a base are skipped)")
+    parser.add_argument("--metadata-only", action="store_true", help="Write metadata only; no images are decoded or rendered")
+    parser.add_argument("--derivatives", type=parse_derivatives, metavar="NAME:SIZE:FORMAT,...",
+                        help="Also write smaller copies from the same composite, e.g. web:1024:png,thumb:256:webp "
+                             "(into PNG_DIR_<name>; size is the longest edge)")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="Only build the NFTs of shard I of N (merge the shards with merge_shards.py)")
+    add_stats_argument(parser)
+    parser.add_argument("--profile", metavar="DIR", nargs="?", const="nft_profiles",
+                        help="Keep cProfile dumps of the slowest items in DIR (default: nft_profiles)")
+    parser.add_argument("--profile-keep", type=int, default=5, help="How many of the slowest items to keep profiles for")
+    args = parser.parse_args()
+
+    run_drop(args.env, workers=args.workers, cache_mb=args.cache_mb, composite_mb=args.composite_mb,
+             preprocess=args.preprocess, force=args.force, encoders=args.encoders, png_level=args.png_level, packed=args.packed,
+             allow_missing=args.allow_missing, metadata_only=args.metadata_only,
+             stats_path=args.stats, profile_dir=args.profile, profile_keep=args.profile_keep,
+             derivatives=args.derivatives, shard=args.shard)
+    print(f"\n[{CONFIG[args.env]['theme'].upper()} COMPLETE]")
@@ -0,0 +1,134 @@
+import os
+import sys
+import shutil
+import argparse
+from metadata_pack import PackReader, PackWriter, load_index
+from metadata_production_engine import OUTPUT_DIR
+from seeding import load_shard_records, shard_of
+
+# Checks the output folders of a --shard build against each other (same seed, every
+# shard present once, every item in exactly one shard, every listed file there) and
+# copies each shard's own outputs into one folder. Run once per output folder, e.g.
+#   python merge_shards.py node0\MetaData_Production node1\MetaData_Production --output MetaData_Production
+
+def _order(key):
+    # Edition keys (1, 2, 10) in numeric order, NFT ids after them by name
+    return (0, int(key), "") if key.isdigit() else (1, 0, key)
+
+def check_shards(entries, allow_missing=False):
+    # entries: [(shard folder, shard record)] for one tag -> list of problems
+    problems = []
+    for field in ("seed", "total", "pack"):
+        values = {repr(record[field]) for _, record in entries}
+        if len(values) > 1:
+            problems.append(f"shards disagree on {field}: {', '.join(sorted(values))}")
+    counts = {record["shard"][1] for _, record in entries}
+    if len(counts) > 1:
+        problems.append(f"shards were cut from different counts: {sorted(counts)}")
+        return problems
+    count = counts.pop()
+
+    folders = {}
+    for folder, record in entries:
+        index = record["shard"][0]
+        if index in folders:
+            problems.append(f"shard {index}/{count} appears twice ({folders[index]} and {folder})")
+        folders[index] = folder
+    absent = sorted(set(range(count)) - set(folders))
+    if absent:
+        problems.append(f"no output for shards {', '.join(f'{i}/{count}' for i in absent)}")
+
+    owners, outputs = {}, {}
+    for folder, record in entries:
+        index = record["shard"][0]
+        wrong = [item for item in record["items"] if shard_of(item, count) != index]
+        if wrong:
+            problems.append(f"{folder}: {len(wrong)} items belong to other shards (e.g. {wrong[0]})")
+        for item in record["items"]:
+            if item in owners:
+                problems.append(f"{item} built by both {owners[item]} and {folder}")
+            owners[item] = folder
+        for name in record["outputs"]:
+            if name in outputs:
+                problems.append(f"{name} written by both {outputs[name]} and {folder}")
+            outputs[name] = folder
+        if record["missing"] and not allow_missing:
+            problems.append(f"{folder}: {len(record['missing'])} items have no output (e.g. {record['missing'][0]})")
+
+        if record["pack"]:
+            path = os.path.join(folder, record["pack"])
+            packed = load_index(path) if os.path.exists(path) else {}
+            gone = [key for key in record["outputs"] if key not in packed]
+        else:
+            gone = [name for name in record["outputs"] if not os.path.exists(os.path.join(folder, name))]
+        if gone:
+            problems.append(f"{folder}: {len(gone)} listed outputs are gone (e.g. {gone[0]})")
+
+    total = entries[0][1]["total"]
+    if not absent and len(owners) != total:
+        problems.append(f"shards cover {len(owners)} of {total} items")
+    return problems
+
+def merge_shards(entries, output_dir):
+    # Each shard's own outputs into output_dir; packs are rewritten as one pack
+    os.makedirs(output_dir, exist_ok=True)
+    pack = entries[0][1]["pack"]
+    if pack:
+        sources = sorted(((key, folder) for folder, record in entries for key in record["outputs"]),
+                         key=lambda source: _order(source[0]))
+        readers = {folder: PackReader(os.path.join(folder, pack)) for folder, _ in entries}
+        try:
+            with PackWriter(os.path.join(output_dir, pack)) as writer:
+                for key, folder in sources:
+                    writer.write(key, readers[folder].get(key))
+        finally:
+            for reader in readers.values():
+                reader.close()
+        return len(sources)
+
+    copied = 0
+    for folder, record in entries:
+        for name in record["outputs"]:
+            shutil.copy2(os.path.join(folder, name), os.path.join(output_dir, name))
+            copied += 1
+    return copied
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify the outputs of a --shard build and merge them into one folder")
+    parser.add_argument("shard_dirs", nargs="+", metavar="SHARD_DIR", help="The same output folder from each shard")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Merged folder (default: %(default)s)")
+    parser.add_argument("--tag", action="append", help="Only merge this engine/drop tag (repeatable; default: every tag found)")
+    parser.add_argument("--check", action="store_true", help="Verify only; copy nothing")
+    parser.add_argument("--allow-missing", action="store_true", help="Merge even if some items failed to build in their shard")
+    args = parser.parse_args(argv)
+
+    by_tag = {}
+    for shard_dir in args.shard_dirs:
+        for tag, record in load_shard_records(shard_dir).items():
+            by_tag.setdefault(tag, []).append((shard_dir, record))
+    if args.tag:
+        by_tag = {tag: entries for tag, entries in by_tag.items() if tag in args.tag}
+    if not by_tag:
+        print("No shard records found; run the engines with --shard I/N first.")
+        return 1
+
+    failed = False
+    for tag, entries in sorted(by_tag.items()):
+        problems = check_shards(entries, allow_missing=args.allow_missing)
+        count = entries[0][1]["shard"][1]
+        if problems:
+            failed = True
+            print(f"{tag}: {len(entries)} of {count} shards, {len(problems)} problems:")
+            for problem in problems:
+                print(f"  {problem}")
+            continue
+        print(f"{tag}: {count} shards agree on {entries[0][1]['total']} items (seed {entries[0][1]['seed']})")
+        if not args.check:
+            n = merge_shards(entries, args.output)
+            print(f"  Merged {n} outputs into {args.output}")
+    if failed:
+        print("Fix or rebuild the shards above; nothing was merged for them.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+import os
+import json
+import sqlite3
+import argparse
+from metadata_pack import iter_pack
+from build_manifest import sidecar_name
+
+# Configuration
+JSON_DIR = r'C:\Users\HHeltzinger\Desktop\WaterIsLife\MetaData_Production'
+
+# Lives inside the metadata folder
+CATALOG_NAME = sidecar_name("catalog.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    edition INTEGER,
+    sort_key INTEGER,
+    symbol TEXT,
+    name TEXT,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    item_id TEXT NOT NULL REFERENCES items(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    trait_type TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_items_symbol ON items(symbol, sort_key);
+CREATE INDEX IF NOT EXISTS idx_items_edition ON items(edition);
+CREATE INDEX IF NOT EXISTS idx_attr_trait ON attributes(trait_type, value);
+CREATE INDEX IF NOT EXISTS idx_attr_item ON attributes(item_id);
+"""
+
+def connect(json_dir=JSON_DIR):
+    conn = sqlite3.connect(os.path.join(json_dir, CATALOG_NAME))
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def _sort_key(item_id):
+    # Numeric file names (1.json, 2.json, ...) sort by number, like verify_samples always did
+    try:
+        return int(item_id)
+    except ValueError:
+        return None
+
+def _value_text(value):
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+def update_catalog(json_dir=JSON_DIR, conn=None):
+    # Re-read only files that are new or whose mtime changed; forget files that are gone
+    conn = conn or connect(json_dir)
+    known = dict(conn.execute("SELECT id, mtime_ns FROM items"))
+    seen = set()
+    changed = []
+    with os.scandir(json_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.json') or not entry.is_file():
+                continue
+            item_id = entry.name[:-len('.json')]
+            seen.add(item_id)
+            mtime_ns = entry.stat().st_mtime_ns
+            if known.get(item_id) != mtime_ns:
+                changed.append((item_id, entry.path, mtime_ns))
+
+    removed = [item_id for item_id in known if item_id not in seen]
+    failed = 0
+    with conn:
+        conn.executemany("DELETE FROM items WHERE id = ?", [(i,) for i in removed])
+        for item_id, path, mtime_ns in changed:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error reading {path}: {e}")
+                failed += 1
+                continue
+            _insert_item(conn, item_id, data, path, mtime_ns)
+
+    print(f"Catalog: {len(changed) - failed} indexed, {len(seen) - len(changed)} unchanged, {len(removed)} removed")
+    return conn
+
+def _insert_item(conn, item_id, data, path, mtime_ns):
+    conn.execute("DELETE FROM items WHERE id = ?", (item_id,))
+    conn.execute(
+        "INSERT INTO items (id, edition, sort_key, symbol, name, path, mtime_ns) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (item_id, data.get('edition'), _sort_key(item_id), data.get('symbol'), data.get('name'), path, mtime_ns))
+    conn.executemany(
+        "INSERT INTO attributes (item_id, position, trait_type, value) VALUES (?, ?, ?, ?)",
+        [(item_id, n, a.get('trait_type'), _value_text(a.get('value'))) for n, a in enumerate(data.get('attributes', []))])
+
+def update_catalog_from_pack(pack_path, conn=None):
+    # Packed metadata (metadata_pack): items point at the pack file and are re-read
+    # together whenever the pack's mtime changes
+    conn = conn or connect(os.path.dirname(os.path.abspath(pack_path)))
+    mtime_ns = os.stat(pack_path).st_mtime_ns
+    current = conn.execute("SELECT mtime_ns FROM items WHERE path = ? LIMIT 1", (pack_path,)).fetchone()
+    if current and current[0] == mtime_ns:
+        print(f"Catalog: {pack_path} unchanged")
+        return conn
+    indexed = 0
+    with conn:
+        conn.execute("DELETE FROM items WHERE path = ?", (pack_path,))
+        for item_id, data in iter_pack(pack_path):
+            _insert_item(conn, item_id, data, pack_path, mtime_ns)
+            indexed += 1
+    print(f"Catalog: {indexed} indexed from {pack_path}")
+    return conn
+
+def samples_per_symbol(conn, limit=None):
+    # First item of each symbol in file-name order -> [(symbol, id, path)]
+    sql = """
+        SELECT symbol, id, path FROM (
+            SELECT symbol, id, path, sort_key,
+                   ROW_NUMBER() OVER (PARTITION BY symbol ORDER BY sort_key IS NULL, sort_key, id) AS n
+            FROM items
+        ) WHERE n = 1 ORDER BY sort_key IS NULL, sort_key, id
+    """
+    rows = conn.execute(sql).fetchall()
+    return rows[:limit] if limit else rows
+
+def counts_per_symbol(conn):
+    return conn.execute("SELECT symbol, COUNT(*) FROM items GROUP BY symbol ORDER BY symbol").fetchall()
+
+def items_with_trait(conn, trait_type, value=None):
+    if value is None:
+        sql = """SELECT DISTINCT i.id, i.path FROM attributes a JOIN items i ON i.id = a.item_id
+                 WHERE a.trait_type = ? ORDER BY i.sort_key IS NULL, i.sort_key, i.id"""
+        return conn.execute(sql, (trait_type,)).fetchall()
+    sql = """SELECT DISTINCT i.id, i.path FROM attributes a JOIN items i ON i.id = a.item_id
+             WHERE a.trait_type = ? AND a.value = ? ORDER BY i.sort_key IS NULL, i.sort_key, i.id"""
+    return conn.execute(sql, (trait_type, value)).fetchall()
+
+def trait_counts(conn, trait_type):
+    sql = "SELECT value, COUNT(*) FROM attributes WHERE trait_type = ? GROUP BY value ORDER BY COUNT(*) DESC"
+    return conn.execute(sql, (trait_type,)).fetchall()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite index of the metadata JSON folder")
+    parser.add_argument("--dir", default=JSON_DIR)
+    parser.add_argument("--pack", help="Index a metadata .jsonl pack instead of the JSON files in --dir")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update", help="Index new and changed files")
+    sub.add_parser("counts", help="Items per symbol")
+    sub.add_parser("samples", help="First item of each symbol")
+    p = sub.add_parser("trait", help="Items with a trait (and value), or value counts for a trait")
+    p.add_argument("trait_type")
+    p.add_argument("value", nargs="?")
+    p.add_argument("--counts", action="store_true", help="Count items per value instead of listing them")
+    args = parser.parse_args(argv)
+
+    conn = update_catalog_from_pack(args.pack) if args.pack else update_catalog(args.dir)
+    if args.command == "counts":
+        for symbol, n in counts_per_symbol(conn):
+            print(f"{symbol}\t{n}")
+    elif args.command == "samples":
+        for symbol, item_id, path in samples_per_symbol(conn):
+            print(f"{symbol}\t{item_id}\t{path}")
+    elif args.command == "trait":
+        if args.counts:
+            for value, n in trait_counts(conn, args.trait_type):
+                print(f"{value}\t{n}")
+        else:
+            rows = items_with_trait(conn, args.trait_type, args.value)
+            for item_id, path in rows:
+                print(f"{item_id}\t{path}")
+            print(f"{len(rows)} items")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import json
+import argparse
+
+# A pack is one JSONL file of {"id": ..., "metadata": {...}} lines plus an offset
+# table beside it, so thousands of NFTs cost one file write instead of thousands.
+# Appending a line for an id that is already packed supersedes the older line.
+PACK_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx"
+INDEX_FORMAT = 1
+
+def index_path(pack_path):
+    return pack_path + INDEX_SUFFIX
+
+def _encode(key, record):
+    return (json.dumps({"id": key, "metadata": record}, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+def scan_pack(pack_path):
+    # Rebuild the offset table from the pack itself: id -> [offset, length], last line wins.
+    # A torn final line from a crashed writer is ignored.
+    offsets = {}
+    offset = 0
+    with open(pack_path, 'rb') as f:
+        for line in f:
+            if line.endswith(b"\n"):
+                try:
+                    offsets[json.loads(line)["id"]] = [offset, len(line)]
+                except (ValueError, KeyError):
+                    pass
+            offset += len(line)
+    return offsets
+
+def _complete_size(f):
+    # Bytes up to and including the last "\n" of an open pack: where its whole lines end
+    end = f.seek(0, os.SEEK_END)
+    while end > 0:
+        start = max(0, end - 65536)
+        f.seek(start)
+        cut = f.read(end - start).rfind(b"\n")
+        if cut >= 0:
+            return start + cut + 1
+        end = start
+    return 0
+
+def _write_index(pack_path, offsets):
+    tmp = index_path(pack_path) + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"format": INDEX_FORMAT, "size": os.path.getsize(pack_path), "offsets": offsets}, f)
+    os.replace(tmp, index_path(pack_path))
+
+def load_index(pack_path):
+    # Offset table for a pack, rescanning when the index is missing or was written
+    # for a different pack size (crash mid-run, or the pack was edited by hand)
+    path = index_path(pack_path)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("format") == INDEX_FORMAT and index.get("size") == os.path.getsize(pack_path):
+            return index["offsets"]
+    return scan_pack(pack_path)
+
+class PackWriter:
+    def __init__(self, pack_path, append=False):
+        self.path = pack_path
+        folder = os.path.dirname(os.path.abspath(pack_path))
+        os.makedirs(folder, exist_ok=True)
+        self.offsets = {}
+        if append and os.path.exists(pack_path):
+            self._file = open(pack_path, 'r+b')
+            # A crashed writer can leave a torn last line; cut it off so the first new
+            # record starts a line of its own instead of being glued onto the fragment
+            self._offset = _complete_size(self._file)
+            self._file.truncate(self._offset)
+            self._file.seek(self._offset)
+            self.offsets = {key: entry for key, entry in load_index(pack_path).items()
+                            if entry[0] + entry[1] <= self._offset}
+        else:
+            self._file = open(pack_path, 'wb')
+            self._offset = 0
+
+    def write(self, key, record):
+        data = _encode(str(key), record)
+        self._file.write(data)
+        self.offsets[str(key)] = [self._offset, len(data)]
+        self._offset += len(data)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        _write_index(self.path, self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PackReader:
+    # Random access by id through the offset table, or a sequential stream in pack order
+    def __init__(self, pack_path):
+        self.path = pack_path
+        self.offsets = load_index(pack_path)
+        self._file = open(pack_path, 'rb')
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, key):
+        return str(key) in self.offsets
+
+    def ids(self):
+        return sorted(self.offsets, key=lambda k: self.offsets[k][0])
+
+    def get(self, key):
+        offset, length = self.offsets[str(key)]
+        self._file.seek(offset)
+        return json.loads(self._file.read(length))["metadata"]
+
+    def __iter__(self):
+        # (id, metadata) for the live line of every id, reading the file front to back
+        live = {offset for offset, _ in self.offsets.values()}
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            if offset in live:
+                entry = json.loads(line)
+                yield entry["id"], entry["metadata"]
+            offset += len(line)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_pack(pack_path):
+    with PackReader(pack_path) as reader:
+        yield from reader
+
+def replace_pack(src_path, dst_path):
+    # Move a finished pack and its index over another one
+    os.replace(src_path, dst_path)
+    os.replace(index_path(src_path), index_path(dst_path))
+
+def compact_pack(pack_path):
+    # Drop superseded lines by rewriting the pack beside itself and swapping it in
+    tmp = pack_path + ".tmp"
+    with PackReader(pack_path) as reader, PackWriter(tmp) as writer:
+        for key, record in reader:
+            writer.write(key, record)
+    replace_pack(tmp, pack_path)
+
+def pack_directory(json_dir, pack_path):
+    # Existing per-file JSON folder -> pack, keyed by file name without .json
+    files = sorted(f for f in os.listdir(json_dir) if f.endswith('.json'))
+    with PackWriter(pack_path) as writer:
+        for filename in files:
+            with open(os.path.join(json_dir, filename), 'r', encoding='utf-8') as f:
+                writer.write(filename[:-len('.json')], json.load(f))
+    return len(files)
+
+def export_pack(pack_path, output_dir, ids=None, indent=2):
+    # Per-file {id}.json for upload, for the whole pack or just the given ids, laid out
+    # like the engines' own json.dump(..., indent=2) files
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    with PackReader(pack_path) as reader:
+        records = ((key, reader.get(key)) for key in ids) if ids else iter(reader)
+        for key, record in records:
+            with open(os.path.join(output_dir, f"{key}.json"), 'w', encoding='utf-8') as f:
+                json.dump(record, f, indent=indent)
+            written += 1
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, convert and export packed (JSONL) metadata")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("export", help="Write per-file JSON from a pack")
+    p.add_argument("pack")
+    p.add_argument("output_dir")
+    p.add_argument("--id", action="append", help="Only export this id (repeatable)")
+    p = sub.add_parser("pack", help="Pack a folder of per-file JSON")
+    p.add_argument("json_dir")
+    p.add_argument("pack")
+    p = sub.add_parser("get", help="Print one record")
+    p.add_argument("pack")
+    p.add_argument("id")
+    p = sub.add_parser("compact", help="Drop superseded lines")
+    p.add_argument("pack")
+    p = sub.add_parser("info", help="Record count and size")
+    p.add_argument("pack")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        n = export_pack(args.pack, args.output_dir, ids=args.id)
+        print(f"Exported {n} metadata files to {args.output_dir}")
+    elif args.command == "pack":
+        n = pack_directory(args.json_dir, args.pack)
+        print(f"Packed {n} metadata files into {args.pack}")
+    elif args.command == "get":
+        with PackReader(args.pack) as reader:
+            print(json.dumps(reader.get(args.id), indent=2, ensure_ascii=False))
+    elif args.command == "compact":
+        compact_pack(args.pack)
+        print(f"Compacted {args.pack}")
+    elif args.command == "info":
+        with PackReader(args.pack) as reader:
+            print(f"{len(reader)} records, {os.path.getsize(args.pack)} bytes")
+
+if __name__ == "__main__":
+    main()
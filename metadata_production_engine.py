@@ -1,7 +1,13 @@
 import os
+import csv
 import json
-import pandas as pd
 import random
+import argparse
+from build_manifest import BuildManifest, input_digest
+from metadata_pack import PackWriter, PACK_SUFFIX
+from run_stats import RunStats, NO_STATS, add_stats_argument
+from seeding import item_rng, in_shard, parse_shard, write_shard_record
+import trait_matrix
 
 # Configuration
 PNG_DIR = r'C:\Users\HHeltzinger\Desktop\WaterIsLife\PNG_Production'
@@ -85,20 +91,23 @@ WATER_TYPES = [
     "Purified Flow", "Eco-Reclaimed"
 ]
 
-def get_random_water_stats():
-    ph = round(random.uniform(6.8, 8.2), 1)
-    do = round(random.uniform(7.0, 11.5), 1)
-    source = random.choice(WATER_TYPES)
+# Trait types drawn at random per item by get_random_water_stats (not part of the design)
+RANDOM_TRAIT_TYPES = ["pH Level", "Dissolved Oxygen", "Water Source"]
+
+def get_random_water_stats(rng=random):
+    ph = round(rng.uniform(6.8, 8.2), 1)
+    do = round(rng.uniform(7.0, 11.5), 1)
+    source = rng.choice(WATER_TYPES)
     return [
         {"trait_type": "pH Level", "value": str(ph)},
         {"trait_type": "Dissolved Oxygen", "value": f"{do} mg/L"},
         {"trait_type": "Water Source", "value": source}
     ]
 
-def generate_description(prefix):
+def generate_description(prefix, rng=random):
     env = PREFIX_MAP.get(prefix, "Forests")
-    narrative = random.choice(NARRATIVES.get(env, NARRATIVES["Forests"]))
-    quote = random.choice(RANDY_QUOTES)
+    narrative = rng.choice(NARRATIVES.get(env, NARRATIVES["Forests"]))
+    quote = rng.choice(RANDY_QUOTES)
     return f"{narrative} {quote}"
 
 def get_trait_type(key):
@@ -108,35 +117,61 @@ def get_trait_type(key):
         return "Environment"
     return key.replace("_", " ")
 
-# Prepare Output
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-# Process Files
-png_files = sorted([f for f in os.listdir(PNG_DIR) if f.endswith('.png')])
-total_files = len(png_files)
-
-# Cache CSV data to avoid repeated reads
-csv_data = {}
-for prefix, path in CSV_MAP.items():
-    if os.path.exists(path):
-        try:
-            csv_data[prefix] = pd.read_csv(path)
-            csv_data[prefix].set_index('NFT_Number', inplace=True)
-        except Exception as e:
-            print(f"Error loading {path}: {e}")
-
-metadata_list = []
-
-for i, filename in enumerate(png_files):
-    nft_id = filename.replace('.png', '')
-    prefix = nft_id.split('_')[0]
-    edition_num = i + 1
-    
+# Cells pandas.read_csv treats as missing; the engine skipped these before it stopped using pandas
+NA_VALUES = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+def load_csv_index(path):
+    # NFT_Number -> {column: value} for one combinations CSV (first row wins on duplicates)
+    index = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            nft_id = row.pop('NFT_Number')
+            if nft_id not in index:
+                index[nft_id] = row
+    return index
+
+class CsvIndex:
+    # Combinations CSVs keyed by prefix, each parsed on the first lookup for that prefix
+    def __init__(self, csv_map=CSV_MAP):
+        self.csv_map = csv_map
+        self._loaded = {}
+
+    def row(self, prefix, nft_id):
+        if prefix not in self._loaded:
+            self._loaded[prefix] = {}
+            path = self.csv_map.get(prefix)
+            if path and os.path.exists(path):
+                try:
+                    # A trait matrix saved beside the CSV (trait_matrix.py encode) is memory-mapped
+                    # instead of parsing the CSV, unless the CSV was edited after it
+                    if trait_matrix.is_fresh(path):
+                        self._loaded[prefix] = trait_matrix.TraitMatrix.load(trait_matrix.matrix_base(path))
+                    else:
+                        self._loaded[prefix] = load_csv_index(path)
+                except Exception as e:
+                    print(f"Error loading {path}: {e}")
+        return self._loaded[prefix].get(nft_id)
+
+def list_pngs(png_dir=PNG_DIR):
+    return sorted([f for f in os.listdir(png_dir) if f.endswith('.png')])
+
+def iter_items(png_dir=PNG_DIR, csv_index=None):
+    # (edition_num, png filename, nft_id, prefix, csv row or None) in edition order
+    csv_index = csv_index or CsvIndex()
+    for i, filename in enumerate(list_pngs(png_dir)):
+        nft_id = filename.replace('.png', '')
+        prefix = nft_id.split('_')[0]
+        yield i + 1, filename, nft_id, prefix, csv_index.row(prefix, nft_id)
+
+def build_metadata(edition_num, filename, nft_id, prefix, row, rng=random):
     # Global Name - Changed to Drop-XXXX
     name = f"Water Is Life - Drop-{str(edition_num).zfill(4)}"
     
     # Description
-    description = generate_description(prefix)
+    description = generate_description(prefix, rng)
     
     # Attributes
     attributes = [
@@ -145,39 +180,28 @@ for i, filename in enumerate(png_files):
     ]
     
     # Inject Random Water Stats
-    attributes.extend(get_random_water_stats())
+    attributes.extend(get_random_water_stats(rng))
     
     # 1 of 1 Logic
     if edition_num in [1189, 1190]:
         attributes.append({"trait_type": "Status", "value": "1 of 1"})
     
     # Trait mapping from CSV
-    if i < total_files: # Safety check
-        if prefix in csv_data and nft_id in csv_data[prefix].index:
-            row = csv_data[prefix].loc[nft_id]
-            for col in csv_data[prefix].columns:
-                val = row[col]
-                if val and str(val).lower() != 'none' and not pd.isna(val):
-                    # Branding
-                    if str(val).lower() == 'coins':
-                        val = "RandyCoin"
-                    if str(val).lower() == 'randy':
-                        val = "Randy the Raccoon (AI)"
-                    if str(val).lower() == 'dog':
-                        val = "Wild Companion"
-                    
-                    # Attribute Type Rename
-                    t_type = get_trait_type(col)
-                    
-                    # Special Case: rename "Environment" from get_trait_type if we already have a Zone
-                    if t_type == "Environment":
-                        # If it's from "Base_Variation", we already call it Environment
-                        pass
-                    
-                    attributes.append({"trait_type": t_type, "value": val})
+    for col, val in (row or {}).items():
+        if val and val.lower() != 'none' and val not in NA_VALUES:
+            # Branding
+            if val.lower() == 'coins':
+                val = "RandyCoin"
+            if val.lower() == 'randy':
+                val = "Randy the Raccoon (AI)"
+            if val.lower() == 'dog':
+                val = "Wild Companion"
+            
+            # Attribute Type Rename (Base_Variation becomes Environment alongside Zone)
+            attributes.append({"trait_type": get_trait_type(col), "value": val})
     
     # Build JSON
-    meta = {
+    return {
         "name": name,
         "description": description,
         "image": f"/{filename}",
@@ -185,9 +209,93 @@ for i, filename in enumerate(png_files):
         "attributes": attributes,
         "symbol": prefix
     }
-    
-    # Save JSON - Using edition_num for filenames (1, 2, 3...) for simplicity on some platforms
-    with open(os.path.join(OUTPUT_DIR, f"{edition_num}.json"), 'w') as f:
-        json.dump(meta, f, indent=2)
 
-print(f"Generated {total_files} metadata files in {OUTPUT_DIR}")
+def iter_metadata(png_dir=PNG_DIR, csv_index=None, seed=None):
+    # Stream of (edition_num, metadata) records, one per PNG, without touching disk output
+    for edition_num, filename, nft_id, prefix, row in iter_items(png_dir, csv_index):
+        yield edition_num, build_metadata(edition_num, filename, nft_id, prefix, row, item_rng(seed, nft_id, "metadata"))
+
+# --packed output: every edition in one JSONL pack inside output_dir
+PACK_NAME = "metadata" + PACK_SUFFIX
+
+def write_metadata(png_dir=PNG_DIR, output_dir=OUTPUT_DIR, csv_index=None, force=False, packed=False, stats=NO_STATS,
+                   seed=None, shard=None):
+    # Prepare Output
+    os.makedirs(output_dir, exist_ok=True)
+    pack_path = os.path.join(output_dir, PACK_NAME)
+    pack = PackWriter(pack_path, append=not force) if packed else None
+
+    # Build manifest: every run skips editions whose PNG name, CSV row and text pools are
+    # unchanged and whose output exists, unless forced
+    manifest = BuildManifest(output_dir)
+    settings = {"prefix_map": PREFIX_MAP, "narratives": NARRATIVES, "quotes": RANDY_QUOTES, "water_types": WATER_TYPES}
+    if seed is not None:
+        settings["seed"] = seed
+    written = skipped = total = 0
+    shard_items, shard_outputs = [], []
+
+    # Editions are numbered over every PNG, so a --shard run still lists them all and
+    # only builds the editions that hash to its shard (the enhancer shards the same keys)
+    for edition_num, filename, nft_id, prefix, row in iter_items(png_dir, csv_index):
+        total += 1
+        if not in_shard(edition_num, shard):
+            continue
+        shard_items.append(str(edition_num))
+        shard_outputs.append(str(edition_num) if packed else f"{edition_num}.json")
+        output_path = pack_path if packed else os.path.join(output_dir, f"{edition_num}.json")
+        digest = input_digest({"png": filename, "edition": edition_num, "csv": row}, config=settings)
+        # A packed edition is only built if the pack holds its record, not merely if the pack exists
+        built = str(edition_num) in pack.offsets if pack is not None else os.path.exists(output_path)
+        if not force and built and manifest.is_current(str(edition_num), digest):
+            skipped += 1
+            continue
+
+        with stats.stage("build"):
+            meta = build_metadata(edition_num, filename, nft_id, prefix, row, item_rng(seed, nft_id, "metadata"))
+        with stats.stage("write"):
+            if pack is not None:
+                pack.write(edition_num, meta)
+            else:
+                # Save JSON - Using edition_num for filenames (1, 2, 3...) for simplicity on some platforms
+                with open(output_path, 'w') as f:
+                    json.dump(meta, f, indent=2)
+        stats.count("items")
+        stats.count("metadata_records" if pack is not None else "json_files")
+        manifest.record(str(edition_num), digest)
+        written += 1
+
+    if pack is not None:
+        pack.close()
+    manifest.save()
+    if shard is not None:
+        write_shard_record(output_dir, "metadata_production_engine", shard, seed, total, shard_items, shard_outputs,
+                           pack=PACK_NAME if packed else None)
+    if not force:
+        print(f"Skipped {skipped} up-to-date metadata files")
+    print(f"Generated {written} metadata {'records in ' + pack_path if packed else 'files in ' + output_dir}")
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write edition-numbered metadata JSON for every PNG in PNG_Production")
+    parser.add_argument("--png-dir", default=PNG_DIR)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--force", action="store_true",
+                        help="Rewrite every edition; by default editions up to date with the build manifest are skipped")
+    parser.add_argument("--packed", action="store_true", help=f"Write one {PACK_NAME} pack instead of a JSON file per edition")
+    add_stats_argument(parser)
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Collection seed: each NFT's random stats and description then depend only on the seed and its id")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N",
+                        help="Only build the NFTs of shard I of N (merge the shards with merge_shards.py)")
+    args = parser.parse_args(argv)
+    stats = RunStats("metadata_production_engine", enabled=bool(args.stats))
+    write_metadata(args.png_dir, args.output_dir, force=args.force, packed=args.packed, stats=stats,
+                   seed=args.seed, shard=args.shard)
+    if args.stats:
+        stats.print_summary()
+        stats.write(args.stats, {"settings": {"png_dir": args.png_dir, "output_dir": args.output_dir,
+                                              "force": args.force, "packed": args.packed,
+                                              "seed": args.seed, "shard": args.shard}})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import os
+import csv
+import argparse
+import numpy as np
+from workbook_cache import load_sheet
+from trait_matrix import TraitMatrix, matrix_base
+
+# Configuration
+EXCEL_PATH = r"c:\Users\HHeltzinger\Desktop\WaterIsLife\WaterIsLife.xlsx"
+RARITY_SHEET = 'Trait_Rarity_Master'
+
+# Trait_Rarity_Master columns, matched case-insensitively against these names.
+# Category is a combinations CSV column (Base_Variation, Accessory_1, ...), a prefix
+# covering several of them (Accessory -> every Accessory_N), or Rarity for the
+# Final_Rarity tiers.
+TRAIT_COLUMNS = ["trait", "trait name", "value", "name"]
+CATEGORY_COLUMNS = ["category", "trait type", "trait_type", "column", "layer", "slot"]
+PERCENT_COLUMNS = ["target %", "target", "percentage", "percent", "%", "rarity %", "weight"]
+
+RARITY_CATEGORIES = {"rarity", "final_rarity", "final rarity", "tier"}
+
+# Same defaults as csv_extender_local.expand_csv when the sheet has no tier rows
+DEFAULT_RARITIES = {"Common": 0.60, "Uncommon": 0.25, "Rare": 0.12, "Legendary": 0.03}
+
+def _find_column(df, candidates):
+    lookup = {str(c).strip().lower(): c for c in df.columns}
+    for name in candidates:
+        if name in lookup:
+            return lookup[name]
+    raise KeyError(f"{RARITY_SHEET} needs one of these columns: {candidates} (found {list(df.columns)})")
+
+def load_rarity_targets(excel_path=EXCEL_PATH, accessory_slots=5):
+    # -> ({csv column: {value: fraction}}, {tier: fraction})
+    df = load_sheet(RARITY_SHEET, excel_path).dropna(how='all')
+    trait_col = _find_column(df, TRAIT_COLUMNS)
+    cat_col = _find_column(df, CATEGORY_COLUMNS)
+    pct_col = _find_column(df, PERCENT_COLUMNS)
+
+    columns, rarities = {}, {}
+    for _, row in df.dropna(subset=[trait_col, cat_col, pct_col]).iterrows():
+        category = str(row[cat_col]).strip()
+        value = str(row[trait_col]).strip()
+        pct = float(str(row[pct_col]).replace('%', ''))
+        if category.lower() in RARITY_CATEGORIES:
+            rarities[value] = pct
+        elif category.startswith('Accessory') and '_' not in category:
+            for i in range(1, accessory_slots + 1):
+                columns.setdefault(f"Accessory_{i}", {})[value] = pct
+        else:
+            columns.setdefault(category, {})[value] = pct
+
+    # Percentages may be written as 0-100 or as 0-1 fractions
+    for quotas in list(columns.values()) + [rarities]:
+        if sum(quotas.values()) > 1.5:
+            for k in quotas:
+                quotas[k] /= 100.0
+    return columns, rarities or dict(DEFAULT_RARITIES)
+
+def quota_counts(fractions, total):
+    # Exact integer counts summing to total, by largest remainder
+    fractions = np.asarray(fractions, dtype=np.float64)
+    raw = fractions / fractions.sum() * total
+    counts = np.floor(raw).astype(np.int64)
+    short = total - counts.sum()
+    if short:
+        counts[np.argsort(-(raw - counts), kind='stable')[:short]] += 1
+    return counts
+
+def _packed_keys(codes, radices):
+    keys = np.zeros(len(codes), dtype=np.int64)
+    for j, r in enumerate(radices):
+        keys = keys * r + codes[:, j]
+    return keys
+
+def _duplicate_rows(keys):
+    # Every row whose key already appeared earlier
+    _, first = np.unique(keys, return_index=True)
+    dup = np.ones(len(keys), dtype=bool)
+    dup[first] = False
+    return np.flatnonzero(dup)
+
+def _contains(sorted_keys, keys):
+    pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[pos] == keys
+
+def plan_collection(column_quotas, rarity_quotas, count, seed=None, max_rounds=500):
+    # Build a whole collection at once: each column is a shuffled multiset with exactly
+    # the quota counts, duplicates are repaired by swapping cells between rows (which
+    # keeps every column's counts intact), and tiers go to rows by trait rarity score.
+    rng = np.random.default_rng(seed)
+    columns = list(column_quotas)
+    vocab, radices, targets = [], [], []
+    codes = np.empty((count, len(columns)), dtype=np.int64)
+
+    for j, col in enumerate(columns):
+        quotas = dict(column_quotas[col])
+        if col.startswith('Accessory') and sum(quotas.values()) < 1.0 and 'None' not in quotas:
+            quotas['None'] = 1.0 - sum(quotas.values())
+        values = list(quotas)
+        counts = quota_counts([quotas[v] for v in values], count)
+        codes[:, j] = rng.permutation(np.repeat(np.arange(len(values)), counts))
+        vocab.append(values)
+        radices.append(len(values))
+        weights = np.array([quotas[v] for v in values])
+        targets.append(weights / weights.sum())
+
+    space = int(np.prod([float(r) for r in radices]))
+    if count > space:
+        raise ValueError(f"{count} unique rows requested but the trait pools only allow {space} combinations")
+    if space >= 2 ** 63:
+        raise ValueError("Trait space too large for 64-bit packed keys")
+
+    # Repair duplicates by swapping a random subset of cells with a random unique row.
+    # A swap is kept only when both rows land on keys nobody holds yet, so every round
+    # strictly shrinks the duplicate set and each column's value counts never change.
+    # (Single-cell swaps stall in crowded regions where every neighbouring key is taken.)
+    keys = _packed_keys(codes, radices)
+    for _ in range(max_rounds):
+        dups = _duplicate_rows(keys)
+        if len(dups) == 0:
+            break
+        unique_rows = np.setdiff1d(np.arange(count), dups, assume_unique=True)
+        # Several proposals per duplicate once few are left, so stubborn rows clear quickly
+        tries = max(1, min(64, 4096 // len(dups)))
+        cand = np.repeat(dups, tries)
+        partners = rng.choice(unique_rows, size=len(cand))
+        mask = rng.random((len(cand), len(columns))) < 0.5
+        mask[np.arange(len(cand)), rng.integers(0, len(columns), size=len(cand))] = True
+        new_dup = np.where(mask, codes[partners], codes[cand])
+        new_partner = np.where(mask, codes[cand], codes[partners])
+        new_dup_keys = _packed_keys(new_dup, radices)
+        new_partner_keys = _packed_keys(new_partner, radices)
+
+        taken = np.sort(keys)
+        ok = ((new_dup_keys != keys[cand]) & (new_dup_keys != new_partner_keys)
+              & ~_contains(taken, new_dup_keys) & ~_contains(taken, new_partner_keys))
+        idx = np.flatnonzero(ok)
+        _, first = np.unique(cand[idx], return_index=True)
+        idx = rng.permutation(idx[first])
+
+        # Proposals in the same round must not collide with each other or reuse a partner.
+        # Where several want the same key or partner, the first in this random order takes
+        # it, so each clashing group still lands one swap (rejecting them all could stall
+        # for good when two proposals keep clashing, as in a nearly full trait space).
+        proposed = np.column_stack([new_dup_keys[idx], new_partner_keys[idx], -1 - partners[idx]]).ravel()
+        _, first = np.unique(proposed, return_index=True)
+        wins = np.zeros(len(proposed), dtype=bool)
+        wins[first] = True
+        accepted = idx[wins.reshape(-1, 3).all(axis=1)]
+
+        d, p = cand[accepted], partners[accepted]
+        codes[d], codes[p] = new_dup[accepted], new_partner[accepted]
+        keys[d], keys[p] = new_dup_keys[accepted], new_partner_keys[accepted]
+    else:
+        raise ValueError(f"Could not make all {count} rows unique under these quotas; loosen them or lower the count")
+
+    # Rarest trait mix gets the rarest tier: score = sum of -log(column frequency)
+    score = np.zeros(count)
+    for j in range(len(columns)):
+        freq = np.bincount(codes[:, j], minlength=radices[j]) / count
+        score -= np.log(freq[codes[:, j]])
+    tiers = sorted(rarity_quotas, key=lambda t: rarity_quotas[t], reverse=True)
+    tier_counts = quota_counts([rarity_quotas[t] for t in tiers], count)
+    order = np.lexsort((rng.random(count), score))  # ascending score, random tie-break
+    tier_codes = np.empty(count, dtype=np.int64)
+    tier_codes[order] = np.repeat(np.arange(len(tiers)), tier_counts)
+    tier_weights = np.array([rarity_quotas[t] for t in tiers])
+
+    return {
+        "columns": columns, "vocab": vocab, "codes": codes, "targets": targets,
+        "tiers": tiers, "tier_codes": tier_codes, "tier_targets": tier_weights / tier_weights.sum(),
+    }
+
+def distribution_report(plan):
+    count = len(plan['codes'])
+    lines = [f"{'Column':<16}{'Value':<24}{'Target':>9}{'Achieved':>10}{'Count':>8}"]
+
+    def section(name, values, targets, col_codes):
+        achieved = np.bincount(col_codes, minlength=len(values))
+        for k, v in enumerate(values):
+            lines.append(f"{name:<16}{v:<24}{targets[k]:>9.2%}{achieved[k] / count:>10.2%}{achieved[k]:>8}")
+
+    for j, col in enumerate(plan['columns']):
+        section(col, plan['vocab'][j], plan['targets'][j], plan['codes'][:, j])
+    section('Final_Rarity', plan['tiers'], plan['tier_targets'], plan['tier_codes'])
+    return "\n".join(lines)
+
+def write_plan_csv(output_path, prefix, plan):
+    columns, vocab, codes = plan['columns'], plan['vocab'], plan['codes']
+    tiers, tier_codes = plan['tiers'], plan['tier_codes']
+    vocab_arrays = [np.asarray(v, dtype=object) for v in vocab]
+    decoded = [vocab_arrays[j][codes[:, j]] for j in range(len(columns))]
+    rarity = np.asarray(tiers, dtype=object)[tier_codes]
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['NFT_Number'] + columns + ['Final_Rarity'])
+        for i in range(len(codes)):
+            writer.writerow([f"{prefix}_{str(i + 1).zfill(3)}"] + [d[i] for d in decoded] + [rarity[i]])
+
+def plan_matrix(prefix, plan):
+    # The plan as a TraitMatrix straight from its codes, without decoding a row
+    columns, codes = plan['columns'], plan['codes']
+    ids = np.arange(1, len(codes) + 1, dtype=np.int64)
+    matrix = np.column_stack([ids, codes, plan['tier_codes']])
+    vocab = {'NFT_Number': None, **dict(zip(columns, plan['vocab'])), 'Final_Rarity': list(plan['tiers'])}
+    dtype = np.uint32 if matrix.max(initial=0) > np.iinfo(np.uint16).max else np.uint16
+    return TraitMatrix(['NFT_Number'] + columns + ['Final_Rarity'], vocab, matrix.astype(dtype), (prefix, 3))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan a full combinations CSV that meets Trait_Rarity_Master quotas exactly")
+    parser.add_argument("output", help="Combinations CSV to write")
+    parser.add_argument("--count", type=int, default=1188)
+    parser.add_argument("--prefix", default="FS")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--excel", default=EXCEL_PATH)
+    parser.add_argument("--matrix", action="store_true",
+                        help="Also save the plan as an integer-coded trait matrix beside the CSV (see trait_matrix.py)")
+    args = parser.parse_args()
+
+    column_quotas, rarity_quotas = load_rarity_targets(args.excel)
+    plan = plan_collection(column_quotas, rarity_quotas, args.count, seed=args.seed)
+    print(distribution_report(plan))
+    write_plan_csv(args.output, args.prefix, plan)
+    if args.matrix:
+        plan_matrix(args.prefix, plan).save(matrix_base(args.output))
+    print(f"Success! {os.path.basename(args.output)} planned with {args.count} unique rows.")
@@ -0,0 +1,167 @@
+import os
+import csv
+import json
+import argparse
+import numpy as np
+from metadata_pack import iter_pack
+import creative_metadata_engine
+import metadata_production_engine
+
+# Configuration
+JSON_DIR = r'C:\Users\HHeltzinger\Desktop\WaterIsLife\MetaData_Production'
+
+# Traits that are unique per item or drawn at random per item by the metadata engines;
+# near-unique values would swamp the scores of the designed (CSV) traits
+DEFAULT_EXCLUDE = (["Water ID"] + metadata_production_engine.RANDOM_TRAIT_TYPES
+                   + creative_metadata_engine.RANDOM_TRAIT_TYPES)
+
+# Value recorded for items that lack a trait type, so "no Status" is scored like any other value
+MISSING = "<none>"
+
+def iter_attribute_lists(json_dir=JSON_DIR):
+    # (item id, attributes) for every metadata JSON in the folder
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(json_dir, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            continue
+        yield filename[:-len('.json')], data.get('attributes', [])
+
+def iter_pack_attributes(pack_path):
+    for item_id, data in iter_pack(pack_path):
+        yield item_id, data.get('attributes', [])
+
+def build_trait_table(records, exclude=DEFAULT_EXCLUDE):
+    # Columnar item/trait table: every distinct (trait_type, value) pair is interned once
+    # and each item holds int32 pair codes. A trait type can appear several times on one
+    # item (the metadata engine writes every accessory as "Gear"), so it is stored as
+    # (item_idx, pair_code) rows rather than one column per trait type.
+    exclude = set(exclude)
+    ids, item_idx, pair_codes = [], [], []
+    trait_types, type_index = [], {}
+    pair_type, pair_value, pair_index = [], [], {}
+
+    def intern(t, value):
+        key = (t, value)
+        code = pair_index.get(key)
+        if code is None:
+            if t not in type_index:
+                type_index[t] = len(trait_types)
+                trait_types.append(t)
+            code = pair_index[key] = len(pair_value)
+            pair_type.append(type_index[t])
+            pair_value.append(value)
+        return code
+
+    for item_id, attributes in records:
+        i = len(ids)
+        ids.append(item_id)
+        for a in attributes:
+            t = a.get('trait_type')
+            if t is None or t in exclude:
+                continue
+            value = a.get('value')
+            item_idx.append(i)
+            pair_codes.append(intern(t, value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)))
+
+    n = len(ids)
+    item_idx = np.asarray(item_idx, dtype=np.int32)
+    pair_codes = np.asarray(pair_codes, dtype=np.int32)
+    # An item counts a given trait value once however often it repeats it
+    if len(pair_codes):
+        packed = np.unique(item_idx.astype(np.int64) * max(1, len(pair_value)) + pair_codes)
+        item_idx = (packed // max(1, len(pair_value))).astype(np.int32)
+        pair_codes = (packed % max(1, len(pair_value))).astype(np.int32)
+
+    # Items without a trait type get its <none> value
+    presence = np.zeros((n, len(trait_types)), dtype=bool)
+    presence[item_idx, np.asarray(pair_type, dtype=np.int32)[pair_codes]] = True
+    missing_items, missing_types = np.nonzero(~presence)
+    if len(missing_items):
+        missing_code = np.array([intern(t, MISSING) for t in trait_types], dtype=np.int32)
+        item_idx = np.concatenate([item_idx, missing_items.astype(np.int32)])
+        pair_codes = np.concatenate([pair_codes, missing_code[missing_types]])
+
+    return {
+        "ids": ids, "trait_types": trait_types,
+        "pair_type": np.asarray(pair_type, dtype=np.int32), "pair_value": pair_value,
+        "item_idx": item_idx, "pair_codes": pair_codes,
+    }
+
+def score_rarity(table):
+    # Pair frequencies and three per-item scores, all as bincounts over the pair rows:
+    #   statistical  - product of trait frequencies (lower is rarer)
+    #   rarity_score - sum of 1 / frequency (higher is rarer)
+    #   information  - sum of -log2(frequency) in bits (higher is rarer)
+    n = len(table["ids"])
+    item_idx, pair_codes = table["item_idx"], table["pair_codes"]
+    counts = np.bincount(pair_codes, minlength=len(table["pair_value"]))
+    freq = counts / n
+    item_freq = freq[pair_codes]
+
+    information = np.bincount(item_idx, weights=-np.log2(item_freq), minlength=n)
+    scores = {
+        "statistical": np.exp2(-information),
+        "rarity_score": np.bincount(item_idx, weights=1.0 / item_freq, minlength=n),
+        "information": information,
+    }
+    # Rank 1 = rarest by information content; ties share the best rank
+    order = np.argsort(-information, kind='stable')
+    ranks = np.empty(n, dtype=np.int64)
+    sorted_info = information[order]
+    first = np.r_[True, np.abs(np.diff(sorted_info)) > 1e-9]
+    ranks[order] = np.maximum.accumulate(np.where(first, np.arange(1, n + 1), 0))
+    return counts, freq, scores, ranks
+
+def write_report(report_path, ranks_path, table, counts, freq, scores, ranks):
+    ids = table["ids"]
+    traits = {t: [] for t in table["trait_types"]}
+    for code, value in enumerate(table["pair_value"]):
+        t = table["trait_types"][table["pair_type"][code]]
+        traits[t].append({"value": value, "count": int(counts[code]), "frequency": round(float(freq[code]), 6)})
+    for values in traits.values():
+        values.sort(key=lambda v: (v["count"], v["value"]))
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({"items": len(ids), "traits": traits}, f, indent=2, ensure_ascii=False)
+
+    # Ties listed by id so the file does not depend on the order items were read in
+    order = sorted(range(len(ids)), key=lambda i: (ranks[i], ids[i]))
+    with open(ranks_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Rank", "ID", "Information_Bits", "Rarity_Score", "Statistical_Rarity"])
+        for i in order:
+            writer.writerow([ranks[i], ids[i], f"{scores['information'][i]:.4f}",
+                             f"{scores['rarity_score'][i]:.4f}", f"{scores['statistical'][i]:.6g}"])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trait frequencies, rarity scores and ranks across the generated metadata")
+    parser.add_argument("--dir", default=JSON_DIR, help="Metadata JSON folder")
+    parser.add_argument("--pack", help="Score a metadata .jsonl pack instead of the JSON files in --dir")
+    parser.add_argument("--exclude", action="append", default=None,
+                        help=f"Trait type to leave out of scoring (repeatable; default: {DEFAULT_EXCLUDE})")
+    parser.add_argument("--report", default="rarity_report.json")
+    parser.add_argument("--ranks", default="rarity_ranks.csv")
+    args = parser.parse_args(argv)
+
+    records = iter_pack_attributes(args.pack) if args.pack else iter_attribute_lists(args.dir)
+    table = build_trait_table(records, args.exclude or DEFAULT_EXCLUDE)
+    ids = table["ids"]
+    if not ids:
+        print(f"No metadata found in {args.pack or args.dir}")
+        return
+    counts, freq, scores, ranks = score_rarity(table)
+    write_report(args.report, args.ranks, table, counts, freq, scores, ranks)
+
+    top = np.argsort(ranks, kind='stable')[:5]
+    print(f"Scored {len(ids)} items across {len(table['trait_types'])} trait types.")
+    for i in top:
+        print(f"  #{ranks[i]} {ids[i]} ({scores['information'][i]:.2f} bits)")
+    print(f"Report: {args.report}  Ranks: {args.ranks}")
+
+if __name__ == "__main__":
+    main()
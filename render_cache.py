@@ -0,0 +1,136 @@
+import os
+import time
+from collections import OrderedDict
+from PIL import Image
+
+DEFAULT_BUDGET_MB = 512
+DEFAULT_COMPOSITE_BUDGET_MB = 256
+
+def image_nbytes(img):
+    return img.width * img.height * len(img.getbands())
+
+class _ImageLRU:
+    # Images evicted least-recently-used once their decoded pixels exceed the memory budget
+    def __init__(self, budget_mb):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._drained = (0, 0)
+
+    def set_budget(self, budget_mb):
+        self.budget = int(budget_mb * 1024 * 1024)
+
+    def _lookup(self, key):
+        img = self._entries.get(key)
+        if img is not None:
+            self._entries.move_to_end(key)
+        return img
+
+    def _put(self, key, img):
+        self._remove(key)
+        self._entries[key] = img
+        self.used += image_nbytes(img)
+        while self.used > self.budget and len(self._entries) > 1:
+            self._evict(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _evict(self, key):
+        self._remove(key)
+
+    def _remove(self, key):
+        img = self._entries.pop(key, None)
+        if img is not None:
+            self.used -= image_nbytes(img)
+
+    def clear(self):
+        self._entries.clear()
+        self.used = 0
+
+    def drain(self):
+        # (hits, misses) since the previous drain, so pool workers can report back to the parent
+        delta = (self.hits - self._drained[0], self.misses - self._drained[1])
+        self._drained = (self.hits, self.misses)
+        return delta
+
+class LayerCache(_ImageLRU):
+    # Decoded RGBA layers keyed by (resolved path, mtime)
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        super().__init__(budget_mb)
+        self._keys_by_path = {}
+        # Time spent decoding PNGs on misses, for run_stats
+        self.decode_seconds = 0.0
+
+    def key(self, path):
+        path = os.path.realpath(path)
+        return (path, os.stat(path).st_mtime_ns)
+
+    def get(self, path, key=None):
+        key = key or self.key(path)
+        img = self._lookup(key)
+        if img is not None:
+            self.hits += 1
+            return img
+
+        self.misses += 1
+        # A layer edited on disk gets a new key, so drop the stale decode now
+        stale = self._keys_by_path.pop(key[0], None)
+        if stale is not None:
+            self._remove(stale)
+
+        start = time.perf_counter()
+        img = Image.open(key[0]).convert("RGBA")
+        self.decode_seconds += time.perf_counter() - start
+        self._keys_by_path[key[0]] = key
+        self._put(key, img)
+        return img
+
+    def _evict(self, key):
+        self._keys_by_path.pop(key[0], None)
+        self._remove(key)
+
+    def clear(self):
+        super().clear()
+        self._keys_by_path.clear()
+
+class CompositeCache(_ImageLRU):
+    # Partially blended images keyed by the tuple of layer keys composited so far,
+    # e.g. (base,), (base, Accessory_1), (base, Accessory_1, Accessory_2)
+    def __init__(self, layer_cache, budget_mb=DEFAULT_COMPOSITE_BUDGET_MB):
+        super().__init__(budget_mb)
+        self.layer_cache = layer_cache
+
+    def compose(self, layers):
+        # layers: [(path, (x, y)), ...] with the base first at (0, 0)
+        paths = [path for path, _ in layers]
+        keys = [self.layer_cache.key(p) + (offset,) for p, (_, offset) in zip(paths, layers)]
+        full = tuple(keys)
+
+        # Longest already-blended prefix; a lone base is just the decoded layer
+        start = 1
+        img = None
+        for n in range(len(keys) - 1, 1, -1):
+            cached = self._lookup(full[:n])
+            if cached is not None:
+                self.hits += 1
+                img = cached.copy()
+                start = n
+                break
+        if img is None:
+            if len(keys) > 2:
+                self.misses += 1
+            img = self.layer_cache.get(paths[0]).copy()
+
+        for n in range(start, len(keys)):
+            img.alpha_composite(self.layer_cache.get(paths[n]), dest=layers[n][1])
+            # Keep intermediates only; a full tuple is unique to one NFT
+            if n + 1 < len(keys):
+                self._put(full[:n + 1], img.copy())
+        return img
+
+def format_cache_stats(name, hits, misses):
+    total = hits + misses
+    rate = hits / total if total else 0.0
+    return f"{name}: {hits} hits, {misses} misses ({rate:.1%} hit rate)"
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import heapq
+import bisect
+import platform
+import threading
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Latency histogram bucket upper edges in milliseconds; the last bucket is open-ended
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+_NULL = contextlib.nullcontext()
+
+def peak_rss_mb():
+    # Peak resident set size of this process and its finished children (pool workers)
+    if resource is None:
+        return None
+    per_mb = 1024 * 1024 if platform.system() == "Darwin" else 1024  # macOS reports bytes, Linux KB
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / per_mb, 1)
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def histogram(seconds):
+    counts = [0] * (len(BUCKETS_MS) + 1)
+    for s in seconds:
+        counts[bisect.bisect_left(BUCKETS_MS, s * 1000)] += 1
+    labels = [f"<={edge}ms" for edge in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+    return {label: n for label, n in zip(labels, counts) if n}
+
+def summarize(seconds):
+    values = sorted(seconds)
+    total = sum(values)
+    return {
+        "count": len(values),
+        "total_s": round(total, 4),
+        "mean_ms": round(total * 1000 / len(values), 3),
+        "p50_ms": round(_percentile(values, 0.50) * 1000, 3),
+        "p90_ms": round(_percentile(values, 0.90) * 1000, 3),
+        "p99_ms": round(_percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+        "histogram": histogram(values),
+    }
+
+class RunStats:
+    # Per-stage latency samples and counters for one run, safe to share between threads.
+    # Disabled stats cost one attribute check per stage, so the engines can call them
+    # unconditionally.
+    def __init__(self, name, enabled=True):
+        self.name = name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.samples = {}
+        self.counters = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL
+        return self._timed(name)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        if self.enabled:
+            with self._lock:
+                self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def drain(self):
+        # Samples and counters since the previous drain, for pool workers to send back
+        drained = (self.samples, self.counters)
+        self.samples, self.counters = {}, {}
+        return drained
+
+    def merge(self, drained):
+        samples, counters = drained
+        for name, values in samples.items():
+            self.samples.setdefault(name, []).extend(values)
+        for name, n in counters.items():
+            self.count(name, n)
+
+    def report(self, extra=None):
+        wall = time.perf_counter() - self.started
+        items = self.counters.get("items", 0)
+        report = {
+            "run": self.name,
+            "wall_s": round(wall, 3),
+            "items": items,
+            "items_per_s": round(items / wall, 3) if wall else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "counters": dict(sorted(self.counters.items())),
+            "stages": {name: summarize(values) for name, values in self.samples.items() if values},
+        }
+        report.update(extra or {})
+        return report
+
+    def write(self, path, extra=None):
+        report = self.report(extra)
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def print_summary(self):
+        report = self.report()
+        print(f"{report['items']} items in {report['wall_s']}s ({report['items_per_s']}/s), peak RSS {report['peak_rss_mb']} MB")
+        for name, s in report["stages"].items():
+            print(f"  {name:<16}n={s['count']:<7} mean {s['mean_ms']:>9.2f} ms  p90 {s['p90_ms']:>9.2f} ms  max {s['max_ms']:>9.2f} ms")
+
+# Default for the engines' stats= parameters when --stats is off; records nothing
+NO_STATS = RunStats("disabled", enabled=False)
+
+def add_stats_argument(parser):
+    parser.add_argument("--stats", metavar="REPORT_JSON", help="Record per-stage timings, throughput and peak RSS into this JSON report")
+
+class SlowestProfiles:
+    # cProfile dumps (<key>.prof) for the `keep` slowest items seen; faster ones are deleted
+    def __init__(self, out_dir, keep=5):
+        self.out_dir = out_dir
+        self.keep = keep
+        self._heap = []
+        os.makedirs(out_dir, exist_ok=True)
+
+    def offer(self, key, elapsed, profiler):
+        # Returns the dump path when the item made the cut, so workers can tell the parent
+        if len(self._heap) >= self.keep and elapsed <= self._heap[0][0]:
+            return None
+        path = os.path.join(self.out_dir, f"{key}.prof")
+        profiler.dump_stats(path)
+        self.adopt(key, elapsed, path)
+        return path
+
+    def adopt(self, key, elapsed, path):
+        # Track a dump written elsewhere (a pool worker keeps its own slowest set)
+        heapq.heappush(self._heap, (elapsed, key, path))
+        while len(self._heap) > self.keep:
+            _, _, dropped = heapq.heappop(self._heap)
+            if os.path.exists(dropped) and dropped not in {p for _, _, p in self._heap}:
+                os.remove(dropped)
+
+    def slowest(self):
+        return [{"id": key, "seconds": round(elapsed, 4), "profile": path}
+                for elapsed, key, path in sorted(self._heap, reverse=True)]
@@ -0,0 +1,57 @@
+import argparse
+import pandas as pd
+from workbook_cache import EXCEL_PATH, load_all
+
+def search_workbook(term, excel_path=EXCEL_PATH, regex=False, case=False, sheets=None, columns=None):
+    # Column-wise vectorized match over the cached sheets -> [(sheet, excel_row, column, value)]
+    hits = []
+    for sheet, df in load_all(excel_path).items():
+        if sheets and sheet not in sheets:
+            continue
+        for col in df.columns:
+            if columns and str(col) not in columns:
+                continue
+            values = df[col].dropna()
+            if values.empty:
+                continue
+            text = values.astype(str)
+            mask = text.str.contains(term, case=case, regex=regex)
+            # Header is row 1 in Excel, so DataFrame row 0 is Excel row 2
+            for idx, value in text[mask].items():
+                hits.append((sheet, idx + 2, str(col), value))
+    hits.sort(key=lambda h: (h[0], h[1]))
+    return hits
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search every sheet of WaterIsLife.xlsx for a term")
+    parser.add_argument("term")
+    parser.add_argument("--regex", action="store_true", help="Treat the term as a regular expression")
+    parser.add_argument("--case-sensitive", action="store_true")
+    parser.add_argument("--sheet", action="append", help="Only search this sheet (repeatable)")
+    parser.add_argument("--column", action="append", help="Only search this column (repeatable)")
+    parser.add_argument("--rows", action="store_true", help="Print the full matching rows per sheet instead of single cells")
+    parser.add_argument("--excel", default=EXCEL_PATH)
+    args = parser.parse_args(argv)
+
+    hits = search_workbook(args.term, args.excel, regex=args.regex, case=args.case_sensitive,
+                           sheets=args.sheet, columns=args.column)
+    if not hits:
+        print(f"No matches for '{args.term}'.")
+        return hits
+
+    if args.rows:
+        frames = load_all(args.excel)
+        pd.set_option('display.max_columns', None)
+        pd.set_option('display.width', 1000)
+        for sheet in sorted({h[0] for h in hits}):
+            rows = sorted({h[1] - 2 for h in hits if h[0] == sheet})
+            print(f"Found '{args.term}' in sheet '{sheet}' ({len(rows)} rows):")
+            print(frames[sheet].loc[rows])
+    else:
+        for sheet, row, col, value in hits:
+            print(f"{sheet}\trow {row}\t{col}\t{value}")
+    print(f"{len(hits)} matching cells in {len({h[0] for h in hits})} sheets.")
+    return hits
+
+if __name__ == "__main__":
+    main()
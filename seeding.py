@@ -0,0 +1,76 @@
+import os
+import json
+import random
+import hashlib
+import argparse
+from build_manifest import sidecar_name
+
+# Every random draw for an item comes from its own generator, seeded from the
+# collection seed, the item's id and a stream name ("metadata", "enhance", ...).
+# A value then depends only on those three, not on which machine, process or
+# position in the run produced it, so a sharded build matches a single-node one.
+def item_seed(collection_seed, item_id, stream=""):
+    digest = hashlib.sha256(f"{collection_seed}\x00{stream}\x00{item_id}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+def item_rng(collection_seed, item_id, stream=""):
+    # Without a collection seed the global random module is used, as before seeding existed
+    if collection_seed is None:
+        return random
+    return random.Random(item_seed(collection_seed, item_id, stream))
+
+def parse_shard(text):
+    # "i/n" -> (i, n) for argparse; shards are numbered from 0
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad shard '{text}', expected i/n such as 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"bad shard '{text}', need 0 <= i < n")
+    return index, count
+
+def shard_of(item_id, count):
+    # Stable across runs and machines (unlike hash(), which is salted per process)
+    return int.from_bytes(hashlib.sha256(str(item_id).encode('utf-8')).digest()[:8], 'big') % count
+
+def in_shard(item_id, shard):
+    return shard is None or shard_of(item_id, shard[1]) == shard[0]
+
+# Written into each output folder by a --shard run so merge_shards.py can check the
+# shards against each other
+SHARD_RECORD_PREFIX = sidecar_name("shard_")
+
+def shard_record_path(output_dir, tag):
+    return os.path.join(output_dir, SHARD_RECORD_PREFIX + tag)
+
+def shard_total(output_dir, shard, seen):
+    # Item count of the whole build. A pass run over a folder that an earlier --shard pass
+    # produced (enhancing that node's metadata) only sees its own shard, so it takes the
+    # earlier record's total.
+    if os.path.isdir(output_dir):
+        for record in load_shard_records(output_dir).values():
+            if record["shard"] == list(shard):
+                return max(record["total"], seen)
+    return seen
+
+def write_shard_record(output_dir, tag, shard, seed, total, items, outputs, pack=None, missing=()):
+    # items: the shard's ids (what shard_of was applied to); outputs: file names in
+    # output_dir, or keys of the pack file when pack is set; missing: items with no output
+    record = {
+        "tag": tag, "shard": list(shard), "seed": seed, "total": total,
+        "items": sorted(items), "pack": pack, "outputs": sorted(outputs), "missing": sorted(missing),
+    }
+    with open(shard_record_path(output_dir, tag), 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    print(f"Shard {shard[0]}/{shard[1]} of {tag}: {len(items)} of {total} items"
+          + (f", {len(missing)} without output" if missing else ""))
+    return record
+
+def load_shard_records(shard_dir):
+    records = {}
+    for name in sorted(os.listdir(shard_dir)):
+        if name.startswith(SHARD_RECORD_PREFIX):
+            with open(os.path.join(shard_dir, name), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            records[record["tag"]] = record
+    return records
@@ -0,0 +1,128 @@
+import os
+import re
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-in for the storage service, so uploads can be tested and benchmarked offline.
+# Blobs are addressed by the sha256 of their content:
+#   HEAD /blobs/<sha256>   200 if stored, 404 if not
+#   GET  /blobs/<sha256>   the bytes
+#   PUT  /blobs/<sha256>   store the body; 400 if it does not hash to <sha256>
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_ROOT = "local_storage"
+
+_BLOB_PATH = re.compile(r"^/blobs/([0-9a-f]{64})$")
+
+class StorageHandler(BaseHTTPRequestHandler):
+    def _blob(self):
+        # Blob path for the request, or None after answering 404
+        match = _BLOB_PATH.match(self.path)
+        if not match:
+            self.send_error(404)
+            return None
+        return match.group(1), os.path.join(self.server.root, match.group(1))
+
+    def _flaky(self):
+        # --fail-rate / --latency-ms: exercise the uploader's retries and concurrency
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.fail_rate and random.random() < self.server.fail_rate:
+            self.send_error(503, "Injected failure")
+            return True
+        return False
+
+    def do_HEAD(self):
+        blob = self._blob()
+        if blob is None or self._flaky():
+            return
+        exists = os.path.exists(blob[1])
+        self.send_response(200 if exists else 404)
+        self.send_header("Content-Length", str(os.path.getsize(blob[1]) if exists else 0))
+        self.end_headers()
+
+    def do_GET(self):
+        blob = self._blob()
+        if blob is None or self._flaky():
+            return
+        if not os.path.exists(blob[1]):
+            self.send_error(404)
+            return
+        with open(blob[1], 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_PUT(self):
+        blob = self._blob()
+        if blob is None:
+            return
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._flaky():
+            return
+        digest, path = blob
+        if hashlib.sha256(data).hexdigest() != digest:
+            self.send_error(400, "Content does not match its sha256")
+            return
+        existed = os.path.exists(path)
+        if not existed:
+            # Written beside the blob then renamed, so a HEAD never sees a partial file
+            fd, tmp = tempfile.mkstemp(dir=self.server.root, prefix=".tmp-")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        self.send_response(200 if existed else 201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(root=DEFAULT_ROOT, host=DEFAULT_HOST, port=DEFAULT_PORT, fail_rate=0.0, latency_ms=0, verbose=False):
+    os.makedirs(root, exist_ok=True)
+    server = ThreadingHTTPServer((host, port), StorageHandler)
+    server.daemon_threads = True
+    server.root = root
+    server.fail_rate = fail_rate
+    server.latency = latency_ms / 1000
+    server.verbose = verbose
+    return server
+
+def start_server(root=DEFAULT_ROOT, host=DEFAULT_HOST, port=0, **options):
+    # Serve from a background thread (port 0 picks a free one) -> (server, base URL);
+    # stop with server.shutdown()
+    server = make_server(root, host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local content-addressed storage server for offline upload tests")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Folder the blobs are kept in (default: %(default)s)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Answer this fraction of requests with 503")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay every request by this long")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    server = make_server(args.root, args.host, args.port, fail_rate=args.fail_rate,
+                         latency_ms=args.latency_ms, verbose=args.verbose)
+    print(f"Storing blobs in {os.path.abspath(args.root)} at http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import csv
+import pytest
+import csv_extender_local as extender
+
+HEADERS = ["NFT_Number", "Base_Variation", "Accessory_1", "Accessory_2", "Final_Rarity"]
+
+def _seed_csv(path):
+    # Pools: 3 bases, Accessory_1 {Comet, Shell, None}, Accessory_2 {Pearl, None} -> 18 combinations
+    rows = [
+        ["FS_001", "Base1", "Comet", "Pearl", "Common"],
+        ["FS_002", "Base2", "Shell", "None", "Rare"],
+        ["FS_003", "Base3", "None", "None", "Common"],
+    ]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+    return path
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+def _combo(row):
+    return (row["Base_Variation"], row["Accessory_1"], row["Accessory_2"])
+
+def test_combo_index_round_trip():
+    cols = ["Base_Variation", "Accessory_1"]
+    pools = {"Base_Variation": ["Base1", "Base2"], "Accessory_1": ["Comet", "Shell", "None"]}
+    for index in range(6):
+        values = extender.decode_combo(index, cols, pools, [2, 3])
+        assert extender.combo_index(dict(zip(cols, values)), cols, pools) == index
+    assert extender.combo_index({"Base_Variation": "Base9", "Accessory_1": "Comet"}, cols, pools) is None
+
+def test_expand_is_reproducible_by_seed(tmp_path):
+    source = _seed_csv(tmp_path / "in.csv")
+    outputs = []
+    for name, seed in [("a.csv", 7), ("b.csv", 7), ("c.csv", 8)]:
+        assert extender.expand_csv(str(source), str(tmp_path / name), 12, "FS", seed=seed)
+        outputs.append((tmp_path / name).read_bytes())
+    assert outputs[0] == outputs[1]
+    assert outputs[0] != outputs[2]
+
+@pytest.mark.parametrize("target", [10, 18])
+def test_expand_adds_unique_unused_combinations(tmp_path, target):
+    source = _seed_csv(tmp_path / "in.csv")
+    output = tmp_path / "out.csv"
+    assert extender.expand_csv(str(source), str(output), target, "FS", seed=1)
+
+    rows = _read(output)
+    assert len(rows) == target
+    assert rows[:3] == _read(source)
+    assert len({_combo(row) for row in rows}) == target
+    assert [row["NFT_Number"] for row in rows] == [f"FS_{i:03}" for i in range(1, target + 1)]
+    for row in rows[3:]:
+        assert row["Base_Variation"] in {"Base1", "Base2", "Base3"}
+        assert row["Accessory_1"] in {"Comet", "Shell", "None"}
+        assert row["Accessory_2"] in {"Pearl", "None"}
+
+def test_expand_refuses_an_unreachable_target(tmp_path, capsys):
+    source = _seed_csv(tmp_path / "in.csv")
+    output = tmp_path / "out.csv"
+    assert extender.expand_csv(str(source), str(output), 19, "FS", seed=1) is False
+    assert not output.exists()
+    assert "Only 15 unused combinations remain" in capsys.readouterr().out
@@ -0,0 +1,80 @@
+import os
+import threading
+import pytest
+import mass_nft_generator_local as generator
+from build_manifest import BuildManifest
+from metadata_pack import load_index
+
+def _cfg(base_dir):
+    return {"base_dir": str(base_dir), "base_map": {}, "trait_map": {}}
+
+def test_missing_layer_in_two_slots_counts_the_row_once(tmp_path):
+    (tmp_path / "Base1.png").write_bytes(b"")
+    rows = [
+        {"NFT_Number": "FS_001", "Base_Variation": "Base1", "Accessory_1": "Ghost", "Accessory_2": "Ghost"},
+        {"NFT_Number": "FS_002", "Base_Variation": "Base1", "Accessory_1": "Ghost", "Accessory_2": "None"},
+    ]
+    missing = generator.plan_drop(_cfg(tmp_path), rows)
+    assert list(missing.values()) == [["FS_001", "FS_002"]]
+    report = generator.missing_report("Test", missing)
+    assert "1 files used by 2 rows" in report and "(2 rows:" in report
+
+def _tiny_drop(tmp_path, monkeypatch, broken="png"):
+    from PIL import Image
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    Image.new("RGBA", (4, 4), (0, 0, 255, 255)).save(drop / "Base1.png")
+    Image.new("RGBA", (4, 4), (255, 0, 0, 128)).save(drop / "Comet.png")
+    csv_path = drop / "Tiny.csv"
+    csv_path.write_text("NFT_Number,Base_Variation,Accessory_1,Final_Rarity\n"
+                        "FS_001,Base1,Comet,Common\nFS_002,Base1,None,Rare\n", encoding='utf-8')
+    monkeypatch.setitem(generator.CONFIG, "Tiny", dict(_cfg(drop), csv_path=str(csv_path), theme="Tiny"))
+    monkeypatch.setattr(generator, "PNG_DIR", str(tmp_path / "png"))
+    monkeypatch.setattr(generator, "JSON_DIR", str(tmp_path / "json"))
+    # FS_001's PNG (or its JSON) cannot be written: the path is taken by a folder
+    if broken == "png":
+        (tmp_path / "png" / "FS_001.png").mkdir(parents=True)
+    else:
+        (tmp_path / "json" / "FS_001.json").mkdir(parents=True)
+
+MODES = [{}, {"encoders": 2}, {"workers": 2}, {"packed": True},
+         {"encoders": 2, "packed": True}, {"workers": 2, "packed": True}]
+
+@pytest.mark.parametrize("broken", ["png", "json"])
+@pytest.mark.parametrize("mode", MODES)
+def test_failed_item_gets_no_metadata_in_any_mode(tmp_path, monkeypatch, mode, broken):
+    if broken == "json" and mode.get("packed"):
+        pytest.skip("packed runs write no JSON files")
+    _tiny_drop(tmp_path, monkeypatch, broken)
+    generator.run_drop("Tiny", **mode)
+
+    if mode.get("packed"):
+        written = set(load_index(generator.pack_path("Tiny")))
+    else:
+        written = {name[:-len(".json")] for name in os.listdir(generator.JSON_DIR)
+                   if os.path.isfile(os.path.join(generator.JSON_DIR, name))}
+    assert written == {"FS_002"}
+    assert set(BuildManifest(generator.PNG_DIR).entries) == {"FS_002"}
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_pipeline_stops_when_a_stage_dies(tmp_path, monkeypatch):
+    _tiny_drop(tmp_path, monkeypatch)
+    generator.make_output_dirs()
+    rows = [{"NFT_Number": f"FS_{i:03}", "Base_Variation": "Base1", "Accessory_1": "Comet", "Final_Rarity": "Common"}
+            for i in range(2, 40)]
+
+    def finished(row, ok):
+        raise OSError("disk gone")
+
+    # Tiny queues, so the composite loop and the encoders would block on the dead writer
+    outcome = []
+    def run():
+        try:
+            generator.run_pipeline("Tiny", rows, 2, finished, lambda: None, queue_size=1)
+        except Exception as e:
+            outcome.append(e)
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    t.join(30)
+    assert not t.is_alive(), "run_pipeline hung after its writer thread died"
+    assert len(outcome) == 1 and isinstance(outcome[0], RuntimeError)
@@ -0,0 +1,78 @@
+import os
+import pytest
+import merge_shards
+import metadata_production_engine as engine
+from metadata_pack import iter_pack
+from seeding import item_rng
+
+SEED = 5
+SHARDS = 3
+
+def _pngs(tmp_path, count=30):
+    # The engine only lists the PNG names; their rows come from the CSV index
+    png_dir = tmp_path / "png"
+    png_dir.mkdir()
+    for i in range(1, count + 1):
+        (png_dir / f"FS_{i:03}.png").write_bytes(b"")
+    csv_path = tmp_path / "FS.csv"
+    csv_path.write_text("NFT_Number,Base_Variation,Accessory_1\n"
+                        + "".join(f"FS_{i:03},Base{i % 3},Comet\n" for i in range(1, count + 1)), encoding='utf-8')
+    return str(png_dir), engine.CsvIndex({"FS": str(csv_path)})
+
+def _build(png_dir, csv_index, output_dir, shard=None, seed=SEED, packed=False):
+    engine.write_metadata(png_dir, str(output_dir), csv_index=csv_index, seed=seed, shard=shard, packed=packed)
+    return str(output_dir)
+
+def _outputs(folder):
+    # Merged outputs without the manifest and shard records kept beside them
+    return {name: open(os.path.join(folder, name), 'rb').read()
+            for name in os.listdir(folder) if not name.startswith('.')}
+
+def test_item_rng_depends_only_on_seed_and_id():
+    a = [item_rng(SEED, "FS_001", "metadata").random() for _ in range(2)]
+    assert a[0] == a[1]
+    assert item_rng(SEED, "FS_001", "metadata").random() != item_rng(SEED, "FS_002", "metadata").random()
+    assert item_rng(SEED, "FS_001", "metadata").random() != item_rng(SEED + 1, "FS_001", "metadata").random()
+
+@pytest.mark.parametrize("packed", [False, True])
+def test_merged_shards_equal_an_unsharded_build(tmp_path, packed):
+    png_dir, csv_index = _pngs(tmp_path)
+    whole = _build(png_dir, csv_index, tmp_path / "whole", packed=packed)
+    # Shards built in reverse order, as separate machines might finish them
+    nodes = [_build(png_dir, csv_index, tmp_path / f"node{i}", shard=(i, SHARDS), packed=packed)
+             for i in reversed(range(SHARDS))]
+    merged = str(tmp_path / "merged")
+
+    assert merge_shards.main(nodes + ["--output", merged]) == 0
+    if packed:
+        assert list(iter_pack(os.path.join(merged, engine.PACK_NAME))) == list(iter_pack(os.path.join(whole, engine.PACK_NAME)))
+    else:
+        assert _outputs(merged) == _outputs(whole)
+        assert len(_outputs(merged)) == 30
+
+def test_shards_with_different_seeds_are_not_merged(tmp_path, capsys):
+    png_dir, csv_index = _pngs(tmp_path)
+    nodes = [_build(png_dir, csv_index, tmp_path / f"node{i}", shard=(i, SHARDS), seed=SEED + (i == 1))
+             for i in range(SHARDS)]
+    merged = tmp_path / "merged"
+
+    assert merge_shards.main(nodes + ["--output", str(merged)]) == 1
+    assert "shards disagree on seed" in capsys.readouterr().out
+    assert not merged.exists()
+
+def test_missing_or_repeated_shards_are_reported(tmp_path):
+    png_dir, csv_index = _pngs(tmp_path)
+    nodes = [_build(png_dir, csv_index, tmp_path / f"node{i}", shard=(i, SHARDS)) for i in range(SHARDS)]
+    entries = lambda folders: [(folder, merge_shards.load_shard_records(folder)["metadata_production_engine"])
+                               for folder in folders]
+
+    assert merge_shards.check_shards(entries(nodes)) == []
+    problems = merge_shards.check_shards(entries(nodes[:2]))
+    assert any(f"no output for shards 2/{SHARDS}" in p for p in problems)
+    problems = merge_shards.check_shards(entries(nodes + nodes[:1]))
+    assert any("appears twice" in p for p in problems)
+
+    # A listed output deleted after the shard was built
+    os.remove(os.path.join(nodes[0], sorted(_outputs(nodes[0]))[0]))
+    problems = merge_shards.check_shards(entries(nodes))
+    assert any("listed outputs are gone" in p for p in problems)
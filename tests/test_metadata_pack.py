@@ -0,0 +1,41 @@
+import os
+from metadata_pack import PackReader, PackWriter, index_path, scan_pack
+
+def _crash_with_torn_line(path):
+    with PackWriter(path) as writer:
+        writer.write("a", {"n": 1})
+    # A writer that died mid-record: part of a line, no newline, no index update
+    with open(path, 'ab') as f:
+        f.write(b'{"id":"b","metadata":{"n"')
+
+def test_resume_after_torn_line_keeps_new_records(tmp_path):
+    path = str(tmp_path / "drop.jsonl")
+    _crash_with_torn_line(path)
+
+    with PackWriter(path, append=True) as writer:
+        writer.write("b", {"n": 2})
+        writer.write("c", {"n": 3})
+
+    with PackReader(path) as reader:
+        assert list(reader) == [("a", {"n": 1}), ("b", {"n": 2}), ("c", {"n": 3})]
+        assert reader.get("b") == {"n": 2}
+    assert set(scan_pack(path)) == {"a", "b", "c"}
+
+def test_resume_drops_torn_keys_from_a_stale_index(tmp_path):
+    path = str(tmp_path / "drop.jsonl")
+    _crash_with_torn_line(path)
+    os.remove(index_path(path))
+
+    with PackWriter(path, append=True) as writer:
+        assert set(writer.offsets) == {"a"}
+    with open(path, 'rb') as f:
+        assert f.read().endswith(b"}}\n")
+
+def test_resume_of_a_clean_pack_appends(tmp_path):
+    path = str(tmp_path / "drop.jsonl")
+    with PackWriter(path) as writer:
+        writer.write("a", {"n": 1})
+    with PackWriter(path, append=True) as writer:
+        writer.write("a", {"n": 9})
+    with PackReader(path) as reader:
+        assert list(reader) == [("a", {"n": 9})]
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import rarity_planner
+
+# 3 x 4 x 4 x 4 = 192 combinations once the accessory pools get their None share
+QUOTAS = {
+    "Base_Variation": {"Base1": 0.5, "Base2": 0.3, "Base3": 0.2},
+    "Accessory_1": {"Comet": 0.25, "Shell": 0.15, "Pearl": 0.2},
+    "Accessory_2": {"Comet": 0.4, "Shell": 0.1, "Pearl": 0.3},
+    "Accessory_3": {"Comet": 0.1, "Shell": 0.3, "Pearl": 0.2},
+}
+
+def _rows(plan):
+    return {tuple(row) for row in plan["codes"].tolist()}
+
+def test_quota_counts_sum_to_total():
+    counts = rarity_planner.quota_counts([0.5, 0.3, 0.2], 7)
+    assert counts.sum() == 7
+    assert list(counts) == [4, 2, 1]
+
+def test_plan_meets_quotas_exactly_with_unique_rows():
+    count = 60
+    plan = rarity_planner.plan_collection(QUOTAS, rarity_planner.DEFAULT_RARITIES, count, seed=3)
+
+    assert len(_rows(plan)) == count
+    for j, column in enumerate(plan["columns"]):
+        quotas = dict(QUOTAS[column])
+        if column.startswith("Accessory"):
+            # Accessory pools below 100% are topped up with None
+            quotas.setdefault("None", 1.0 - sum(quotas.values()))
+        expected = rarity_planner.quota_counts([quotas[v] for v in plan["vocab"][j]], count)
+        assert list(np.bincount(plan["codes"][:, j], minlength=len(expected))) == list(expected)
+    tiers = rarity_planner.quota_counts(list(plan["tier_targets"]), count)
+    assert list(np.bincount(plan["tier_codes"], minlength=len(tiers))) == list(tiers)
+
+def test_plan_is_reproducible_by_seed():
+    a = rarity_planner.plan_collection(QUOTAS, rarity_planner.DEFAULT_RARITIES, 60, seed=11)
+    b = rarity_planner.plan_collection(QUOTAS, rarity_planner.DEFAULT_RARITIES, 60, seed=11)
+    assert np.array_equal(a["codes"], b["codes"])
+    assert np.array_equal(a["tier_codes"], b["tier_codes"])
+
+@pytest.mark.parametrize("quotas, count", [
+    ({"A": {"x": 0.5, "y": 0.5}, "B": {"p": 0.5, "q": 0.5}}, 4),
+    ({"A": {"x": 1 / 3, "y": 1 / 3, "z": 1 / 3}, "B": {"p": 1 / 3, "q": 1 / 3, "r": 1 / 3}}, 9),
+    ({"A": {"x": 0.5, "y": 0.5}, "B": {"p": 1 / 3, "q": 1 / 3, "r": 1 / 3}, "C": {"u": 0.5, "v": 0.5}}, 12),
+])
+def test_plan_fills_the_whole_trait_space(quotas, count):
+    # count equals the number of combinations, so every one of them has to be used
+    for seed in range(50):
+        plan = rarity_planner.plan_collection(quotas, {"Common": 1.0}, count, seed=seed)
+        assert len(_rows(plan)) == count
+
+def test_plan_rejects_more_rows_than_combinations():
+    with pytest.raises(ValueError):
+        rarity_planner.plan_collection({"A": {"x": 0.5, "y": 0.5}}, {"Common": 1.0}, 3, seed=0)
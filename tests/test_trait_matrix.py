@@ -0,0 +1,81 @@
+import os
+import csv
+import pytest
+import trait_matrix
+import metadata_production_engine as engine
+
+HEADERS = ["NFT_Number", "Base_Variation", "Accessory_1", "Final_Rarity"]
+
+def _write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADERS)
+        writer.writerows(rows)
+    return str(path)
+
+def _rows(ids):
+    return [[nft_id, f"Base{i % 3}", ["Comet", "", "None", "Café"][i % 4], ["Common", "Rare"][i % 2]]
+            for i, nft_id in enumerate(ids)]
+
+@pytest.mark.parametrize("ids", [
+    [f"FS_{i:04}" for i in range(1, 41)],
+    # Not one <prefix>_<number> pattern, so the ids keep a vocabulary
+    [f"FS_{i:03}" for i in range(1, 21)] + [f"OC_{i}" for i in range(1, 21)] + ["odd"],
+])
+def test_csv_round_trip(tmp_path, ids):
+    source = _write_csv(tmp_path / "in.csv", _rows(ids))
+    matrix = trait_matrix.TraitMatrix.from_csv(source)
+    base = str(tmp_path / "matrix" / "in")
+    matrix.save(base)
+
+    loaded = trait_matrix.TraitMatrix.load(base)
+    assert len(loaded) == len(ids)
+    assert (loaded.id_format is not None) == (ids[0] == "FS_0001")
+    loaded.to_csv(str(tmp_path / "out.csv"))
+    assert (tmp_path / "out.csv").read_bytes() == (tmp_path / "in.csv").read_bytes()
+
+    with open(source, 'r', encoding='utf-8', newline='') as f:
+        assert list(loaded.rows()) == list(csv.DictReader(f))
+    index = engine.load_csv_index(source)
+    for nft_id in ids:
+        assert loaded.row(nft_id) == index[nft_id]
+    assert loaded.row("FS_9999") is None and loaded.row("XX_0001") is None
+
+def test_repeated_ids_and_combinations(tmp_path):
+    source = _write_csv(tmp_path / "in.csv", [["FS_001", "Base1", "Comet", "Common"],
+                                              ["FS_002", "Base2", "Shell", "Rare"],
+                                              ["FS_001", "Base3", "Pearl", "Rare"],
+                                              ["FS_004", "Base2", "Shell", "Common"]])
+    matrix = trait_matrix.TraitMatrix.from_csv(source)
+    # First row wins, as in load_csv_index
+    assert matrix.row("FS_001") == engine.load_csv_index(source)["FS_001"]
+    assert list(matrix.duplicates()) == [3]
+
+def test_csv_index_falls_back_to_the_csv_when_the_matrix_is_stale(tmp_path):
+    source = _write_csv(tmp_path / "FS.csv", _rows([f"FS_{i:03}" for i in range(1, 11)]))
+    trait_matrix.TraitMatrix.from_csv(source).save(trait_matrix.matrix_base(source))
+    assert trait_matrix.is_fresh(source)
+
+    index = engine.CsvIndex({"FS": source})
+    assert index.row("FS", "FS_003")["Base_Variation"] == "Base2"
+    assert isinstance(index._loaded["FS"], trait_matrix.TraitMatrix)
+
+    # Edit the CSV after the matrix was saved
+    rows = _rows([f"FS_{i:03}" for i in range(1, 11)])
+    rows[2][1] = "Edited"
+    _write_csv(source, rows)
+    later = os.path.getmtime(trait_matrix.matrix_base(source) + trait_matrix.MATRIX_SUFFIX) + 10
+    os.utime(source, (later, later))
+    assert not trait_matrix.is_fresh(source)
+
+    index = engine.CsvIndex({"FS": source})
+    assert index.row("FS", "FS_003")["Base_Variation"] == "Edited"
+    assert isinstance(index._loaded["FS"], dict)
+
+def test_missing_sidecar_is_not_fresh(tmp_path):
+    source = _write_csv(tmp_path / "FS.csv", _rows(["FS_001"]))
+    base = trait_matrix.matrix_base(source)
+    trait_matrix.TraitMatrix.from_csv(source).save(base)
+    os.remove(base + trait_matrix.VOCAB_SUFFIX)
+    assert not trait_matrix.is_fresh(source)
+    assert engine.CsvIndex({"FS": source}).row("FS", "FS_001")["Final_Rarity"] == "Common"
@@ -0,0 +1,128 @@
+import os
+import json
+import asyncio
+import hashlib
+import pytest
+import storage_server
+import upload_pipeline
+
+@pytest.fixture
+def store(tmp_path):
+    server, url = storage_server.start_server(str(tmp_path / "store"))
+    yield server, url
+    server.shutdown()
+    server.server_close()
+
+def _files(folder, contents, suffix='.png'):
+    os.makedirs(folder, exist_ok=True)
+    for i, data in enumerate(contents, 1):
+        with open(os.path.join(folder, f"FS_{i:03}{suffix}"), 'wb') as f:
+            f.write(data)
+    return str(folder)
+
+def _upload(url, folder, suffix='.png', **options):
+    uploader = upload_pipeline.Uploader(url, concurrency=4, **options)
+    uris = asyncio.run(upload_pipeline.upload_folder(uploader, folder, suffix))
+    return uris, uploader
+
+def _stored(server):
+    return sorted(name for name in os.listdir(server.root) if not name.startswith('.'))
+
+def test_identical_contents_are_uploaded_once(store, tmp_path):
+    server, url = store
+    folder = _files(tmp_path / "png", [b"one", b"two", b"one", b"one"])
+    uris, uploader = _upload(url, folder)
+
+    assert uploader.counts["uploaded"] == 2
+    assert uploader.counts["duplicates"] == 2
+    assert uris["FS_001.png"] == uris["FS_003.png"] == uris["FS_004.png"] != uris["FS_002.png"]
+    assert _stored(server) == sorted(hashlib.sha256(data).hexdigest() for data in [b"one", b"two"])
+    assert uris["FS_002.png"] == f"{url}/blobs/{hashlib.sha256(b'two').hexdigest()}"
+
+def test_rerun_resumes_from_the_ledger(store, tmp_path):
+    server, url = store
+    folder = _files(tmp_path / "png", [b"a", b"b", b"c"])
+    first, _ = _upload(url, folder)
+
+    again, uploader = _upload(url, folder)
+    assert again == first
+    assert uploader.counts["unchanged"] == 3
+    assert uploader.counts["uploaded"] == uploader.counts["already_stored"] == 0
+
+    # Only the edited file and the new one are hashed and stored
+    with open(os.path.join(folder, "FS_002.png"), 'wb') as f:
+        f.write(b"edited")
+    with open(os.path.join(folder, "FS_004.png"), 'wb') as f:
+        f.write(b"d")
+    resumed, uploader = _upload(url, folder)
+    assert uploader.counts["unchanged"] == 2
+    assert uploader.counts["uploaded"] == 2
+    assert resumed["FS_001.png"] == first["FS_001.png"]
+    assert resumed["FS_002.png"] == f"{url}/blobs/{hashlib.sha256(b'edited').hexdigest()}"
+    assert len(_stored(server)) == 5
+
+def test_content_already_in_the_store_is_not_sent_again(store, tmp_path):
+    server, url = store
+    _upload(url, _files(tmp_path / "a", [b"shared", b"only in a"]))
+    uris, uploader = _upload(url, _files(tmp_path / "b", [b"shared"]))
+
+    assert uploader.counts["already_stored"] == 1
+    assert uploader.counts["uploaded"] == 0
+    assert uploader.bytes_sent == 0
+    assert uris["FS_001.png"].endswith(hashlib.sha256(b"shared").hexdigest())
+
+def test_injected_failures_are_retried(store, tmp_path):
+    server, url = store
+    server.fail_rate = 0.5
+    contents = [bytes([i]) * 100 for i in range(12)]
+    uris, uploader = _upload(url, _files(tmp_path / "png", contents), retries=30, backoff=0.001)
+
+    assert uploader.counts["failed"] == 0
+    assert uploader.counts["retries"] > 0
+    assert len(uris) == 12
+    assert _stored(server) == sorted(hashlib.sha256(data).hexdigest() for data in contents)
+
+def test_backoff_doubles_and_gives_up(store, tmp_path, monkeypatch):
+    server, url = store
+    server.fail_rate = 1.0
+    delays = []
+    sleep = asyncio.sleep
+
+    async def record(delay):
+        delays.append(delay)
+        await sleep(0)
+    monkeypatch.setattr(upload_pipeline.asyncio, "sleep", record)
+
+    folder = _files(tmp_path / "png", [b"x"])
+    uris, uploader = _upload(url, folder, retries=3, backoff=0.2)
+
+    # Jitter keeps each delay within half and one and a half times 0.2 * 2**attempt
+    assert len(delays) == 3
+    for attempt, delay in enumerate(delays):
+        assert 0.1 * 2 ** attempt <= delay <= 0.3 * 2 ** attempt
+    assert uploader.counts["failed"] == 1
+    assert uploader.counts["retries"] == 3
+    assert uris == {}
+    # Nothing journaled, so the next run tries it again
+    server.fail_rate = 0.0
+    uris, uploader = _upload(url, folder)
+    assert uploader.counts["uploaded"] == 1 and uploader.counts["unchanged"] == 0
+
+def test_collection_metadata_points_at_stored_images(store, tmp_path):
+    server, url = store
+    png_dir = _files(tmp_path / "png", [b"img1", b"img2"])
+    json_dir = tmp_path / "json"
+    json_dir.mkdir()
+    for i in (1, 2):
+        (json_dir / f"FS_{i:03}.json").write_text(json.dumps({"name": f"FS {i}", "image": f"/FS_{i:03}.png"}),
+                                                  encoding='utf-8')
+
+    png_uris, json_uris, uploader = asyncio.run(
+        upload_pipeline.upload_collection(png_dir, str(json_dir), url, concurrency=4))
+    assert uploader.counts["failed"] == 0
+    for i in (1, 2):
+        data = json.loads((json_dir / f"FS_{i:03}.json").read_text(encoding='utf-8'))
+        assert data["image"] == png_uris[f"FS_{i:03}.png"]
+        stored = os.path.join(server.root, json_uris[f"FS_{i:03}.json"].rsplit('/', 1)[-1])
+        with open(stored, 'rb') as f:
+            assert json.loads(f.read()) == data
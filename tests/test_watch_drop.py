@@ -0,0 +1,93 @@
+import os
+import pytest
+import mass_nft_generator_local as generator
+import watch_drop
+
+HEADER = "NFT_Number,Base_Variation,Accessory_1,Accessory_2,Final_Rarity\n"
+ROWS = [
+    "FS_001,Base1,Comet,None,Common",
+    "FS_002,Base1,Shell,None,Common",
+    "FS_003,Base2,Comet,Shell,Rare",
+    "FS_004,Base2,None,None,Common",
+    # Pearl.png is not there yet
+    "FS_005,Base1,Pearl,None,Rare",
+]
+
+_tick = [0]
+
+def _save(path, data=b"layer"):
+    # A fresh mtime on every save, however coarse the filesystem clock
+    with open(path, 'wb') as f:
+        f.write(data)
+    _tick[0] += 1
+    stamp = 1_700_000_000_000_000_000 + _tick[0] * 1_000_000_000
+    os.utime(path, ns=(stamp, stamp))
+
+def _write_csv(path, rows):
+    _save(path, (HEADER + "\n".join(rows) + "\n").encode('utf-8'))
+
+@pytest.fixture
+def watch(tmp_path, monkeypatch):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    for name in ["Base1", "Base2", "Comet", "Shell"]:
+        _save(drop / f"{name}.png")
+    csv_path = drop / "Watch.csv"
+    _write_csv(csv_path, ROWS)
+    monkeypatch.setitem(generator.CONFIG, "Watch", {"base_dir": str(drop), "base_map": {}, "trait_map": {},
+                                                    "csv_path": str(csv_path), "theme": "Watch"})
+    monkeypatch.setattr(generator, "_LAYER_FILES", {})
+
+    watch = watch_drop.DropWatch("Watch")
+    ids, _ = watch.changes(watch.snapshot())
+    # The first pass indexes the drop and brings every row up to date
+    assert ids == {"FS_001", "FS_002", "FS_003", "FS_004", "FS_005"}
+    return watch
+
+def _changes(watch):
+    return watch.changes(watch.snapshot())[0]
+
+def _layer(watch, name):
+    return os.path.join(watch.cfg['base_dir'], name)
+
+def test_nothing_changed(watch):
+    assert _changes(watch) == set()
+
+def test_edited_layer_rebuilds_the_rows_that_blend_it(watch):
+    _save(_layer(watch, "Comet.png"), b"new pixels")
+    assert _changes(watch) == {"FS_001", "FS_003"}
+    _save(_layer(watch, "Base2.png"), b"new pixels")
+    assert _changes(watch) == {"FS_003", "FS_004"}
+
+def test_added_layer_rebuilds_the_rows_waiting_for_it(watch):
+    _save(_layer(watch, "Pearl.png"))
+    assert _changes(watch) == {"FS_005"}
+    # Now found, it is still indexed for later edits
+    _save(_layer(watch, "Pearl.png"), b"retouched")
+    assert _changes(watch) == {"FS_005"}
+
+def test_removed_layer_rebuilds_its_rows(watch):
+    os.remove(_layer(watch, "Shell.png"))
+    assert _changes(watch) == {"FS_002", "FS_003"}
+    # Put back, the same rows come back
+    _save(_layer(watch, "Shell.png"))
+    assert _changes(watch) == {"FS_002", "FS_003"}
+
+def test_unused_layer_rebuilds_nothing(watch):
+    _save(_layer(watch, "Unused.png"))
+    ids, notes = watch.changes(watch.snapshot())
+    assert ids == set()
+    assert notes == ["Unused.png added: used by 0 NFTs"]
+
+def test_edited_rows_are_rebuilt_and_reindexed(watch):
+    rows = list(ROWS)
+    rows[3] = "FS_004,Base2,Shell,None,Common"
+    rows.append("FS_006,Base1,None,None,Common")
+    _write_csv(watch.cfg['csv_path'], rows)
+    assert _changes(watch) == {"FS_004", "FS_006"}
+
+    # FS_004 now blends Shell, FS_006 blends Base1
+    _save(_layer(watch, "Shell.png"), b"new pixels")
+    assert _changes(watch) == {"FS_002", "FS_003", "FS_004"}
+    _save(_layer(watch, "Base1.png"), b"new pixels")
+    assert _changes(watch) == {"FS_001", "FS_002", "FS_005", "FS_006"}
@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import stat
+import pytest
+import creative_metadata_engine
+from creative_metadata_engine import write_json_atomic
+from upload_pipeline import rewrite_image_uris
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="POSIX permission bits")
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+def test_new_file_gets_the_umask_mode(tmp_path):
+    path = tmp_path / "FS_001.json"
+    write_json_atomic(str(path), {"name": "x"})
+    assert _mode(path) == 0o666 & ~creative_metadata_engine._umask()
+    assert json.loads(path.read_text(encoding='utf-8')) == {"name": "x"}
+
+def test_import_leaves_the_umask_alone(tmp_path, monkeypatch):
+    calls = []
+    real = os.umask
+    monkeypatch.setattr(os, "umask", lambda mask: calls.append(mask) or real(mask))
+    monkeypatch.delitem(sys.modules, "creative_metadata_engine")
+    import creative_metadata_engine as fresh
+    assert calls == []
+
+    # Read once, on the first new file, and put back as it was
+    before = real(0o027)
+    try:
+        fresh.write_json_atomic(str(tmp_path / "a.json"), {})
+        fresh.write_json_atomic(str(tmp_path / "b.json"), {})
+        assert calls == [0, 0o027]
+        assert real(0o027) == 0o027
+        assert _mode(tmp_path / "a.json") == 0o640
+    finally:
+        real(before)
+
+def test_rewrite_keeps_the_existing_mode(tmp_path):
+    path = tmp_path / "FS_001.json"
+    path.write_text(json.dumps({"image": "/FS_001.png"}), encoding='utf-8')
+    os.chmod(path, 0o644)
+    assert rewrite_image_uris(str(tmp_path), {"FS_001.png": "http://store/blobs/abc"}) == 1
+    assert _mode(path) == 0o644
+    os.chmod(path, 0o640)
+    write_json_atomic(str(path), {"image": "y"})
+    assert _mode(path) == 0o640
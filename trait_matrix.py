@@ -0,0 +1,276 @@
+import os
+import re
+import csv
+import json
+import array
+import argparse
+import numpy as np
+
+# A combinations CSV as a 2-D array of small integers: one column per CSV column, each
+# cell the index of its value in that column's vocabulary. The array is a plain .npy
+# (memory-mappable) and the vocabularies sit beside it in a .vocab JSON sidecar.
+# NFT_Number is stored as its number when every id is <prefix>_<zero-padded number>,
+# so a million-row collection costs a few bytes per cell instead of a dict per row.
+MATRIX_SUFFIX = ".npy"
+VOCAB_SUFFIX = ".vocab"
+VOCAB_FORMAT = 1
+ID_COLUMN = "NFT_Number"
+RARITY_COLUMN = "Final_Rarity"
+
+_ID_PATTERN = re.compile(r"^(.+)_(\d+)$")
+
+def matrix_base(csv_path):
+    # Beside the CSV: Drop_NFT_Combinations.csv -> Drop_NFT_Combinations.npy / .vocab
+    return csv_path[:-len(".csv")] if csv_path.lower().endswith(".csv") else csv_path
+
+def _code_dtype(max_value):
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _id_format(ids):
+    # (prefix, width) when every id round-trips through f"{prefix}_{str(n).zfill(width)}"
+    prefix = width = None
+    for nft_id in ids:
+        match = _ID_PATTERN.match(nft_id)
+        if not match or (prefix is not None and match.group(1) != prefix):
+            return None
+        prefix = match.group(1)
+        digits = match.group(2)
+        width = len(digits) if width is None else min(width, len(digits))
+    if prefix is None:
+        return None
+    for nft_id in ids:
+        digits = nft_id[len(prefix) + 1:]
+        if str(int(digits)).zfill(width) != digits:
+            return None
+    return prefix, width
+
+class TraitMatrix:
+    def __init__(self, columns, vocab, codes, id_format=None):
+        # columns: CSV header; vocab: {column: [values]}, None for a numeric NFT_Number;
+        # codes: (rows, columns) integer array; id_format: (prefix, width) or None
+        self.columns = list(columns)
+        self.vocab = vocab
+        self.codes = codes
+        self.id_format = tuple(id_format) if id_format else None
+        self._id_codes = None
+        self._sorted_ids = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_rows(cls, rows, columns):
+        # rows: iterable of sequences in `columns` order (csv.reader rows) or dicts
+        encoders = [{} for _ in columns]
+        cells = [array.array('I') for _ in columns]
+        for row in rows:
+            values = [row.get(c) or "" for c in columns] if isinstance(row, dict) else row
+            for j, c in enumerate(columns):
+                value = values[j] if j < len(values) else ""
+                cells[j].append(encoders[j].setdefault(value, len(encoders[j])))
+
+        vocab = {c: list(encoders[j]) for j, c in enumerate(columns)}
+        codes = np.empty((len(cells[0]) if columns else 0, len(columns)), dtype=np.int64)
+        for j in range(len(columns)):
+            codes[:, j] = np.frombuffer(cells[j], dtype=np.uint32)
+
+        id_format = None
+        if ID_COLUMN in vocab:
+            j = columns.index(ID_COLUMN)
+            id_format = _id_format(vocab[ID_COLUMN])
+            if id_format:
+                numbers = np.array([int(v[len(id_format[0]) + 1:]) for v in vocab[ID_COLUMN]], dtype=np.int64)
+                codes[:, j] = numbers[codes[:, j]] if len(numbers) else codes[:, j]
+                vocab[ID_COLUMN] = None
+        dtype = _code_dtype(int(codes.max()) if codes.size else 0)
+        return cls(columns, vocab, codes.astype(dtype), id_format)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            columns = next(reader)
+            return cls.from_rows(reader, columns)
+
+    @classmethod
+    def load(cls, base, mmap=True):
+        with open(base + VOCAB_SUFFIX, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("format") != VOCAB_FORMAT:
+            raise ValueError(f"{base + VOCAB_SUFFIX}: unsupported trait matrix format {meta.get('format')}")
+        codes = np.load(base + MATRIX_SUFFIX, mmap_mode='r' if mmap else None)
+        return cls(meta["columns"], meta["vocab"], codes, meta.get("id_format"))
+
+    def save(self, base):
+        folder = os.path.dirname(os.path.abspath(base))
+        os.makedirs(folder, exist_ok=True)
+        np.save(base + MATRIX_SUFFIX, np.ascontiguousarray(self.codes))
+        with open(base + VOCAB_SUFFIX, 'w', encoding='utf-8') as f:
+            json.dump({"format": VOCAB_FORMAT, "rows": len(self), "columns": self.columns,
+                       "vocab": self.vocab, "id_format": self.id_format}, f, ensure_ascii=False)
+
+    def column(self, name):
+        # Decoded values of one column as an object array
+        j = self.columns.index(name)
+        if self.vocab[name] is None:
+            prefix, width = self.id_format
+            return np.array([f"{prefix}_{str(int(n)).zfill(width)}" for n in self.codes[:, j]], dtype=object)
+        return np.asarray(self.vocab[name], dtype=object)[self.codes[:, j]]
+
+    def pool_codes(self, name, pool):
+        # The column re-coded as positions in `pool` (a list of values), -1 where a value is not in it
+        position = {v: k for k, v in enumerate(pool)}
+        lut = np.array([position.get(v, -1) for v in self.vocab[name]] or [-1], dtype=np.int64)
+        return lut[self.codes[:, self.columns.index(name)]]
+
+    def rows(self):
+        # Decoded rows as dicts in CSV order (for the few callers that need the strings)
+        for i in range(len(self)):
+            yield {c: self._value(i, j, c) for j, c in enumerate(self.columns)}
+
+    def _value(self, i, j, name):
+        if self.vocab[name] is None:
+            prefix, width = self.id_format
+            return f"{prefix}_{str(int(self.codes[i, j])).zfill(width)}"
+        return self.vocab[name][self.codes[i, j]]
+
+    def trait_columns(self):
+        # The columns a combination is made of
+        return [c for c in self.columns if c not in (ID_COLUMN, RARITY_COLUMN)]
+
+    def packed_keys(self, columns=None):
+        # One int64 per row, mixed-radix over the columns' vocabularies: equal keys <=> equal rows
+        columns = columns or self.trait_columns()
+        radices = [len(self.vocab[c]) for c in columns]
+        if float(np.prod([float(r) for r in radices])) >= 2 ** 63:
+            raise ValueError("Trait space too large for 64-bit packed keys")
+        keys = np.zeros(len(self), dtype=np.int64)
+        for c, r in zip(columns, radices):
+            keys = keys * r + self.codes[:, self.columns.index(c)]
+        return keys
+
+    def duplicates(self, columns=None):
+        # Rows whose combination already appeared in an earlier row
+        keys = self.packed_keys(columns)
+        _, first = np.unique(keys, return_index=True)
+        dup = np.ones(len(keys), dtype=bool)
+        dup[first] = False
+        return np.flatnonzero(dup)
+
+    def value_counts(self, column):
+        j = self.columns.index(column)
+        counts = np.bincount(self.codes[:, j], minlength=len(self.vocab[column]))
+        return dict(zip(self.vocab[column], counts.tolist()))
+
+    def _id_key(self, nft_id):
+        # The NFT_Number cell value for an id, or None if it cannot be in this matrix
+        if ID_COLUMN not in self.columns:
+            return None
+        if self.id_format:
+            prefix, width = self.id_format
+            match = _ID_PATTERN.match(nft_id)
+            if not match or match.group(1) != prefix or str(int(match.group(2))).zfill(width) != match.group(2):
+                return None
+            return int(match.group(2))
+        if self._id_codes is None:
+            self._id_codes = {v: k for k, v in enumerate(self.vocab[ID_COLUMN])}
+        return self._id_codes.get(nft_id)
+
+    def row_index(self, nft_id):
+        # First row with this NFT_Number (same as load_csv_index), by binary search over a
+        # stable sort of the id column built on the first lookup
+        key = self._id_key(nft_id)
+        if key is None:
+            return None
+        if self._sorted_ids is None:
+            ids = np.asarray(self.codes[:, self.columns.index(ID_COLUMN)])
+            order = np.argsort(ids, kind='stable')
+            self._sorted_ids = (ids[order], order)
+        sorted_ids, order = self._sorted_ids
+        pos = np.searchsorted(sorted_ids, key)
+        if pos < len(sorted_ids) and sorted_ids[pos] == key:
+            return int(order[pos])
+        return None
+
+    def row(self, nft_id):
+        # {column: value} without NFT_Number, like metadata_production_engine.load_csv_index
+        i = self.row_index(nft_id)
+        if i is None:
+            return None
+        return {c: self.vocab[c][self.codes[i, j]] for j, c in enumerate(self.columns) if c != ID_COLUMN}
+
+    # dict-style lookup, so a loaded matrix can stand in for load_csv_index's dict
+    get = row
+
+    def to_csv(self, csv_path, chunk=65536):
+        decoded_vocab = [None if self.vocab[c] is None else np.asarray(self.vocab[c], dtype=object) for c in self.columns]
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.columns)
+            for start in range(0, len(self), chunk):
+                block = np.asarray(self.codes[start:start + chunk])
+                cols = []
+                for j, values in enumerate(decoded_vocab):
+                    if values is None:
+                        prefix, width = self.id_format
+                        cols.append([f"{prefix}_{str(int(n)).zfill(width)}" for n in block[:, j]])
+                    else:
+                        cols.append(values[block[:, j]])
+                writer.writerows(zip(*cols))
+
+def is_fresh(csv_path):
+    # A saved matrix beside the CSV that is at least as new as the CSV
+    base = matrix_base(csv_path)
+    paths = [base + MATRIX_SUFFIX, base + VOCAB_SUFFIX]
+    if not all(os.path.exists(p) for p in paths):
+        return False
+    return min(os.path.getmtime(p) for p in paths) >= os.path.getmtime(csv_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert combination CSVs to and from integer-coded trait matrices")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("encode", help="CSV -> .npy + .vocab beside it")
+    p.add_argument("csv")
+    p.add_argument("--out", help="Output base path without suffix (default: the CSV's)")
+    p = sub.add_parser("decode", help=".npy + .vocab -> CSV")
+    p.add_argument("base")
+    p.add_argument("csv")
+    p = sub.add_parser("info", help="Rows, vocabularies, size and duplicate combinations")
+    p.add_argument("base")
+    p = sub.add_parser("get", help="Print one row")
+    p.add_argument("base")
+    p.add_argument("id")
+    p = sub.add_parser("counts", help="Value counts of one column")
+    p.add_argument("base")
+    p.add_argument("column")
+    args = parser.parse_args(argv)
+
+    if args.command == "encode":
+        base = args.out or matrix_base(args.csv)
+        matrix = TraitMatrix.from_csv(args.csv)
+        matrix.save(base)
+        print(f"Encoded {len(matrix)} rows into {base + MATRIX_SUFFIX} ({matrix.codes.dtype}, "
+              f"{os.path.getsize(base + MATRIX_SUFFIX) / (1024 * 1024):.1f} MB)")
+    elif args.command == "decode":
+        matrix = TraitMatrix.load(args.base)
+        matrix.to_csv(args.csv)
+        print(f"Decoded {len(matrix)} rows into {args.csv}")
+    elif args.command == "info":
+        matrix = TraitMatrix.load(args.base)
+        print(f"{len(matrix)} rows, {matrix.codes.dtype} codes, {os.path.getsize(args.base + MATRIX_SUFFIX)} bytes")
+        for c in matrix.columns:
+            described = f"{matrix.id_format[0]}_<{matrix.id_format[1]} digits>" if matrix.vocab[c] is None else f"{len(matrix.vocab[c])} values"
+            print(f"  {c:<16}{described}")
+        print(f"{len(matrix.duplicates())} rows repeat an earlier combination")
+    elif args.command == "get":
+        print(json.dumps(TraitMatrix.load(args.base).row(args.id), indent=2, ensure_ascii=False))
+    elif args.command == "counts":
+        counts = TraitMatrix.load(args.base).value_counts(args.column)
+        for value, n in sorted(counts.items(), key=lambda item: -item[1]):
+            print(f"  {value:<24}{n:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import urllib.error
+import urllib.request
+from metadata_production_engine import PNG_DIR, OUTPUT_DIR
+from creative_metadata_engine import write_json_atomic
+from build_manifest import sidecar_name
+import storage_server
+
+# Content-addressed upload of the rendered PNGs and their metadata:
+#   1. every PNG is hashed and stored once per distinct content (HEAD first, PUT if absent)
+#   2. each metadata JSON's "image" is rewritten from "/<png name>" to the PNG's stored URI
+#   3. the metadata JSONs are uploaded the same way
+# Every stored file is journaled in a ledger in its folder, keyed on name, size and
+# mtime, so a rerun after a dropped connection only hashes and sends what changed.
+STORE_URL = f"http://{storage_server.DEFAULT_HOST}:{storage_server.DEFAULT_PORT}"
+DEFAULT_CONCURRENCY = 16
+RETRIES = 5
+# Seconds before the first retry, doubled for each one after (with jitter)
+BACKOFF = 0.5
+TIMEOUT = 60
+
+# JSONL, one {"name", "size", "mtime_ns", "sha256", "uri"} per stored file, last line
+# wins
+LEDGER = sidecar_name("upload_ledger")
+
+class UploadError(Exception):
+    pass
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+class Ledger:
+    def __init__(self, folder):
+        self.path = os.path.join(folder, LEDGER)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from an interrupted run
+                    self.entries[entry["name"]] = entry
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def current(self, name, st):
+        # The stored URI if the file is unchanged since it was recorded
+        entry = self.entries.get(name)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["uri"]
+        return None
+
+    def record(self, name, st, digest, uri):
+        entry = {"name": name, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest, "uri": uri}
+        self.entries[name] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def _request(method, url, data=None):
+    # One blocking HTTP call -> status code (run in a thread by the uploader)
+    request = urllib.request.Request(url, data=data, method=method)
+    if data is not None:
+        request.add_header("Content-Type", "application/octet-stream")
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+class Uploader:
+    # At most `concurrency` files are hashed or in flight at once; each distinct
+    # sha256 is sent at most once per run
+    def __init__(self, store_url=STORE_URL, concurrency=DEFAULT_CONCURRENCY, retries=RETRIES, backoff=BACKOFF):
+        self.store_url = store_url.rstrip('/')
+        self.limit = asyncio.Semaphore(concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self._stored = {}
+        self.counts = {"uploaded": 0, "already_stored": 0, "duplicates": 0, "unchanged": 0, "failed": 0, "retries": 0}
+        self.bytes_sent = 0
+
+    def uri(self, digest):
+        return f"{self.store_url}/blobs/{digest}"
+
+    async def _call(self, method, url, data=None):
+        # Retries connection errors, 5xx and 429 with exponential backoff; other answers are final
+        for attempt in range(self.retries + 1):
+            try:
+                status = await asyncio.to_thread(_request, method, url, data)
+                if status < 500 and status != 429:
+                    return status
+                error = f"HTTP {status}"
+            except (urllib.error.URLError, OSError) as e:
+                error = str(e)
+            if attempt == self.retries:
+                raise UploadError(f"{method} {url} failed after {attempt + 1} attempts: {error}")
+            self.counts["retries"] += 1
+            await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def hash(self, path):
+        async with self.limit:
+            return await asyncio.to_thread(file_sha256, path)
+
+    async def store(self, path, digest):
+        # -> URI of the content, uploading it unless the store already has it. Files with
+        # the same content share one upload task.
+        task = self._stored.get(digest)
+        if task is None:
+            task = self._stored[digest] = asyncio.ensure_future(self._store(path, digest))
+        else:
+            self.counts["duplicates"] += 1
+        return await task
+
+    async def _store(self, path, digest):
+        uri = self.uri(digest)
+        async with self.limit:
+            if await self._call("HEAD", uri) == 200:
+                self.counts["already_stored"] += 1
+                return uri
+            data = await asyncio.to_thread(_read, path)
+            status = await self._call("PUT", uri, data)
+            if status not in (200, 201):
+                raise UploadError(f"PUT {uri} answered HTTP {status}")
+            self.counts["uploaded"] += 1
+            self.bytes_sent += len(data)
+            return uri
+
+async def upload_folder(uploader, folder, suffix):
+    # {file name: URI} for every <suffix> file in folder
+    ledger = Ledger(folder)
+    uris, todo = {}, []
+    for name in sorted(f for f in os.listdir(folder) if f.endswith(suffix)):
+        st = os.stat(os.path.join(folder, name))
+        uri = ledger.current(name, st)
+        if uri:
+            uris[name] = uri
+            uploader.counts["unchanged"] += 1
+        else:
+            todo.append((name, st))
+    print(f"{folder}: {len(uris)} unchanged since the last upload, {len(todo)} to hash and store")
+
+    async def one(name, st):
+        path = os.path.join(folder, name)
+        try:
+            digest = await uploader.hash(path)
+            uri = await uploader.store(path, digest)
+        except Exception as e:
+            uploader.counts["failed"] += 1
+            print(f"Error uploading {path}: {e}")
+            return
+        # Journaled as soon as it is stored, so an interrupted run resumes from here
+        ledger.record(name, st, digest, uri)
+        uris[name] = uri
+
+    try:
+        await asyncio.gather(*(one(name, st) for name, st in todo))
+    finally:
+        ledger.close()
+    return uris
+
+def rewrite_image_uris(json_dir, png_uris):
+    # "image": "/FS_001.png" -> the stored URI of FS_001.png; already rewritten ones are left alone
+    changed = 0
+    for name in sorted(f for f in os.listdir(json_dir) if f.endswith('.json')):
+        path = os.path.join(json_dir, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+            continue
+        image = data.get("image")
+        uri = png_uris.get(image.rsplit('/', 1)[-1]) if isinstance(image, str) else None
+        if uri and uri != image:
+            data["image"] = uri
+            write_json_atomic(path, data)
+            changed += 1
+    return changed
+
+async def upload_collection(png_dir=PNG_DIR, json_dir=OUTPUT_DIR, store_url=STORE_URL, concurrency=DEFAULT_CONCURRENCY,
+                            retries=RETRIES, rewrite=True):
+    uploader = Uploader(store_url, concurrency, retries)
+    start = time.perf_counter()
+    png_uris = await upload_folder(uploader, png_dir, '.png')
+    if rewrite:
+        changed = rewrite_image_uris(json_dir, png_uris)
+        print(f"Rewrote the image URI of {changed} metadata files")
+    json_uris = await upload_folder(uploader, json_dir, '.json')
+    elapsed = time.perf_counter() - start
+
+    c = uploader.counts
+    mb = uploader.bytes_sent / (1024 * 1024)
+    print(f"Uploaded {c['uploaded']} files ({mb:.1f} MB, {mb / elapsed if elapsed else 0:.1f} MB/s) in {elapsed:.1f}s; "
+          f"{c['already_stored']} already stored, {c['duplicates']} duplicate contents, "
+          f"{c['unchanged']} unchanged, {c['retries']} retries, {c['failed']} failed.")
+    return png_uris, json_uris, uploader
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upload PNGs and metadata to content-addressed storage, resumably")
+    parser.add_argument("--png-dir", default=PNG_DIR)
+    parser.add_argument("--json-dir", default=OUTPUT_DIR)
+    parser.add_argument("--store", default=STORE_URL, help="Storage base URL (default: %(default)s, see storage_server.py)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Files hashed or in flight at once")
+    parser.add_argument("--retries", type=int, default=RETRIES, help="Retries per request on connection errors and 5xx")
+    parser.add_argument("--no-rewrite", action="store_true", help="Leave the metadata image fields alone")
+    parser.add_argument("--local-store", metavar="DIR",
+                        help="Start the local stand-in server on DIR for this run and upload to it instead of --store")
+    args = parser.parse_args(argv)
+
+    server = None
+    store_url = args.store
+    if args.local_store:
+        # On the default port, so the URIs written into the metadata stay the same across runs
+        server, store_url = storage_server.start_server(args.local_store, port=storage_server.DEFAULT_PORT)
+        print(f"Local storage at {store_url} ({args.local_store})")
+    try:
+        _, _, uploader = asyncio.run(upload_collection(args.png_dir, args.json_dir, store_url, args.concurrency,
+                                                       args.retries, rewrite=not args.no_rewrite))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return 1 if uploader.counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,24 +1,14 @@
-import os
 import json
+from metadata_catalog import update_catalog, samples_per_symbol
 
 dir_path = r'C:\Users\HHeltzinger\Desktop\WaterIsLife\MetaData_Production'
-prefixes_seen = set()
-samples = []
-def try_int(s):
-    try: return int(s.split('.')[0])
-    except: return s
-
-files = sorted([f for f in os.listdir(dir_path) if f.endswith('.json')], key=try_int)
 
-for f in files:
-    with open(os.path.join(dir_path, f), 'r') as j:
-        data = json.load(j)
-        sym = data.get('symbol')
-        if sym not in prefixes_seen:
-            prefixes_seen.add(sym)
-            samples.append(data)
-    if len(prefixes_seen) >= 13:
-        break
+# One sample per symbol straight from the catalog index instead of opening files in order
+conn = update_catalog(dir_path)
+samples = []
+for sym, item_id, path in samples_per_symbol(conn, limit=13):
+    with open(path, 'r') as j:
+        samples.append(json.load(j))
 
 for s in samples:
     print(f"--- Prefix: {s.get('symbol')} ---")
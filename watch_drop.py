@@ -0,0 +1,246 @@
+import os
+import csv
+import time
+import argparse
+import mass_nft_generator_local as generator
+from build_collection import DEFAULT_DROPS, load_drops
+from build_manifest import BuildManifest
+from metadata_pack import PackWriter
+
+# Live rebuilds while artwork and combinations are being edited. Each watched drop keeps
+# a reverse index from every layer file its rows use (including ones not there yet) to
+# the NFT ids that blend it. The drop folder and CSV are polled; when a layer file is
+# saved, added or removed, or CSV rows are edited, just those NFTs are re-rendered and
+# their metadata rewritten, on caches that stay warm between edits.
+#
+# Rebuilds are recorded in the generator's build manifest, so an NFT whose inputs did not
+# really change (a file touched but saved with the same pixels) is skipped, and a later
+# run_drop only redoes what the watcher did not.
+DEFAULT_INTERVAL = 1.0
+
+def file_state(path):
+    # (size, mtime_ns) or None if the file is gone
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def scan_layers(base_dir):
+    # normcased path -> (size, mtime_ns) for the layer PNGs in a drop folder (not its _bbox crops)
+    layers = {}
+    if os.path.isdir(base_dir):
+        with os.scandir(base_dir) as entries:
+            for e in entries:
+                if e.is_file() and e.name.lower().endswith('.png'):
+                    st = e.stat()
+                    layers[os.path.normcase(e.path)] = (st.st_size, st.st_mtime_ns)
+    return layers
+
+def read_rows(csv_path):
+    # NFT_Number -> row; the first row wins on duplicate ids, as in the metadata engine
+    rows = {}
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            rows.setdefault(row['NFT_Number'], row)
+    return rows
+
+def row_layers(cfg, row):
+    # Every layer path a row depends on, found or missing (so adding a missing file rebuilds its rows)
+    base_path, acc_paths, missing = generator.plan_row(cfg, row)
+    paths = ([base_path] if base_path else []) + acc_paths + [path for _, path in missing]
+    return [os.path.normcase(path) for path in paths]
+
+class DropWatch:
+    def __init__(self, env_name):
+        self.env_name = env_name
+        self.cfg = generator.CONFIG[env_name]
+        self.rows = {}
+        self.dependents = {}
+        self.seen = (None, {})
+        self.pending = None
+
+    def snapshot(self):
+        return file_state(self.cfg['csv_path']), scan_layers(self.cfg['base_dir'])
+
+    def settled(self):
+        # A new snapshot once it has held still for one poll (editors often save in
+        # several writes), else None
+        snapshot = self.snapshot()
+        if snapshot != self.pending:
+            self.pending = snapshot
+            return None
+        return snapshot if snapshot != self.seen else None
+
+    def reindex(self):
+        self.dependents = {}
+        for nft_id, row in self.rows.items():
+            for path in row_layers(self.cfg, row):
+                self.dependents.setdefault(path, set()).add(nft_id)
+
+    def changes(self, snapshot):
+        # -> ({NFT ids to rebuild}, [what changed]) between the last applied snapshot and this one
+        (csv_state, layers), (old_csv_state, old_layers) = snapshot, self.seen
+        self.seen = snapshot
+        ids, notes = set(), []
+
+        changed = sorted(p for p in set(layers) | set(old_layers) if layers.get(p) != old_layers.get(p))
+        if changed:
+            # The generator lists each drop folder once per process; added or removed files need a fresh listing
+            generator._LAYER_FILES.pop(self.cfg['base_dir'], None)
+
+        if csv_state != old_csv_state:
+            if csv_state is None:
+                notes.append(f"{os.path.basename(self.cfg['csv_path'])} is gone; keeping the last rows")
+            else:
+                try:
+                    rows = read_rows(self.cfg['csv_path'])
+                except Exception as e:
+                    # Half-saved or locked by the spreadsheet app; picked up again on the next save
+                    notes.append(f"Error reading {self.cfg['csv_path']}: {e}")
+                    self.seen = (old_csv_state, layers)
+                    rows = self.rows
+                edited = {nft_id for nft_id, row in rows.items() if self.rows.get(nft_id) != row}
+                removed = sorted(set(self.rows) - set(rows))
+                if self.rows and (edited or removed):
+                    notes.append(f"{os.path.basename(self.cfg['csv_path'])}: {len(edited)} rows added or edited"
+                                 + (f", {len(removed)} removed (outputs left in place: {', '.join(removed[:5])})" if removed else ""))
+                self.rows = rows
+                ids |= edited
+            self.reindex()
+        elif changed:
+            # Which names resolve depends on the folder listing
+            self.reindex()
+
+        if old_layers:
+            for path in changed:
+                users = self.dependents.get(path, set())
+                what = "added" if path not in old_layers else "removed" if path not in layers else "changed"
+                notes.append(f"{os.path.basename(path)} {what}: used by {len(users)} NFTs")
+                ids |= users
+        return ids, notes
+
+def _stamp():
+    return time.strftime('%H:%M:%S')
+
+def rebuild(watch, ids, manifest, packed=False, preprocess=False, layers_changed=False):
+    # Re-render the given NFTs of one drop -> (rebuilt, up to date, failed)
+    env_name, cfg = watch.env_name, watch.cfg
+    rows = sorted((watch.rows[nft_id] for nft_id in ids if nft_id in watch.rows), key=generator.render_order_key)
+    if preprocess and layers_changed:
+        generator.preprocess_drop(env_name)
+    metadata_path = generator.pack_path(env_name) if packed else None
+    packed_ids = generator.packed_index(env_name) if packed else None
+    pack = None
+
+    def save_metadata(cfg, row):
+        nonlocal pack
+        if not packed:
+            generator.write_metadata(cfg, row)
+            return
+        # The newer line for an id supersedes the old one
+        if pack is None:
+            pack = PackWriter(metadata_path, append=True)
+        pack.write(row['NFT_Number'], generator.build_metadata(cfg, row))
+
+    rebuilt = current = failed = 0
+    started = time.perf_counter()
+    try:
+        for row in rows:
+            nft_id = row['NFT_Number']
+            digest = generator.row_digest(cfg, row)
+            if generator.is_built(manifest, row, digest, packed_ids):
+                current += 1
+                continue
+            start = time.perf_counter()
+            ok, _ = generator.render_item(env_name, row, save_metadata=save_metadata)
+            elapsed = time.perf_counter() - start
+            if ok:
+                manifest.record(nft_id, digest)
+                rebuilt += 1
+                print(f"[{_stamp()}]   {nft_id} rebuilt in {elapsed:.2f}s")
+            else:
+                failed += 1
+                if nft_id in manifest.entries:
+                    manifest.discard(nft_id)
+                print(f"[{_stamp()}]   {nft_id} failed after {elapsed:.2f}s")
+    finally:
+        if pack is not None:
+            pack.close()
+        manifest.save()
+    if rows:
+        elapsed = time.perf_counter() - started
+        print(f"[{_stamp()}] {env_name}: {rebuilt} rebuilt, {current} already up to date, {failed} failed in {elapsed:.2f}s"
+              + (f" ({elapsed / rebuilt:.2f}s per NFT)" if rebuilt else ""))
+    return rebuilt, current, failed
+
+def watch_drops(env_names, interval=DEFAULT_INTERVAL, once=False, packed=False, preprocess=False,
+                png_level=None, derivatives=None, cache_mb=None, composite_mb=None):
+    generator.set_render_options(png_level, derivatives)
+    generator.make_output_dirs()
+    if cache_mb is not None:
+        generator.LAYER_CACHE.set_budget(cache_mb)
+    if composite_mb is not None:
+        generator.COMPOSITE_CACHE.set_budget(composite_mb)
+    manifest = BuildManifest(generator.PNG_DIR)
+
+    # The first pass indexes every drop and brings it up to date (edits made while nothing was watching)
+    watches = [DropWatch(env_name) for env_name in env_names]
+    for watch in watches:
+        snapshot = watch.pending = watch.snapshot()
+        if snapshot[0] is None:
+            print(f"Error: CSV not found at {watch.cfg['csv_path']} ({watch.env_name})")
+            continue
+        ids, _ = watch.changes(snapshot)
+        print(f"[{_stamp()}] Watching {watch.env_name}: {len(watch.rows)} NFTs, {len(snapshot[1])} layer files, "
+              f"{len(watch.dependents)} indexed layer paths")
+        rebuild(watch, ids, manifest, packed=packed, preprocess=preprocess, layers_changed=True)
+    if once:
+        return
+
+    print(f"[{_stamp()}] Polling every {interval}s (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            for watch in watches:
+                snapshot = watch.settled()
+                if snapshot is None:
+                    continue
+                layers_changed = snapshot[1] != watch.seen[1]
+                ids, notes = watch.changes(snapshot)
+                for note in notes:
+                    print(f"[{_stamp()}] {watch.env_name}: {note}")
+                if ids:
+                    rebuild(watch, ids, manifest, packed=packed, preprocess=preprocess, layers_changed=layers_changed)
+    except KeyboardInterrupt:
+        print(f"[{_stamp()}] Stopped.")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch drop folders and CSVs and re-render only the NFTs an edit affects")
+    parser.add_argument("envs", nargs="*", metavar="ENV", help="Drops to watch (default: every registered drop)")
+    parser.add_argument("--drops", default=DEFAULT_DROPS, help="JSON file registering drops, as for build_collection.py")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between polls (default: %(default)s)")
+    parser.add_argument("--once", action="store_true", help="Bring the drops up to date and exit instead of watching")
+    parser.add_argument("--packed", action="store_true", help="Append metadata to the drop's <env>.jsonl pack instead of JSON files")
+    parser.add_argument("--preprocess", action="store_true", help="Re-crop edited trait layers to their alpha bounding boxes")
+    parser.add_argument("--png-level", type=int, default=None, choices=range(10), metavar="0-9",
+                        help="PNG zlib compression level (default: Pillow's)")
+    parser.add_argument("--derivatives", type=generator.parse_derivatives, metavar="NAME:SIZE:FORMAT,...",
+                        help="Also rewrite the smaller copies, e.g. web:1024:png,thumb:256:webp")
+    parser.add_argument("--cache-mb", type=float, default=None, help="Decoded layer cache budget in MB")
+    parser.add_argument("--composite-mb", type=float, default=None, help="Partial composite cache budget in MB")
+    args = parser.parse_args(argv)
+
+    settings, drops = load_drops(args.drops)
+    unknown = sorted(set(args.envs) - set(drops))
+    if unknown:
+        parser.error(f"unknown drops {', '.join(unknown)}; registered: {', '.join(sorted(drops))}")
+    generator.CONFIG.update(drops)
+    generator.PNG_DIR = settings.get("png_dir", generator.PNG_DIR)
+    generator.JSON_DIR = settings.get("metadata_dir", generator.JSON_DIR)
+    watch_drops(args.envs or sorted(drops), interval=args.interval, once=args.once, packed=args.packed,
+                preprocess=args.preprocess, png_level=args.png_level, derivatives=args.derivatives,
+                cache_mb=args.cache_mb, composite_mb=args.composite_mb)
+
+if __name__ == "__main__":
+    main()
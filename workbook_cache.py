@@ -0,0 +1,62 @@
+import os
+import json
+import pandas as pd
+
+# Configuration
+EXCEL_PATH = r"c:\Users\HHeltzinger\Desktop\WaterIsLife\WaterIsLife.xlsx"
+
+# Parsed sheets are pickled DataFrames (column blocks, no openpyxl on the read path) in a
+# folder beside the workbook, tagged with the workbook's mtime and size
+CACHE_FORMAT = 1
+
+def cache_dir(excel_path):
+    stem = os.path.splitext(os.path.basename(excel_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(excel_path)), f".{stem}_cache")
+
+def _workbook_stamp(excel_path):
+    st = os.stat(excel_path)
+    return {"format": CACHE_FORMAT, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+def _read_index(excel_path):
+    path = os.path.join(cache_dir(excel_path), "index.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def refresh(excel_path=EXCEL_PATH, force=False):
+    # Re-parse the workbook only when it changed since the cache was written
+    stamp = _workbook_stamp(excel_path)
+    index = _read_index(excel_path)
+    if index and not force and index["stamp"] == stamp:
+        return index
+
+    out_dir = cache_dir(excel_path)
+    os.makedirs(out_dir, exist_ok=True)
+    sheets = pd.read_excel(excel_path, sheet_name=None)
+    index = {"stamp": stamp, "sheets": []}
+    for n, (name, df) in enumerate(sheets.items()):
+        filename = f"sheet_{n}.pkl"
+        tmp = os.path.join(out_dir, filename + ".tmp")
+        df.to_pickle(tmp)
+        os.replace(tmp, os.path.join(out_dir, filename))
+        index["sheets"].append({"name": name, "file": filename, "rows": len(df)})
+
+    tmp = os.path.join(out_dir, "index.json.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, "index.json"))
+    return index
+
+def sheet_names(excel_path=EXCEL_PATH):
+    return [s["name"] for s in refresh(excel_path)["sheets"]]
+
+def load_sheet(sheet_name, excel_path=EXCEL_PATH):
+    for s in refresh(excel_path)["sheets"]:
+        if s["name"] == sheet_name:
+            return pd.read_pickle(os.path.join(cache_dir(excel_path), s["file"]))
+    raise KeyError(f"Worksheet named '{sheet_name}' not found in {excel_path}")
+
+def load_all(excel_path=EXCEL_PATH):
+    index = refresh(excel_path)
+    return {s["name"]: pd.read_pickle(os.path.join(cache_dir(excel_path), s["file"])) for s in index["sheets"]}